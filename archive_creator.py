@@ -0,0 +1,435 @@
+import os
+import stat
+import time
+import zlib
+import lzma
+import struct
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from jobs import _scan
+
+CHUNK_SIZE = 1024 * 1024
+# Input is compressed in blocks of these sizes, one block per worker task
+DEFLATE_BLOCK = 1024 * 1024
+XZ_BLOCK = 4 * 1024 * 1024
+# Deflate's window: each block is primed with this much of the input before it
+WINDOW = 32 * 1024
+LEVEL = 6
+XZ_PRESET = 6
+# The dictionary never needs to be larger than a block
+XZ_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": XZ_PRESET, "dict_size": XZ_BLOCK}]
+# .xz stream flags: CRC32 checks, which zlib computes
+XZ_FLAGS = b"\x00\x01"
+ZIP64_LIMIT = 0xFFFFFFFF
+
+
+def archive_format(name: str):
+    """"zip", "gz" or "xz" for an archive file name, or None"""
+    lower = name.lower()
+    if lower.endswith(".zip"):
+        return "zip"
+    if lower.endswith((".tar.gz", ".tgz")):
+        return "gz"
+    if lower.endswith((".tar.xz", ".txz")):
+        return "xz"
+    return None
+
+
+class _Pipeline:
+    """Runs compression tasks on a thread pool, handing results on in order.
+
+    zlib and lzma release the GIL while they work, so threads compress
+    on all cores. At most `window` tasks are queued, which bounds memory
+    to a couple of blocks per worker.
+    """
+
+    def __init__(self, workers: int):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fm-compress")
+        self.window = workers * 2
+        self._queue = deque()
+
+    def submit(self, then, fn, *args):
+        """Run fn(*args) on the pool; then(result) runs here, in submission order"""
+        self._queue.append((self.pool.submit(fn, *args), then))
+        while len(self._queue) > self.window:
+            self._next()
+
+    def after(self, then):
+        """Run then(None) once everything submitted so far has been handed on"""
+        self._queue.append((None, then))
+
+    def _next(self):
+        future, then = self._queue.popleft()
+        then(future.result() if future else None)
+
+    def drain(self):
+        while self._queue:
+            self._next()
+
+    def shutdown(self):
+        self._queue.clear()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _deflate(block: bytes, zdict: bytes, last: bool) -> bytes:
+    if zdict:
+        compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(block) + compressor.flush(
+        zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+class _DeflateStream:
+    """One raw deflate stream, compressed block-parallel the way pigz does it.
+
+    Each block is compressed on its own, primed with the WINDOW bytes
+    before it as a preset dictionary, so the ratio stays close to a
+    serial deflate. Every block but the last ends with a sync flush on a
+    byte boundary, so the pieces concatenate to one valid stream that any
+    inflater reads.
+    """
+
+    def __init__(self, pipeline: _Pipeline, out):
+        self.pipeline = pipeline
+        self.out = out
+        self.crc = 0
+        self.size = 0
+        self.compressed = 0  # bytes written so far
+        self._zdict = b""
+
+    def feed(self, block: bytes, last: bool):
+        self.crc = zlib.crc32(block, self.crc)
+        self.size += len(block)
+        self.pipeline.submit(self._write, _deflate, block, self._zdict, last)
+        self._zdict = block[-WINDOW:]
+
+    def _write(self, data: bytes):
+        self.out.write(data)
+        self.compressed += len(data)
+
+
+class GzipWriter:
+    """Write-only file object producing a .gz of one member.
+
+    Like pigz, the blocks form a single deflate stream rather than
+    concatenated gzip members, which tarfile's stream mode (used by the
+    extractor) would stop reading after the first of.
+    """
+
+    def __init__(self, out, pipeline: _Pipeline):
+        self.out = out
+        # Magic, deflate, no flags, no mtime, no extra flags, OS unknown
+        out.write(b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff")
+        self._stream = _DeflateStream(pipeline, out)
+        self._buf = bytearray()
+
+    def write(self, data) -> int:
+        self._buf += data
+        # Keep a block's worth back: the last block is only known on close
+        while len(self._buf) > DEFLATE_BLOCK:
+            self._stream.feed(bytes(self._buf[:DEFLATE_BLOCK]), False)
+            del self._buf[:DEFLATE_BLOCK]
+        return len(data)
+
+    def close(self):
+        stream = self._stream
+        stream.feed(bytes(self._buf), True)
+        self._buf.clear()
+        stream.pipeline.after(lambda _: self.out.write(
+            struct.pack("<II", stream.crc, stream.size & 0xFFFFFFFF)))
+        stream.pipeline.drain()
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _dict_prop(size: int) -> int:
+    """LZMA2 property byte for the smallest dictionary of at least `size` bytes"""
+    prop = 0
+    while prop < 40 and (2 | prop & 1) << (prop // 2 + 11) < size:
+        prop += 1
+    return prop
+
+
+def _xz_block(block: bytes):
+    """One complete .xz block for `block`: (bytes, unpadded size, uncompressed size)"""
+    data = lzma.compress(block, format=lzma.FORMAT_RAW, filters=XZ_FILTERS)
+    # Flags: one filter, compressed and uncompressed sizes present; then
+    # the LZMA2 filter (id 0x21) with its one property byte
+    head = (b"\xc0" + _varint(len(data)) + _varint(len(block))
+            + bytes((0x21, 1, _dict_prop(XZ_BLOCK))))
+    head += b"\0" * (-(len(head) + 1) % 4)
+    head = bytes(((len(head) + 1) // 4,)) + head  # size byte: total / 4 - 1
+    head += struct.pack("<I", zlib.crc32(head))
+    padding = b"\0" * (-len(data) % 4)
+    check = struct.pack("<I", zlib.crc32(block))
+    return head + data + padding + check, len(head) + len(data) + 4, len(block)
+
+
+class XzWriter:
+    """Write-only file object producing a .xz stream of independent blocks.
+
+    Blocks are compressed in parallel, as xz -T does, and the stream is
+    a single one, so decoders that stop at the end of a stream (such as
+    tarfile's stream mode) see all of it.
+    """
+
+    def __init__(self, out, pipeline: _Pipeline):
+        self.out = out
+        self.pipeline = pipeline
+        self._records = []
+        self._buf = bytearray()
+        out.write(b"\xfd7zXZ\x00" + XZ_FLAGS + struct.pack("<I", zlib.crc32(XZ_FLAGS)))
+
+    def write(self, data) -> int:
+        self._buf += data
+        while len(self._buf) >= XZ_BLOCK:
+            self.pipeline.submit(self._write, _xz_block, bytes(self._buf[:XZ_BLOCK]))
+            del self._buf[:XZ_BLOCK]
+        return len(data)
+
+    def _write(self, result):
+        block, unpadded, size = result
+        self.out.write(block)
+        self._records.append((unpadded, size))
+
+    def close(self):
+        if self._buf:
+            self.pipeline.submit(self._write, _xz_block, bytes(self._buf))
+            self._buf.clear()
+        self.pipeline.drain()
+        index = b"\x00" + _varint(len(self._records)) + b"".join(
+            _varint(unpadded) + _varint(size) for unpadded, size in self._records)
+        index += b"\0" * (-len(index) % 4)
+        index += struct.pack("<I", zlib.crc32(index))
+        backward = struct.pack("<I", len(index) // 4 - 1) + XZ_FLAGS
+        self.out.write(index + struct.pack("<I", zlib.crc32(backward)) + backward + b"YZ")
+
+
+def _dos_time(mtime: float):
+    t = time.localtime(mtime)
+    year = min(max(t.tm_year, 1980), 2107)
+    if year != t.tm_year:
+        return 0, ((year - 1980) << 9) | (1 << 5) | 1
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+class _ZipMember:
+    __slots__ = ("name", "mode", "mtime", "zip64", "method", "offset", "crc", "csize", "usize")
+
+    def __init__(self, name: str, st: os.stat_result, zip64: bool, method: int):
+        self.name = name.encode("utf-8", "surrogateescape")
+        self.mode = st.st_mode
+        self.mtime = st.st_mtime
+        self.zip64 = zip64
+        self.method = method
+        self.offset = self.crc = self.csize = self.usize = 0
+
+
+class ZipWriter:
+    """Writes a .zip whose members are deflated in parallel.
+
+    A member of up to DEFLATE_BLOCK bytes is one task, so small files
+    compress side by side; larger ones are split into blocks like a
+    gzip stream. Each local header is patched with the CRC and sizes
+    once the member's data is out, so `out` must be seekable. ZIP64
+    fields are written where sizes, offsets or the member count need them.
+    """
+
+    def __init__(self, out, pipeline: _Pipeline):
+        self.out = out
+        self.pipeline = pipeline
+        self.members = []
+
+    def add_dir(self, arcname: str, st: os.stat_result):
+        member = _ZipMember(arcname.rstrip("/") + "/", st, False, 0)
+        self.pipeline.after(lambda _: self._local_header(member))
+
+    def add_file(self, job, path: str, arcname: str, st: os.stat_result):
+        member = _ZipMember(arcname, st, st.st_size >= 1 << 31, 8)
+        self.pipeline.after(lambda _: self._local_header(member))
+        stream = _DeflateStream(self.pipeline, self.out)
+        with open(path, "rb") as fh:
+            block = fh.read(DEFLATE_BLOCK)
+            while True:
+                job.check()
+                # Read ahead to know whether this is the member's last block
+                following = fh.read(DEFLATE_BLOCK) if len(block) == DEFLATE_BLOCK else b""
+                stream.feed(block, not following)
+                job.advance(len(block))
+                if not following:
+                    break
+                block = following
+        self.pipeline.after(lambda _: self._finish(member, stream))
+
+    def add_link(self, arcname: str, st: os.stat_result, target: str):
+        """A symlink, stored as Info-ZIP does: the link's mode, the target as data"""
+        member = _ZipMember(arcname, st, False, 8)
+        self.pipeline.after(lambda _: self._local_header(member))
+        stream = _DeflateStream(self.pipeline, self.out)
+        stream.feed(os.fsencode(target), True)
+        self.pipeline.after(lambda _: self._finish(member, stream))
+
+    def _local_header(self, member: _ZipMember):
+        member.offset = self.out.tell()
+        extra = struct.pack("<HHQQ", 1, 16, 0, 0) if member.zip64 else b""
+        sizes = ZIP64_LIMIT if member.zip64 else 0
+        date_time = _dos_time(member.mtime)
+        self.out.write(struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, 45 if member.zip64 else 20, 0x800, member.method,
+            *date_time, 0, sizes, sizes, len(member.name), len(extra)))
+        self.out.write(member.name + extra)
+        self.members.append(member)
+
+    def _finish(self, member: _ZipMember, stream: _DeflateStream):
+        member.crc, member.csize, member.usize = stream.crc, stream.compressed, stream.size
+        if not member.zip64 and max(member.csize, member.usize) >= ZIP64_LIMIT:
+            raise OSError(f"{member.name.decode('utf-8', 'replace')} grew while being archived")
+        end = self.out.tell()
+        self.out.seek(member.offset + 14)
+        if member.zip64:
+            self.out.write(struct.pack("<I", member.crc))
+            self.out.seek(member.offset + 30 + len(member.name) + 4)
+            self.out.write(struct.pack("<QQ", member.usize, member.csize))
+        else:
+            self.out.write(struct.pack("<III", member.crc, member.csize, member.usize))
+        self.out.seek(end)
+
+    def close(self):
+        self.pipeline.drain()
+        out = self.out
+        start = out.tell()
+        for member in self.members:
+            usize, csize, offset = member.usize, member.csize, member.offset
+            wide = [v for v in (usize, csize, offset) if v >= ZIP64_LIMIT]
+            extra = struct.pack(f"<HH{len(wide)}Q", 1, 8 * len(wide), *wide) if wide else b""
+            attributes = (member.mode & 0xFFFF) << 16 | (0x10 if member.method == 0 else 0)
+            out.write(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, 3 << 8 | 45, 45 if wide else 20, 0x800,
+                member.method, *_dos_time(member.mtime), member.crc,
+                min(csize, ZIP64_LIMIT), min(usize, ZIP64_LIMIT), len(member.name), len(extra),
+                0, 0, 0, attributes, min(offset, ZIP64_LIMIT)))
+            out.write(member.name + extra)
+        end = out.tell()
+        count = len(self.members)
+        if count >= 0xFFFF or end - start >= ZIP64_LIMIT or start >= ZIP64_LIMIT:
+            out.write(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0,
+                                  count, count, end - start, start))
+            out.write(struct.pack("<IIQI", 0x07064B50, 0, end, 1))
+        out.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF),
+                              min(count, 0xFFFF), min(end - start, ZIP64_LIMIT),
+                              min(start, ZIP64_LIMIT), 0))
+
+
+class _Reader:
+    """Input file that reports progress and honours pause/cancel as it is read"""
+
+    def __init__(self, fh, job):
+        self.fh = fh
+        self.job = job
+
+    def read(self, size=-1) -> bytes:
+        self.job.check()
+        data = self.fh.read(size)
+        self.job.advance(len(data))
+        return data
+
+
+def _members(items, skip: str):
+    """(path, arcname) for the items and everything below them, parents first"""
+    for path, arcname in items:
+        if path == skip:
+            continue
+        yield path, arcname
+        if not os.path.isdir(path) or os.path.islink(path):
+            continue
+        for root, dirs, files in os.walk(path):
+            rel = os.path.relpath(root, path)
+            base = arcname if rel == "." else f"{arcname}/{rel.replace(os.sep, '/')}"
+            for name in dirs + files:
+                full = os.path.join(root, name)
+                if full != skip:
+                    yield full, f"{base}/{name}"
+
+
+def _write_tar(job, items, skip, fileobj):
+    with tarfile.open(fileobj=fileobj, mode="w|", copybufsize=CHUNK_SIZE) as tar:
+        for path, arcname in _members(items, skip):
+            job.check()
+            job.current = arcname
+            info = tar.gettarinfo(path, arcname)
+            if info is None:  # sockets and the like
+                continue
+            if info.isreg():
+                with open(path, "rb") as fh:
+                    tar.addfile(info, _Reader(fh, job))
+            else:
+                tar.addfile(info)
+            if not os.path.isdir(path):  # as _scan counts them
+                job.advance(files=1)
+
+
+def _write_zip(job, items, skip, writer: ZipWriter):
+    for path, arcname in _members(items, skip):
+        job.check()
+        job.current = arcname
+        try:
+            st = os.lstat(path)
+            if stat.S_ISDIR(st.st_mode):
+                writer.add_dir(arcname, st)
+            elif stat.S_ISREG(st.st_mode):
+                writer.add_file(job, path, arcname, st)
+            elif stat.S_ISLNK(st.st_mode):
+                writer.add_link(arcname, st, os.readlink(path))
+            else:
+                continue  # devices, FIFOs and sockets are left out
+        except FileNotFoundError:
+            continue  # deleted since the walk
+        if not os.path.isdir(path):
+            job.advance(files=1)
+    writer.close()
+
+
+def create_archive(job, items, target, workers=None):
+    """Pack the (path, name in the archive) `items` into `target`. Job worker.
+
+    The format follows the target's name (see archive_format()). Input
+    is streamed in blocks and compressed on `workers` threads (all cores
+    by default); progress counts input bytes. A cancelled or failed
+    archive is removed.
+    """
+    fmt = archive_format(target)
+    if fmt is None:
+        raise ValueError(f"unsupported archive type: {os.path.basename(target)}")
+    for path, _ in items:
+        job.check()
+        _scan(job, path)
+    pipeline = _Pipeline(workers or os.cpu_count() or 1)
+    try:
+        with open(target, "wb") as out:
+            if fmt == "zip":
+                _write_zip(job, items, target, ZipWriter(out, pipeline))
+            else:
+                sink = GzipWriter(out, pipeline) if fmt == "gz" else XzWriter(out, pipeline)
+                _write_tar(job, items, target, sink)
+                sink.close()
+    except BaseException:
+        pipeline.shutdown()
+        try:
+            os.remove(target)
+        except OSError:
+            pass
+        raise
+    finally:
+        pipeline.shutdown()
+        job.current = ""
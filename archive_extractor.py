@@ -2,37 +2,246 @@ import os
 import zipfile
 import tarfile
 import curses
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from curses import textpad
+from jobs import Job, pool_context
+
+CHUNK_SIZE = 1024 * 1024
+# Below this many members process start-up costs more than it saves
+PARALLEL_MIN_MEMBERS = 64
+# Members are handed to workers in batches of roughly this many bytes
+BATCH_BYTES = 32 * 1024 * 1024
+BATCH_MEMBERS = 256
+
+
+def safe_join(root, name):
+    """Resolve an archive member name under root, or None if it escapes"""
+    name = name.replace('\\', '/').lstrip('/')
+    parts = [p for p in name.split('/') if p not in ('', '.')]
+    if not parts or '..' in parts:
+        return None
+    return os.path.join(root, *parts)
+
+
+def stream_to_file(job, fsrc, target, progress=None):
+    """Copy one member stream to disk in chunks, honouring pause/cancel.
+
+    `progress` is called after every chunk with the number of bytes written;
+    by default the job's byte counter is advanced.
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target, 'wb') as out:
+        while True:
+            job.check()
+            buf = fsrc.read(CHUNK_SIZE)
+            if not buf:
+                break
+            out.write(buf)
+            if progress:
+                progress(len(buf))
+            else:
+                job.advance(len(buf))
+
+
+def extract_zip_members(job, file_path, extract_dir, workers=None):
+    """Worker side of ZIP extraction; runs inside a background job.
+
+    Archives with many members are inflated in parallel across a process
+    pool, otherwise members are streamed serially in this thread.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    os.makedirs(extract_dir, exist_ok=True)
+    with zipfile.ZipFile(file_path, 'r') as archive:
+        members = archive.infolist()
+        job.files_total = len(members)
+        job.bytes_total = sum(m.file_size for m in members)
+        if workers > 1 and len(members) >= PARALLEL_MIN_MEMBERS:
+            _extract_zip_parallel(job, file_path, extract_dir, members, workers)
+            return
+        for member in members:
+            job.check()
+            job.current = member.filename
+            target = safe_join(extract_dir, member.filename)
+            if target is None:
+                job.advance(member.file_size, 1)
+                continue
+            if member.is_dir():
+                os.makedirs(target, exist_ok=True)
+            else:
+                with archive.open(member) as fsrc:
+                    stream_to_file(job, fsrc, target)
+            job.advance(files=1)
+    job.current = ""
+
+
+def _zip_batches(members):
+    """Split file members into batches of similar byte volume.
+
+    Members keep central-directory order inside a batch so each worker
+    reads its part of the archive mostly sequentially.
+    """
+    batch, size = [], 0
+    for member in members:
+        batch.append(member.filename)
+        size += member.file_size
+        if size >= BATCH_BYTES or len(batch) >= BATCH_MEMBERS:
+            yield batch, size
+            batch, size = [], 0
+    if batch:
+        yield batch, size
+
+
+def _extract_zip_batch(file_path, extract_dir, names):
+    """Process-pool worker: inflate `names` through its own archive handle"""
+    with zipfile.ZipFile(file_path, 'r') as archive:
+        for name in names:
+            target = safe_join(extract_dir, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with archive.open(name) as fsrc, open(target, 'wb') as out:
+                while True:
+                    buf = fsrc.read(CHUNK_SIZE)
+                    if not buf:
+                        break
+                    out.write(buf)
+    return len(names)
+
+
+def _extract_zip_parallel(job, file_path, extract_dir, members, workers):
+    files = []
+    for member in members:
+        target = safe_join(extract_dir, member.filename)
+        if target is None:
+            job.advance(member.file_size, 1)
+        elif member.is_dir():
+            # Create the directory skeleton up front so workers never race on it
+            os.makedirs(target, exist_ok=True)
+            job.advance(files=1)
+        else:
+            files.append(member)
+
+    batches = _zip_batches(files)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=pool_context())
+    try:
+        pending = {}
+        while True:
+            # Keep only a couple of batches per worker in flight so that
+            # pause and cancel take effect within one batch
+            job.check()
+            for names, size in batches:
+                fut = pool.submit(_extract_zip_batch, file_path, extract_dir, names)
+                pending[fut] = size
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                job.advance(pending.pop(fut), fut.result())
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def extract_tar_members(job, file_path, extract_dir, mode):
+    """Worker side of TAR extraction.
+
+    The archive is read in stream mode (``r|gz``/``r|xz``) so it is
+    decompressed exactly once, front to back. Progress is measured on the
+    compressed input since the uncompressed size is unknown up front.
+    """
+    os.makedirs(extract_dir, exist_ok=True)
+    data_filter = getattr(tarfile, 'data_filter', None)
+    job.bytes_total = os.path.getsize(file_path)
+    with open(file_path, 'rb') as raw, tarfile.open(fileobj=raw, mode=f'r|{mode}') as archive:
+        def progress(_):
+            job.bytes_done = raw.tell()
+
+        for member in archive:
+            job.check()
+            job.current = member.name
+            if data_filter:
+                try:
+                    member = data_filter(member, extract_dir)
+                except tarfile.FilterError:
+                    continue
+            elif safe_join(extract_dir, member.name) is None:
+                continue
+            if member.isreg():
+                target = safe_join(extract_dir, member.name)
+                if target is None:
+                    continue
+                stream_to_file(job, archive.extractfile(member), target, progress)
+                os.chmod(target, member.mode & 0o7777)
+                os.utime(target, (member.mtime, member.mtime))
+            elif data_filter:
+                archive.extract(member, extract_dir, filter='data')
+            else:
+                archive.extract(member, extract_dir)
+            job.advance(files=1)
+            progress(0)
+    job.current = ""
+
+
+def extract_archives(job, items):
+    """Extract (archive, directory) pairs one after another in one job"""
+    for file_path, extract_dir in items:
+        job.check()
+        # Progress restarts with each archive
+        job.bytes_done = job.files_done = job.files_total = 0
+        lower = file_path.lower()
+        if lower.endswith('.zip'):
+            extract_zip_members(job, file_path, extract_dir)
+        else:
+            mode = 'xz' if lower.endswith('.xz') else 'gz'
+            extract_tar_members(job, file_path, extract_dir, mode)
+
 
 class ArchiveExtractor:
     @staticmethod
-    def extract_zip(stdscr, path, filename):
-        """Handle ZIP file extraction"""
-        file_path = os.path.join(path, filename)
-        extract_dir = os.path.join(path, os.path.splitext(filename)[0])
-        
-        # Create confirmation popup
+    def target_name(filename):
+        """Name of the directory an archive is extracted into"""
+        base = os.path.splitext(filename)[0]
+        if base.lower().endswith('.tar'):
+            return base[:-4]
+        return base
+
+    @staticmethod
+    def _confirm(stdscr, title, filename, extract_dir):
         height, width = stdscr.getmaxyx()
         popup_h = 5
         popup_w = 60
         popup = curses.newwin(popup_h, popup_w, height//2 - popup_h//2, width//2 - popup_w//2)
         popup.border()
-        popup.addstr(0, 2, " Extract ZIP Archive ")
+        popup.addstr(0, 2, title)
         popup.addstr(1, 2, f"File: {filename[:popup_w-10]}")
         popup.addstr(2, 2, f"To: {os.path.basename(extract_dir)[:popup_w-10]}")
         popup.addstr(3, 2, "Press Y to confirm, any key to cancel")
         popup.refresh()
 
         key = stdscr.getch()
-        if key in [ord('y'), ord('Y')]:
-            try:
-                os.makedirs(extract_dir, exist_ok=True)
-                with zipfile.ZipFile(file_path, 'r') as archive:
-                    archive.extractall(extract_dir)
-                return True, f"Extracted to {os.path.basename(extract_dir)}"
-            except Exception as e:
-                return False, f"Extraction failed: {str(e)}"
-        return False, "Cancelled"
+        return key in [ord('y'), ord('Y')]
+
+    @staticmethod
+    def extract_zip(stdscr, path, filename):
+        """Confirm ZIP extraction and return the job that performs it"""
+        file_path = os.path.join(path, filename)
+        extract_dir = os.path.join(path, ArchiveExtractor.target_name(filename))
+
+        if not ArchiveExtractor._confirm(stdscr, " Extract ZIP Archive ", filename, extract_dir):
+            return None
+        return Job("extract", file_path, extract_dir,
+                   action=lambda job: extract_zip_members(job, file_path, extract_dir))
+
+    @staticmethod
+    def extract_many(stdscr, path, filenames):
+        """Confirm extracting several archives and return one job for all of them"""
+        items = [(os.path.join(path, f), os.path.join(path, ArchiveExtractor.target_name(f)))
+                 for f in filenames]
+        if not ArchiveExtractor._confirm(stdscr, " Extract Archives ",
+                                         f"{len(filenames)} archives", path):
+            return None
+        return Job("extract", path, path, items=items,
+                   action=lambda job: extract_archives(job, items))
 
     @staticmethod
     def extract_tar_gz(stdscr, path, filename):
@@ -48,27 +257,10 @@ class ArchiveExtractor:
     def _extract_tar(stdscr, path, filename, mode):
         """Internal method for tar extraction"""
         file_path = os.path.join(path, filename)
-        extract_dir = os.path.join(path, os.path.splitext(filename)[0].replace('.tar',''))
+        extract_dir = os.path.join(path, ArchiveExtractor.target_name(filename))
         ext_type = 'GZ' if mode == 'gz' else 'XZ'
 
-        height, width = stdscr.getmaxyx()
-        popup_h = 5
-        popup_w = 60
-        popup = curses.newwin(popup_h, popup_w, height//2 - popup_h//2, width//2 - popup_w//2)
-        popup.border()
-        popup.addstr(0, 2, f" Extract TAR.{ext_type} Archive ")
-        popup.addstr(1, 2, f"File: {filename[:popup_w-10]}")
-        popup.addstr(2, 2, f"To: {os.path.basename(extract_dir)[:popup_w-10]}")
-        popup.addstr(3, 2, "Press Y to confirm, any key to cancel")
-        popup.refresh()
-
-        key = stdscr.getch()
-        if key in [ord('y'), ord('Y')]:
-            try:
-                os.makedirs(extract_dir, exist_ok=True)
-                with tarfile.open(file_path, f'r:{mode}') as archive:
-                    archive.extractall(extract_dir)
-                return True, f"Extracted to {os.path.basename(extract_dir)}"
-            except Exception as e:
-                return False, f"Extraction failed: {str(e)}"
-        return False, "Cancelled"
\ No newline at end of file
+        if not ArchiveExtractor._confirm(stdscr, f" Extract TAR.{ext_type} Archive ", filename, extract_dir):
+            return None
+        return Job("extract", file_path, extract_dir,
+                   action=lambda job: extract_tar_members(job, file_path, extract_dir, mode))
@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import zipfile
+import tarfile
+import shutil
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from entries import FileEntry
+from archive_extractor import safe_join, stream_to_file
+
+# In-memory indexes kept per session, most recently used last
+MAX_CACHED_INDEXES = 8
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'fmanager', 'archives',
+)
+
+
+def _tar_mode(path: str) -> str:
+    return 'r|xz' if path.lower().endswith('.xz') else 'r|gz'
+
+
+def _normalize(name: str) -> str:
+    name = name.replace('\\', '/')
+    while name.startswith('./'):
+        name = name[2:]
+    return name.strip('/')
+
+
+class ArchiveIndex:
+    """Directory tree of an archive's members, built without extracting.
+
+    `dirs` maps an inner directory ("" is the root) to its children, and
+    `members` maps a normalized inner path to the member name stored in the
+    archive, which is what extraction needs.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.dirs: Dict[str, Dict[str, FileEntry]] = {"": {}}
+        self.members: Dict[str, str] = {}
+
+    def add(self, member_name: str, is_dir: bool, size: int, mtime: float, mode: int):
+        inner = _normalize(member_name)
+        if not inner or '..' in inner.split('/'):
+            return
+        self.members[inner] = member_name
+        parent, _, base = inner.rpartition('/')
+        self._ensure_dir(parent)
+        self.dirs[parent][base] = FileEntry(base, is_dir, size, mtime, mode)
+        if is_dir:
+            self.dirs.setdefault(inner, {})
+
+    def _ensure_dir(self, inner: str):
+        # Archives often omit entries for intermediate directories
+        while inner not in self.dirs:
+            self.dirs[inner] = {}
+            parent, _, base = inner.rpartition('/')
+            self._ensure_dir(parent)
+            self.dirs[parent].setdefault(base, FileEntry(base, True, 0, 0.0, 0o40755))
+
+    def listdir(self, inner: str) -> List[FileEntry]:
+        return list(self.dirs.get(inner, {}).values())
+
+    def is_dir(self, inner: str) -> bool:
+        return inner in self.dirs
+
+    def members_under(self, inner: str) -> List[str]:
+        """Archive member names for `inner` and, for directories, everything below it"""
+        prefix = inner + '/'
+        return [m for p, m in self.members.items() if p == inner or p.startswith(prefix)]
+
+    def to_rows(self) -> list:
+        rows = []
+        for inner, member in self.members.items():
+            parent, _, base = inner.rpartition('/')
+            e = self.dirs[parent][base]
+            rows.append([member, e.is_dir, e.size, e.mtime, e.mode])
+        return rows
+
+
+def _build_zip(path: str) -> ArchiveIndex:
+    index = ArchiveIndex(path)
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            mode = info.external_attr >> 16
+            mtime = _zip_mtime(info.date_time)
+            index.add(info.filename, info.is_dir(), info.file_size, mtime, mode)
+    return index
+
+
+def _zip_mtime(date_time) -> float:
+    try:
+        return time.mktime(date_time + (0, 0, -1))
+    except (OverflowError, ValueError):
+        return 0.0
+
+
+def _build_tar(path: str) -> ArchiveIndex:
+    # Compressed tars have no random access: one streaming pass over headers
+    index = ArchiveIndex(path)
+    with tarfile.open(path, _tar_mode(path)) as archive:
+        for member in archive:
+            index.add(member.name, member.isdir(), member.size, member.mtime, member.mode)
+    return index
+
+
+def _disk_cache_path(path: str) -> str:
+    return os.path.join(CACHE_DIR, hashlib.sha1(path.encode('utf-8', 'surrogateescape')).hexdigest() + '.json')
+
+
+def _load_disk_cache(path: str, key: Tuple) -> Optional[ArchiveIndex]:
+    try:
+        with open(_disk_cache_path(path)) as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if data.get('key') != list(key):
+        return None
+    index = ArchiveIndex(path)
+    for row in data['rows']:
+        index.add(*row)
+    return index
+
+
+def _save_disk_cache(path: str, key: Tuple, index: ArchiveIndex):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = _disk_cache_path(path) + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump({'key': list(key), 'rows': index.to_rows()}, fh)
+        os.replace(tmp, _disk_cache_path(path))
+    except OSError:
+        pass
+
+
+_indexes: "OrderedDict[Tuple, ArchiveIndex]" = OrderedDict()
+
+
+def get_index(path: str) -> ArchiveIndex:
+    """Member index for `path`, cached by (path, size, mtime).
+
+    ZIP indexes come straight from the central directory. TAR indexes need
+    a full decompression pass, so they are also persisted under
+    ~/.cache/fmanager and a compressed tarball is only ever scanned once.
+    """
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime)
+    index = _indexes.get(key)
+    if index is not None:
+        _indexes.move_to_end(key)
+        return index
+    if path.lower().endswith('.zip'):
+        index = _build_zip(path)
+    else:
+        index = _load_disk_cache(path, key)
+        if index is None:
+            index = _build_tar(path)
+            _save_disk_cache(path, key, index)
+    _indexes[key] = index
+    while len(_indexes) > MAX_CACHED_INDEXES:
+        _indexes.popitem(last=False)
+    return index
+
+
+def extract_members(job, archive_path: str, inner_dir: str, names: List[str], dest_dir: str):
+    """Extract the selected entries of `inner_dir` into `dest_dir`.
+
+    Runs as a background job. Paths are written relative to `inner_dir`,
+    so extracting "docs" while browsing "pkg/" creates dest_dir/docs.
+    Members that cannot be written (unsafe paths, devices, hard links to
+    entries that were not extracted) are not counted as done; their names
+    end up in job.error.
+    """
+    index = get_index(archive_path)
+    wanted = set()
+    for name in names:
+        inner = f"{inner_dir}/{name}" if inner_dir else name
+        wanted.update(index.members_under(inner))
+    job.files_total = len(wanted)
+    strip = len(inner_dir) + 1 if inner_dir else 0
+
+    def target_for(member_name):
+        return safe_join(dest_dir, _normalize(member_name)[strip:])
+
+    def link_source(linkname):
+        # Hard link names are relative to the archive root, not inner_dir
+        name = _normalize(linkname)
+        if inner_dir and not name.startswith(inner_dir + '/'):
+            return None
+        return target_for(name)
+
+    # Symlinks created earlier must not carry later members out of dest_dir
+    root = os.path.join(os.path.realpath(dest_dir), '')
+
+    def inside(target):
+        return os.path.join(os.path.realpath(target), '').startswith(root)
+
+    skipped = []
+
+    if archive_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as archive:
+            infos = [archive.getinfo(m) for m in wanted]
+            job.bytes_total = sum(i.file_size for i in infos)
+            for info in infos:
+                job.check()
+                job.current = info.filename
+                target = target_for(info.filename)
+                if target is None or not inside(target):
+                    skipped.append(info.filename)
+                    continue
+                if info.is_dir():
+                    os.makedirs(target, exist_ok=True)
+                else:
+                    with archive.open(info) as fsrc:
+                        stream_to_file(job, fsrc, target)
+                job.advance(files=1)
+    else:
+        data_filter = getattr(tarfile, 'data_filter', None)
+        job.bytes_total = os.path.getsize(archive_path)
+        with open(archive_path, 'rb') as raw, \
+                tarfile.open(fileobj=raw, mode=_tar_mode(archive_path)) as archive:
+            for member in archive:
+                job.bytes_done = raw.tell()
+                if member.name not in wanted:
+                    continue
+                job.check()
+                job.current = member.name
+                wanted.discard(member.name)
+                target = target_for(member.name)
+                mode = member.mode
+                if target is not None and data_filter:
+                    # Filter under the name the member gets below dest_dir, so
+                    # link targets are checked from where the link is created.
+                    # Like extract_tar_members, keep the mode the filter leaves.
+                    try:
+                        mode = data_filter(member.replace(name=os.path.relpath(target, dest_dir),
+                                                          deep=False), dest_dir).mode
+                    except tarfile.FilterError:
+                        target = None
+                source = link_source(member.linkname) if member.islnk() else None
+                extracted = target is not None and inside(target)
+                if not extracted:
+                    pass
+                elif member.isdir():
+                    os.makedirs(target, exist_ok=True)
+                elif member.isreg():
+                    stream_to_file(job, archive.extractfile(member), target,
+                                    lambda _: setattr(job, 'bytes_done', raw.tell()))
+                    os.chmod(target, mode & 0o7777)
+                    os.utime(target, (member.mtime, member.mtime))
+                elif member.issym() and not os.path.isabs(member.linkname) and inside(
+                        os.path.join(os.path.dirname(target), member.linkname)):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.symlink(member.linkname, target)
+                elif (source is not None and source != target and inside(source)
+                        and os.path.isfile(source)):
+                    # The stream cannot seek back to the data, so link to (or
+                    # copy) the copy already extracted, as tarfile does
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    if os.path.lexists(target):
+                        os.unlink(target)
+                    try:
+                        os.link(source, target)
+                    except OSError:
+                        shutil.copy2(source, target)
+                else:
+                    extracted = False
+                if extracted:
+                    job.advance(files=1)
+                else:
+                    skipped.append(member.name)
+                if not wanted:
+                    break
+    job.current = ""
+    if skipped:
+        shown = ", ".join(skipped[:3]) + (", ..." if len(skipped) > 3 else "")
+        job.error = f"skipped {len(skipped)}: {shown}"
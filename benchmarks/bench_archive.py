@@ -0,0 +1,97 @@
+"""Parallel archive creation vs single-threaded tarfile/zipfile.
+
+    python benchmarks/bench_archive.py [--json] [--repeat N] [--scale S] [--workers N]
+
+The tree mixes many small log files with a few large ones. Both sides
+use the same settings (deflate level 6, xz preset 6), so the size column
+shows what the parallel block layout costs in compression ratio.
+"""
+import os
+import argparse
+import tarfile
+import zipfile
+import tempfile
+
+from common import BenchJob, timed, summarize, emit
+
+import archive_creator
+
+LINE = "2024-01-01T00:00:%02d INFO worker-%d request %d took %d ms\n"
+
+
+def build_tree(root, small, large, scale):
+    """`small` 16 KiB and `large` 8 MiB log files, counts multiplied by `scale`"""
+    n = 0
+    for kind, count, size in (("small", int(small * scale), 16 * 1024),
+                              ("large", max(1, int(large * scale)), 8 * 1024 * 1024)):
+        directory = os.path.join(root, kind)
+        os.makedirs(directory, exist_ok=True)
+        for i in range(count):
+            lines = []
+            length = 0
+            while length < size:
+                line = LINE % (n % 60, n % 17, n * 7919 % 1000003, n % 997)
+                lines.append(line)
+                length += len(line)
+                n += 1
+            with open(os.path.join(directory, f"{i:05d}.log"), "w") as fh:
+                fh.write("".join(lines)[:size])
+
+
+def tree_bytes(root):
+    return sum(os.path.getsize(os.path.join(r, f)) for r, _, files in os.walk(root) for f in files)
+
+
+def stdlib_tar(src, target, mode):
+    options = {"compresslevel": archive_creator.LEVEL} if mode == "gz" else {
+        "preset": archive_creator.XZ_PRESET}
+    with tarfile.open(target, f"w:{mode}", **options) as tar:
+        tar.add(src, "src")
+
+
+def stdlib_zip(src, target):
+    with zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED,
+                         compresslevel=archive_creator.LEVEL) as zf:
+        for root, dirs, files in os.walk(src):
+            for name in dirs + files:
+                path = os.path.join(root, name)
+                zf.write(path, os.path.join("src", os.path.relpath(path, src)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply file counts")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="fm-bench-archive-") as tmp:
+        src = os.path.join(tmp, "src")
+        build_tree(src, 500, 2, args.scale)
+        total = tree_bytes(src)
+
+        for suffix, fmt in ((".tar.gz", "gz"), (".tar.xz", "xz"), (".zip", "zip")):
+            target = os.path.join(tmp, "out" + suffix)
+            runs = {
+                "stdlib": (lambda: stdlib_zip(src, target)) if fmt == "zip"
+                else (lambda: stdlib_tar(src, target, fmt)),
+                "parallel": lambda: archive_creator.create_archive(
+                    BenchJob(), [(src, "src")], target, args.workers),
+            }
+            for label, fn in runs.items():
+                stats = summarize(timed(fn, args.repeat))
+                stats["mb_per_s"] = total / stats["p50"] / 1e6
+                stats["ratio"] = os.path.getsize(target) / total
+                stats["workers"] = 1 if label == "stdlib" else args.workers
+                results[f"archive.{fmt}.{label}"] = stats
+            parallel = results[f"archive.{fmt}.parallel"]
+            parallel["speedup"] = results[f"archive.{fmt}.stdlib"]["p50"] / parallel["p50"]
+            os.remove(target)
+
+    emit(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
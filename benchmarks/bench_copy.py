@@ -0,0 +1,61 @@
+"""Compare copy_engine.copy_tree against shutil.copytree on synthetic trees.
+
+    python benchmarks/bench_copy.py [--json] [--repeat N] [--scale S]
+
+Page cache is not dropped between runs, so numbers reflect warm-cache
+throughput; run with a larger --scale for disk-bound measurements.
+"""
+import os
+import shutil
+import argparse
+import tempfile
+
+from common import make_tree, timed, summarize, emit
+
+import copy_engine
+
+# name -> (file count, file size, files per subdirectory)
+TREES = {
+    "small_files": (5000, 4 * 1024, 500),
+    "medium_files": (500, 256 * 1024, 100),
+    "huge_files": (4, 64 * 1024 * 1024, 0),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply file counts")
+    parser.add_argument("--workers", type=int, default=copy_engine.DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="fm-bench-copy-") as tmp:
+        for name, (count, size, fanout) in TREES.items():
+            count = max(1, int(count * args.scale))
+            src = make_tree(os.path.join(tmp, name), count, size, fanout)
+            dst = os.path.join(tmp, name + ".out")
+
+            def clean():
+                shutil.rmtree(dst, ignore_errors=True)
+
+            candidates = {
+                "shutil": lambda: shutil.copytree(src, dst),
+                "engine": lambda: copy_engine.copy_tree(src, dst, workers=args.workers),
+            }
+            for label, fn in candidates.items():
+                stats = summarize(timed(fn, args.repeat, setup=clean))
+                stats["bytes"] = count * size
+                stats["files"] = count
+                stats["mb_per_s"] = count * size / stats["p50"] / 1e6
+                results[f"copy.{name}.{label}"] = stats
+            clean()
+            base = results[f"copy.{name}.shutil"]["p50"]
+            results[f"copy.{name}.engine"]["speedup"] = base / results[f"copy.{name}.engine"]["p50"]
+
+    emit(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Terminal traffic and draw cost per keystroke, damage tracking vs full repaint.
+
+    python benchmarks/bench_render.py [--json] [--files N] [--lines L] [--cols C]
+
+The real UI runs on a pseudo-terminal. Bytes are counted on the master
+side, which is what would cross an SSH connection. Draw times are
+measured inside the UI process.
+"""
+import os
+import pty
+import sys
+import json
+import time
+import select
+import argparse
+import tempfile
+
+from common import ROOT, summarize, emit
+
+KEYS = {
+    "down": b"\x1bOB",
+    "up": b"\x1bOA",
+    "pgdn": b"\x1b[6~",
+    "pgup": b"\x1b[5~",
+    "tab": b"\t",
+}
+QUIT = b"\x1b[21~"  # F10
+
+
+def run_ui(home, full, report_fd):
+    """Child side: run the file manager and report its own measurements"""
+    import curses
+    from file_manager import FileManager
+
+    draws = []
+    stats = {}
+
+    def main(stdscr):
+        curses.start_color()
+        manager = FileManager(stdscr)
+        manager.renderer.full = full
+        draw = manager.draw
+
+        def timed_draw():
+            start = time.perf_counter()
+            draw()
+            draws.append(time.perf_counter() - start)
+            if len(draws) == 1:
+                stats["startup_bytes"] = manager.renderer.bytes_total
+
+        manager.draw = timed_draw
+        manager.run()
+        stats.update(manager.renderer.stats())
+
+    os.chdir(ROOT)
+    os.environ["HOME"] = home
+    curses.wrapper(main)
+    stats["draws"] = draws[1:]  # the first frame paints everything in both modes
+    os.write(report_fd, json.dumps(stats).encode())
+    os._exit(0)
+
+
+def drain(fd, quiet=0.1):
+    """Read until the terminal has been quiet for `quiet` seconds"""
+    total = 0
+    while True:
+        ready, _, _ = select.select([fd], [], [], quiet)
+        if not ready:
+            return total
+        try:
+            total += len(os.read(fd, 65536))
+        except OSError:
+            return total
+
+
+def measure(home, full, keys, lines, cols):
+    read_fd, write_fd = os.pipe()
+    os.environ.update(TERM="xterm-256color", LINES=str(lines), COLUMNS=str(cols))
+    pid, fd = pty.fork()
+    if pid == 0:
+        os.close(read_fd)
+        run_ui(home, full, write_fd)
+    os.close(write_fd)
+    drain(fd, 1.0)
+    per_key = []
+    for key in keys:
+        os.write(fd, KEYS[key])
+        per_key.append(drain(fd))
+    os.write(fd, QUIT)
+    drain(fd, 0.5)
+    report = b""
+    while True:
+        chunk = os.read(read_fd, 65536)
+        if not chunk:
+            break
+        report += chunk
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    stats = json.loads(report)
+    row = {f"wire_{k}": v for k, v in summarize(per_key).items() if k != "n"}
+    row["wire_bytes_per_key"] = sum(per_key) / len(per_key)
+    row["app_bytes_per_key"] = (stats["bytes"] - stats["startup_bytes"]) / stats["keys"]
+    draw = summarize(stats["draws"])
+    row["draw_p50_ms"] = draw["p50"] * 1000
+    row["draw_p95_ms"] = draw["p95"] * 1000
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--lines", type=int, default=50)
+    parser.add_argument("--cols", type=int, default=160)
+    parser.add_argument("--moves", type=int, default=40, help="cursor moves each way")
+    args = parser.parse_args()
+
+    keys = ["down"] * args.moves + ["up"] * args.moves + ["pgdn"] * 3 + ["pgup"] * 3 + ["tab"] * 2
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="fm-bench-render-") as home:
+        for i in range(args.files):
+            open(os.path.join(home, f"file{i:05d}.txt"), "w").close()
+        for label, full in (("full_repaint", True), ("damage", False)):
+            results[f"render.{label}"] = measure(home, full, keys, args.lines, args.cols)
+    emit(results, args.json)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
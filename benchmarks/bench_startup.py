@@ -0,0 +1,133 @@
+"""Startup cost: module import time and time to the first frame.
+
+    python benchmarks/bench_startup.py [--json] [--runs N] [--home-files N] [--check]
+
+Import time is the cumulative time of ``file_manager`` reported by
+``python -X importtime``. Frame times run main.py in a fresh interpreter
+against benchmarks/fakecurses.py and are measured from just before the
+process is spawned, so they include interpreter startup; a bare
+``python -c pass`` is reported alongside for reference. The home
+directory is a temporary one holding --home-files files.
+
+With --check the exit status is 1 when a median exceeds BUDGET_MS.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+from common import ROOT, summarize, emit
+
+# Regression budget for the medians, in milliseconds. Generous on purpose:
+# it should catch a heavy module creeping back into the startup path, not
+# scheduler noise.
+BUDGET_MS = {
+    "import_ms": 50.0,
+    "first_frame_ms": 100.0,
+}
+
+CHILD = """
+import sys
+sys.path[:0] = [{root!r}, {bench!r}]
+import fakecurses
+fakecurses.install()
+import curses, json, main
+curses.wrapper(main.main)
+with open({report!r}, "w") as fh:
+    json.dump(fakecurses.frames, fh)
+"""
+
+
+def import_time(env):
+    """Cumulative import time of file_manager in ms, and the heaviest modules"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import file_manager"],
+                          cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    modules = []
+    total = 0.0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, cumulative, name = (f.strip() for f in line[len("import time:"):].split("|"))
+        if not own.isdigit():
+            continue  # header line
+        modules.append((int(own), name))
+        if name == "file_manager":
+            total = int(cumulative) / 1000
+    heaviest = sorted(modules, reverse=True)[:5]
+    return total, heaviest
+
+
+def frame_times(env):
+    """(first frame, first frame with the panels listed) in ms after spawning.
+
+    The child quits at its first getch(), so the last frame is the one
+    drawn after listing; before lazy listing it was also the first.
+    """
+    fd, report = tempfile.mkstemp(prefix="fm-bench-startup-", suffix=".json")
+    os.close(fd)
+    try:
+        code = CHILD.format(root=ROOT, bench=os.path.join(ROOT, "benchmarks"), report=report)
+        start = time.monotonic()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True,
+                       stdin=subprocess.DEVNULL)
+        with open(report) as fh:
+            frames = json.load(fh)
+    finally:
+        os.unlink(report)
+    return (frames[0] - start) * 1000, (frames[-1] - start) * 1000
+
+
+def python_startup(env):
+    start = time.monotonic()
+    subprocess.run([sys.executable, "-c", "pass"], env=env, check=True)
+    return (time.monotonic() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--home-files", type=int, default=5000)
+    parser.add_argument("--check", action="store_true",
+                        help="fail when a median is over its budget")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="fm-bench-home-") as home:
+        for i in range(args.home_files):
+            open(os.path.join(home, f"file{i:06d}.txt"), "w").close()
+        env = dict(os.environ, HOME=home, PYTHONDONTWRITEBYTECODE="1")
+        env.pop("PYTHONPROFILEIMPORTTIME", None)
+        samples = {"python_ms": [], "import_ms": [], "first_frame_ms": [], "listed_frame_ms": []}
+        heaviest = []
+        for _ in range(args.runs):
+            samples["python_ms"].append(python_startup(env))
+            total, heaviest = import_time(env)
+            samples["import_ms"].append(total)
+            first, listed = frame_times(env)
+            samples["first_frame_ms"].append(first)
+            samples["listed_frame_ms"].append(listed)
+
+    results = {}
+    for name, values in samples.items():
+        row = summarize(values)
+        if name in BUDGET_MS:
+            row["budget"] = BUDGET_MS[name]
+        results[f"startup.{name}"] = row
+    results["startup.heaviest_imports_us"] = {name: own for own, name in heaviest}
+    emit(results, args.json)
+
+    if args.check:
+        over = [f"{name}: {results[f'startup.{name}']['p50']:.1f} ms > {budget:.1f} ms"
+                for name, budget in BUDGET_MS.items()
+                if results[f"startup.{name}"]["p50"] > budget]
+        for line in over:
+            print(f"over budget: {line}", file=sys.stderr)
+        return 1 if over else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
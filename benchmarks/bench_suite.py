@@ -0,0 +1,289 @@
+"""Headless benchmarks of the listing, navigation, drawing, search, paste and extraction paths.
+
+    python benchmarks/bench_suite.py [--json] [--sizes 1k,100k,1m] [--repeat N] [--keep DIR]
+
+The real FilePanel and FileManager code runs against
+benchmarks/fakecurses.py, so no terminal is needed. For every operation
+the report has latency percentiles in seconds (n/min/p50/p95/p99/max),
+filesystem calls per run as counted by fscalls.FsCounter (fs_*), and
+the peak of Python allocations during one extra run under tracemalloc
+(peak_kib). Synthetic trees:
+
+    wide_<size>    one directory holding <size> empty files
+    deep_<size>    <size> entries nested FANOUT wide, PER_DIR files per directory
+    small_files    --small-files files of 4 KiB, for paste and extraction
+    huge_files     --huge-files files of --huge-mb MiB, for paste
+
+Creating the 1m trees takes a while; with --keep DIR they are built
+once and reused by later runs.
+"""
+import os
+import sys
+import time
+import shutil
+import tarfile
+import zipfile
+import argparse
+import resource
+import tempfile
+import tracemalloc
+
+from common import ROOT, make_tree, summarize, emit
+import fakecurses
+
+fakecurses.install()
+
+from file_manager import FileManager  # noqa: E402 (needs the fake curses)
+from panel import FilePanel  # noqa: E402
+from finder import Finder, Query  # noqa: E402
+from fscalls import FsCounter  # noqa: E402
+
+SIZES = {"1k": 1000, "100k": 100000, "1m": 1000000}
+FANOUT = 10
+PER_DIR = 100
+# Samples for operations that take microseconds
+MICRO_SAMPLES = 2000
+
+
+def make_wide(root, count):
+    os.makedirs(root, exist_ok=True)
+    for i in range(count):
+        open(os.path.join(root, f"f{i:07d}.txt"), "w").close()
+
+
+def make_deep(root, count):
+    """`count` entries: each directory gets PER_DIR files and FANOUT subdirectories"""
+    level = [root]
+    made = 0
+    while made < count:
+        below = []
+        for d in level:
+            os.makedirs(d, exist_ok=True)
+            for i in range(min(PER_DIR, count - made)):
+                open(os.path.join(d, f"f{made:07d}.dat"), "w").close()
+                made += 1
+            for i in range(FANOUT):
+                if made >= count:
+                    break
+                below.append(os.path.join(d, f"d{i}"))
+                made += 1
+            if made >= count:
+                break
+        level = below
+        if not level:
+            break
+    for d in level:
+        os.makedirs(d, exist_ok=True)
+
+
+def build(path, maker, *args):
+    """Run maker(path, *args) unless a previous run finished building `path`"""
+    done = path + ".done"
+    if not os.path.exists(done):
+        shutil.rmtree(path, ignore_errors=True)
+        maker(path, *args)
+        open(done, "w").close()
+    return path
+
+
+def wait_loaded(panel):
+    while panel.tick():
+        time.sleep(0.001)
+
+
+def wait_jobs(manager):
+    while manager.jobs.pending():
+        manager.jobs.poll()
+        time.sleep(0.001)
+
+
+def measure(fn, repeat, setup=None, memory=True):
+    """Run fn() `repeat` times; latency, filesystem calls per run and peak memory"""
+    samples = []
+    counter = FsCounter()
+    for _ in range(repeat):
+        if setup:
+            setup()
+        counter.start()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+        counter.stop()
+    row = summarize(samples)
+    for kind, n in sorted(counter.counts.items()):
+        row[f"fs_{kind}"] = n / repeat
+    if memory:
+        if setup:
+            setup()
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        row["peak_kib"] = (tracemalloc.get_traced_memory()[1] - base) // 1024
+        tracemalloc.stop()
+    return row
+
+
+def bench_listing(results, manager, tag, wide, deep, repeat):
+    results[f"list.{tag}.first_rows"] = measure(lambda: FilePanel(wide), repeat)
+    results[f"list.{tag}.complete"] = measure(lambda: wait_loaded(FilePanel(wide)), repeat)
+
+    panel = FilePanel(wide)
+    wait_loaded(panel)
+    manager.left_panel = panel
+    manager.active_panel = "left"
+    height, width = manager.stdscr.getmaxyx()
+    panel_width = max((width - 4) // 2, 10)
+
+    results[f"navigate.{tag}.line"] = measure(lambda: panel.navigate(1), MICRO_SAMPLES, memory=False)
+    results[f"navigate.{tag}.page"] = measure(lambda: panel.page(1), MICRO_SAMPLES, memory=False)
+
+    def draw_panel():
+        manager.draw_panel(panel, "left", 2, 1, height - 4, panel_width, True)
+
+    panel.jump(0)
+    draw_panel()
+    results[f"draw_panel.{tag}.line"] = measure(
+        draw_panel, MICRO_SAMPLES, setup=lambda: panel.navigate(1), memory=False)
+    results[f"draw_panel.{tag}.page"] = measure(
+        draw_panel, MICRO_SAMPLES // 10, setup=lambda: panel.page(1), memory=False)
+    results[f"draw.{tag}.frame"] = measure(
+        manager.draw, MICRO_SAMPLES // 10, setup=lambda: panel.navigate(1), memory=False)
+
+    def unsorted():
+        panel.set_sort("name")
+        panel._listing_changed()  # forget memoized orderings
+
+    for mode in ("natural", "mtime"):
+        results[f"sort.{tag}.{mode}"] = measure(
+            lambda: panel.set_sort(mode), repeat, setup=unsorted)
+    panel.set_sort("mtime")
+    results[f"sort.{tag}.toggle"] = measure(
+        lambda: panel.set_sort("name" if panel.sort_mode == "mtime" else "mtime"),
+        MICRO_SAMPLES // 10, memory=False)
+    panel.set_sort("name")
+
+    clear = lambda: panel.set_filter("")  # noqa: E731
+    results[f"filter.{tag}.substring"] = measure(
+        lambda: panel.set_filter("123"), repeat, setup=clear)
+    results[f"filter.{tag}.fuzzy"] = measure(
+        lambda: panel.set_filter("f12", fuzzy=True), repeat, setup=clear)
+    clear()
+
+    def find():
+        finder = Finder(deep, Query("*7*"))
+        finder.start()
+        while finder.running:
+            time.sleep(0.001)
+    results[f"find.{tag}.glob"] = measure(find, repeat)
+
+
+def bench_paste(results, manager, name, src, work, repeat):
+    """F6 on `src` in the left panel, F8 into `work` in the right panel"""
+    left = FilePanel(os.path.dirname(src))
+    left.select(os.path.basename(src))
+    right = FilePanel(work)
+    manager.left_panel, manager.right_panel = left, right
+    dest = os.path.join(work, os.path.basename(src))
+
+    def paste():
+        manager.active_panel = "left"
+        manager.copy_file()
+        manager.active_panel = "right"
+        manager.paste_file()
+        wait_jobs(manager)
+
+    def clean():
+        shutil.rmtree(dest, ignore_errors=True)
+        right.refresh_files()
+
+    results[f"paste.{name}"] = measure(paste, repeat, setup=clean)
+    clean()
+
+
+def bench_extract(results, manager, work, archives, repeat):
+    """Extraction of each archive through its key binding and confirmation"""
+    panel = FilePanel(work)
+    manager.left_panel = panel
+    manager.active_panel = "left"
+    actions = {".zip": manager.extract_zip, ".tar.gz": manager.extract_tar_gz}
+    for suffix, archive in archives.items():
+        target = archive[:-len(suffix)]
+
+        def extract():
+            panel.select(os.path.basename(archive))
+            fakecurses.feed([ord("y")])
+            actions[suffix]()
+            wait_jobs(manager)
+
+        def clean():
+            shutil.rmtree(target, ignore_errors=True)
+            panel.refresh_files()
+
+        results[f"extract.small_files{suffix}"] = measure(extract, repeat, setup=clean)
+        clean()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--sizes", default="1k,100k", help=f"comma separated, of {', '.join(SIZES)}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", help="build trees here and reuse them across runs")
+    parser.add_argument("--small-files", type=int, default=2000)
+    parser.add_argument("--huge-files", type=int, default=2)
+    parser.add_argument("--huge-mb", type=int, default=64)
+    args = parser.parse_args()
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"unknown size: {', '.join(unknown)}")
+
+    os.chdir(ROOT)  # colors.settings
+    tmp = None
+    if args.keep:
+        base = os.path.abspath(args.keep)
+        os.makedirs(base, exist_ok=True)
+    else:
+        tmp = tempfile.TemporaryDirectory(prefix="fm-bench-suite-")
+        base = tmp.name
+    os.environ["HOME"] = base
+    manager = FileManager(fakecurses.initscr())
+    results = {}
+    try:
+        for tag in sizes:
+            wide = build(os.path.join(base, f"wide_{tag}"), make_wide, SIZES[tag])
+            deep = build(os.path.join(base, f"deep_{tag}"), make_deep, SIZES[tag])
+            bench_listing(results, manager, tag, wide, deep, args.repeat)
+
+        small = build(os.path.join(base, "small_files"), make_tree,
+                      args.small_files, 4096, 200)
+        huge = build(os.path.join(base, "huge_files"), make_tree,
+                     args.huge_files, args.huge_mb * 1024 * 1024)
+        work = os.path.join(base, "work")
+        shutil.rmtree(work, ignore_errors=True)
+        os.makedirs(work)
+        bench_paste(results, manager, "small_files", small, work, args.repeat)
+        bench_paste(results, manager, "huge_files", huge, work, args.repeat)
+
+        archives = {".zip": os.path.join(work, "small_files.zip"),
+                    ".tar.gz": os.path.join(work, "small_files.tar.gz")}
+        with zipfile.ZipFile(archives[".zip"], "w", zipfile.ZIP_DEFLATED) as zf:
+            for root, _, files in os.walk(small):
+                for f in files:
+                    path = os.path.join(root, f)
+                    zf.write(path, os.path.relpath(path, base))
+        with tarfile.open(archives[".tar.gz"], "w:gz") as tf:
+            tf.add(small, "small_files")
+        bench_extract(results, manager, work, archives, args.repeat)
+        shutil.rmtree(work, ignore_errors=True)
+    finally:
+        manager.jobs.shutdown()
+        if tmp is not None:
+            tmp.cleanup()
+
+    results["process"] = {"maxrss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    emit(results, args.json)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Serial vs process-pool ZIP extraction on a synthetic archive.
+
+    python benchmarks/bench_zip.py [--json] [--members N] [--size BYTES]
+
+Members are filled with compressible text so inflate cost dominates.
+"""
+import os
+import shutil
+import zipfile
+import argparse
+import tempfile
+
+from common import BenchJob, timed, summarize, emit
+
+import archive_extractor
+
+
+def build_archive(path, members, size):
+    line = b"2024-01-01T00:00:00 INFO fmanager benchmark line %08d payload\n"
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(members):
+            body = b"".join(line % (i * 1000 + n) for n in range(size // len(line) + 1))[:size]
+            zf.writestr(f"dir{i % 32:02d}/member{i:06d}.log", body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="machine-readable output")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=16 * 1024)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="fm-bench-zip-") as tmp:
+        archive = os.path.join(tmp, "bench.zip")
+        build_archive(archive, args.members, args.size)
+        out = os.path.join(tmp, "out")
+
+        def clean():
+            shutil.rmtree(out, ignore_errors=True)
+
+        modes = {"serial": 1, "parallel": max(2, args.workers)}
+        for label, workers in modes.items():
+            fn = lambda: archive_extractor.extract_zip_members(BenchJob(), archive, out, workers)
+            stats = summarize(timed(fn, args.repeat, setup=clean))
+            stats["members"] = args.members
+            stats["workers"] = workers
+            stats["mb_per_s"] = args.members * args.size / stats["p50"] / 1e6
+            results[f"unzip.{label}"] = stats
+        clean()
+        results["unzip.parallel"]["speedup"] = results["unzip.serial"]["p50"] / results["unzip.parallel"]["p50"]
+
+    emit(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
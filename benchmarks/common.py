@@ -0,0 +1,92 @@
+"""Shared helpers for the benchmark scripts in this directory.
+
+The scripts are meant to be run from the repository root, e.g.
+``python benchmarks/bench_copy.py --json``.
+"""
+import os
+import sys
+import json
+import time
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def make_tree(root, files, size, fanout=0, seed=b"fmanager"):
+    """Create `files` files of `size` bytes under `root`.
+
+    With fanout > 0 the files are spread over subdirectories holding at
+    most `fanout` files each, otherwise they all land in `root`.
+    """
+    os.makedirs(root, exist_ok=True)
+    block = (seed * (1 + 65536 // len(seed)))[:65536]
+    for i in range(files):
+        d = os.path.join(root, f"d{i // fanout:05d}") if fanout else root
+        if fanout and i % fanout == 0:
+            os.makedirs(d, exist_ok=True)
+        with open(os.path.join(d, f"f{i:07d}.dat"), "wb") as fh:
+            left = size
+            while left > 0:
+                n = min(left, len(block))
+                fh.write(block[:n])
+                left -= n
+    return root
+
+
+def timed(fn, repeat=3, setup=None):
+    """Run fn() `repeat` times and return wall-clock samples in seconds"""
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        "n": len(ordered),
+        "min": ordered[0],
+        "p50": statistics.median(ordered),
+        "p95": pct(95),
+        "p99": pct(99),
+        "max": ordered[-1],
+    }
+
+
+def emit(results, as_json):
+    """Print results either as JSON (for tracking) or as a readable table"""
+    if as_json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+        return
+    for name, row in results.items():
+        fields = "  ".join(
+            f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}"
+            for k, v in row.items()
+        )
+        print(f"{name:<32} {fields}")
+
+
+class BenchJob:
+    """Stand-in for jobs.Job when driving worker functions directly"""
+
+    def __init__(self):
+        self.bytes_done = self.bytes_total = 0
+        self.files_done = self.files_total = 0
+        self.current = ""
+
+    def check(self):
+        pass
+
+    def advance(self, nbytes=0, files=0):
+        self.bytes_done += nbytes
+        self.files_done += files
@@ -0,0 +1,140 @@
+"""Headless stand-in for the curses module, for benchmarks.
+
+install() registers this module as ``curses`` (and ``curses.textpad``)
+before the file manager is imported, so the real UI code runs without a
+terminal. Windows keep their text in memory, keys come from a script
+(F10 once it runs out, which quits the file manager) and every
+doupdate() is timestamped, which gives frame times.
+"""
+import sys
+import time
+import types
+import curses as _real
+
+# Key codes and attributes are plain integers; reuse the real ones
+for _name in dir(_real):
+    if _name.startswith(("KEY_", "A_", "COLOR_")):
+        globals()[_name] = getattr(_real, _name)
+error = _real.error
+
+LINES = 50
+COLS = 160
+# time.monotonic() of each doupdate(); CLOCK_MONOTONIC is shared by
+# processes, so a parent can compare it with its own start time
+frames = []
+_keys = []
+
+
+def _noop(*args, **kwargs):
+    return None
+
+
+class Window:
+    """In-memory window: rows of text, no attributes"""
+
+    def __init__(self, height, width, y=0, x=0):
+        self.height, self.width, self.y, self.x = height, width, y, x
+        self.rows = [" " * width for _ in range(height)]
+        self.cells_written = 0
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def getbegyx(self):
+        return self.y, self.x
+
+    def addstr(self, *args):
+        if len(args) >= 3 and isinstance(args[0], int):
+            y, x, text = args[0], args[1], args[2]
+        else:
+            y, x, text = 0, 0, args[0]
+        if not 0 <= y < self.height or not 0 <= x < self.width:
+            raise error("addstr() returned ERR")
+        text = str(text)[:self.width - x]
+        row = self.rows[y]
+        self.rows[y] = row[:x] + text + row[x + len(text):]
+        self.cells_written += len(text)
+
+    addnstr = addstr
+
+    def clrtoeol(self):
+        pass  # rows are overwritten whole by the callers that matter here
+
+    def erase(self):
+        self.rows = [" " * self.width for _ in range(self.height)]
+
+    clear = erase
+
+    def getch(self):
+        return _keys.pop(0) if _keys else KEY_F10  # noqa: F821 (set above)
+
+    def __getattr__(self, name):
+        # move, refresh, noutrefresh, touchwin, keypad, timeout, border...
+        return _noop
+
+
+def newwin(height, width, y=0, x=0):
+    return Window(height, width, y, x)
+
+
+def initscr():
+    return Window(LINES, COLS)
+
+
+def wrapper(func, *args, **kwargs):
+    return func(initscr(), *args, **kwargs)
+
+
+def doupdate():
+    frames.append(time.monotonic())
+
+
+def color_pair(n):
+    return n << 8
+
+
+def has_colors():
+    return True
+
+
+_KEY_NAMES = {getattr(_real, n): n.encode() for n in dir(_real) if n.startswith("KEY_")}
+
+
+def keyname(key):
+    return _real.keyname(key) if 0 <= key < 256 else _KEY_NAMES.get(key, b"UNKNOWN KEY")
+
+
+def __getattr__(name):
+    # start_color, init_pair, curs_set, napms, noecho and the rest
+    return _noop
+
+
+class Textbox:
+    """Prompts answer with an empty string, i.e. as if cancelled"""
+
+    def __init__(self, win, insert_mode=False):
+        self.win = win
+
+    def edit(self, validate=None):
+        return ""
+
+
+textpad = types.ModuleType("curses.textpad")
+textpad.Textbox = Textbox
+
+
+def install(keys=(), lines=50, cols=160):
+    """Replace curses for everything imported after this call"""
+    global LINES, COLS
+    LINES, COLS = lines, cols
+    _keys[:] = list(keys)
+    del frames[:]
+    module = sys.modules[__name__]
+    sys.modules["curses"] = module
+    sys.modules["curses.textpad"] = textpad
+    return module
+
+
+def feed(keys):
+    """Queue more keys for getch()"""
+    _keys.extend(keys)
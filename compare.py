@@ -0,0 +1,239 @@
+import os
+import stat
+import shutil
+from typing import Dict, List, Optional, Tuple
+
+from jobs import _scan, _data_size
+
+# Modification times closer than this count as equal, since some
+# filesystems (FAT, SMB) only keep a couple of seconds of precision
+MTIME_WINDOW_NS = 2 * 10 ** 9
+# Changed files at least this large are updated block by block
+DELTA_MIN = 1024 * 1024
+BLOCK = 128 * 1024
+
+
+def _listing(path: str) -> Dict[str, Tuple[bool, int, int, Tuple[int, int, int, int]]]:
+    """name -> (is_dir, size, mtime_ns, hash cache key), without following symlinks"""
+    found = {}
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            found[entry.name] = (stat.S_ISDIR(st.st_mode), st.st_size, st.st_mtime_ns,
+                                 (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size))
+    return found
+
+
+class Diff:
+    """Differences between the trees below `left` and `right`.
+
+    Paths are relative to the roots. A directory only one side has is
+    listed once, not with its contents.
+    """
+
+    def __init__(self, left: str, right: str, by_hash: bool):
+        self.left = left
+        self.right = right
+        self.by_hash = by_hash
+        self.left_only: List[str] = []
+        self.right_only: List[str] = []
+        self.changed: List[str] = []  # files on both sides that differ
+        self.conflicts: List[str] = []  # a directory on one side, a file on the other
+        self.compared = 0
+        self._status: Dict[str, Dict[str, str]] = {}
+
+    def status(self, path: str) -> Optional[Dict[str, str]]:
+        """Top-level name -> "new" or "changed" for the panel showing `path`"""
+        if path not in (self.left, self.right):
+            return None
+        if path not in self._status:
+            only = self.left_only if path == self.left else self.right_only
+            marks = {rel: "new" for rel in only if os.sep not in rel}
+            # Anything deeper down shows on the top-level directory holding it
+            for rel in self.changed + self.conflicts + only:
+                marks.setdefault(rel.split(os.sep, 1)[0], "changed")
+            self._status[path] = marks
+        return self._status[path]
+
+    def synced(self, source: str):
+        """Forget the differences a sync from `source` settled"""
+        if source == self.left:
+            self.left_only = []
+        else:
+            self.right_only = []
+        self.changed = []
+        self._status.clear()
+
+    def summary(self, source: str) -> str:
+        other = self.right_only if source == self.left else self.left_only
+        mine = self.left_only if source == self.left else self.right_only
+        return (f"{len(mine)} new, {len(self.changed)} changed, {len(other)} missing"
+                + (f", {len(self.conflicts)} conflicts" if self.conflicts else ""))
+
+
+def compare(job, left: str, right: str, by_hash: bool = False) -> Diff:
+    """Walk both trees side by side. Job worker.
+
+    Files differ when their sizes do, or their mtimes do by
+    MTIME_WINDOW_NS or more; with `by_hash` equal sizes are compared by
+    content hash instead of mtime (hashes are shared with, and cached
+    like, the duplicate finder's).
+    """
+    if by_hash:
+        from duplicates import content_digest
+    diff = Diff(left, right, by_hash)
+    stack = [""]
+    while stack:
+        job.check()
+        rel = stack.pop()
+        job.current = rel
+        mine = _listing(os.path.join(left, rel))
+        theirs = _listing(os.path.join(right, rel))
+        for name, (is_dir, size, mtime, key) in mine.items():
+            path = os.path.join(rel, name) if rel else name
+            other = theirs.get(name)
+            if other is None:
+                diff.left_only.append(path)
+            elif is_dir and other[0]:
+                stack.append(path)
+            elif is_dir or other[0]:
+                diff.conflicts.append(path)
+            elif size != other[1]:
+                diff.changed.append(path)
+            elif by_hash:
+                a = content_digest(os.path.join(left, path), key, lambda: job.cancelled, job.advance)
+                b = content_digest(os.path.join(right, path), other[3], lambda: job.cancelled,
+                                   job.advance)
+                job.check()
+                if a != b or a is None:
+                    diff.changed.append(path)
+            elif abs(mtime - other[2]) >= MTIME_WINDOW_NS:
+                diff.changed.append(path)
+        diff.right_only.extend(os.path.join(rel, name) if rel else name
+                               for name in theirs if name not in mine)
+        diff.compared += len(mine) + len(theirs)
+        job.advance(files=len(mine))
+    job.current = ""
+    return diff
+
+
+def delta_update(src: str, dst: str, progress) -> int:
+    """Make `dst` equal to `src` by rewriting, in place, only the blocks that differ.
+
+    Blocks are compared at the same offsets, which finds in-place edits
+    and appends (logs, disk images, databases) but not data shifted by an
+    insertion. sync() runs this on a clone of the destination, never on
+    the destination itself (see _update()). Returns the bytes written.
+    """
+    written = 0
+    fsrc = os.open(src, os.O_RDONLY)
+    try:
+        fdst = os.open(dst, os.O_RDWR)
+        try:
+            offset = 0
+            while True:
+                progress.check()
+                block = os.read(fsrc, BLOCK)
+                if not block:
+                    break
+                if os.pread(fdst, len(block), offset) != block:
+                    os.pwrite(fdst, block, offset)
+                    written += len(block)
+                offset += len(block)
+                progress.advance(len(block))
+            os.ftruncate(fdst, offset)
+        finally:
+            os.close(fdst)
+    finally:
+        os.close(fsrc)
+    return written
+
+
+def _clone(path: str, tmp: str, copy_engine) -> bool:
+    """Make `tmp` a reflink clone of `path`; False where that is not possible"""
+    try:
+        fsrc = os.open(path, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        fdst = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            return copy_engine._try_clone(fsrc, fdst, os.fstat(fsrc).st_dev)
+        finally:
+            os.close(fdst)
+    finally:
+        os.close(fsrc)
+
+
+def _update(src: str, dst: str, job) -> int:
+    """Bring the file `dst` up to date with `src` without writing to `dst`.
+
+    The new contents are put together in a temporary file next to `dst`
+    and renamed over it, as rsync does by default: a cancelled or failed
+    sync leaves `dst` as it was, other hard links to it keep the old
+    contents, and a read-only `dst` is replaced. Where the filesystem can
+    reflink `dst`, files of DELTA_MIN bytes or more start from a clone
+    and only get their changed blocks written; otherwise they are copied
+    whole. Returns the bytes written.
+    """
+    import copy_engine
+    tmp = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.fm-sync")
+    try:
+        if os.path.getsize(src) >= DELTA_MIN and _clone(dst, tmp, copy_engine):
+            written = delta_update(src, tmp, job)
+            job.advance(files=1)
+        else:
+            before = job.bytes_done
+            copy_engine.copy_file(src, tmp, job, check_same=False)
+            written = job.bytes_done - before
+        shutil.copystat(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return written
+
+
+def sync(job, diff: Diff, source: str, stats: dict):
+    """Bring the other side up to date with `source`, one of the roots,
+    rsync-style. Job worker.
+
+    New entries are copied whole with copy_engine.copy_batch; changed
+    files are replaced through a temporary file by _update(), which only
+    writes the changed blocks of large files where it can. Timestamps are
+    copied too, so the next compare finds them equal. Nothing is
+    deleted, and conflicts are left alone.
+    `stats` receives the files and bytes copied and bytes written.
+    """
+    import copy_engine
+    target = diff.right if source == diff.left else diff.left
+    new = diff.left_only if source == diff.left else diff.right_only
+    pairs = [(os.path.join(source, rel), os.path.join(target, rel)) for rel in new]
+    changed = [(os.path.join(source, rel), os.path.join(target, rel)) for rel in diff.changed]
+    for src, _ in pairs:
+        job.check()
+        _scan(job, src)
+    for src, _ in changed:
+        job.files_total += 1
+        job.bytes_total += _data_size(src)
+    copy_engine.copy_batch(pairs, job)
+    written = job.bytes_done
+    for src, dst in changed:
+        job.check()
+        job.current = os.path.relpath(src, source)
+        if os.path.islink(src) or os.path.islink(dst):
+            os.remove(dst)
+            before = job.bytes_done
+            copy_engine.copy_file(src, dst, job, check_same=False)
+            written += job.bytes_done - before
+        else:
+            written += _update(src, dst, job)
+    job.current = ""
+    stats.update(files=len(pairs) + len(changed), bytes=job.bytes_done, written=written)
+
@@ -0,0 +1,300 @@
+import os
+import re
+import mmap
+import itertools
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+from entries import FileEntry
+from jobs import pool_context
+
+# Files larger than this are skipped unless the caller says otherwise
+MAX_FILE_SIZE = 64 * 1024 * 1024
+# A NUL byte in the first block marks a file as binary, like grep does
+BINARY_SNIFF = 8192
+# Files are handed to workers in batches of roughly this many bytes
+BATCH_BYTES = 32 * 1024 * 1024
+BATCH_FILES = 512
+MAX_HITS = 100000
+MAX_HITS_PER_FILE = 1000
+MAX_LINE_CHARS = 200
+_CONTROL = re.compile(r"[\x00-\x1f\x7f]")
+
+
+class Literal:
+    """Fixed-string matcher; mmap.find runs at memory bandwidth"""
+
+    # Case-insensitive search lowers the file in chunks of this size
+    CHUNK = 4 * 1024 * 1024
+
+    def __init__(self, needle: bytes, ignore_case: bool):
+        self.needle = needle.lower() if ignore_case else needle
+        self.ignore_case = ignore_case
+
+    def finditer(self, mm):
+        needle = self.needle
+        if not self.ignore_case:
+            pos = mm.find(needle)
+            while pos != -1:
+                yield pos
+                pos = mm.find(needle, pos + 1)
+            return
+        # ASCII case folding only, like bytes.lower()
+        overlap = len(needle) - 1
+        for base in range(0, len(mm), self.CHUNK):
+            chunk = mm[base:base + self.CHUNK + overlap].lower()
+            pos = chunk.find(needle)
+            while pos != -1 and pos < self.CHUNK:
+                yield base + pos
+                pos = chunk.find(needle, pos + 1)
+
+
+class Regex:
+    def __init__(self, regex):
+        self.regex = regex
+
+    def finditer(self, mm):
+        for m in self.regex.finditer(mm):
+            yield m.start()
+
+
+def compile_pattern(text: str):
+    """Matcher for a query: ``re:`` prefix for a regex, else a literal.
+
+    Literal queries are smart-case: all lower case matches any case.
+    """
+    if text.startswith("re:"):
+        try:
+            return Regex(re.compile(text[3:].encode(), re.MULTILINE))
+        except re.error as e:
+            raise ValueError(f"bad regex: {e}") from None
+    if not text:
+        raise ValueError("empty query")
+    return Literal(text.encode(), text == text.lower())
+
+
+def search_file(path: str, pattern, limit: int = MAX_HITS_PER_FILE) -> List[tuple]:
+    """(line number, line text) for each line of `path` matching `pattern`.
+
+    The file is memory-mapped, so matching runs over the page cache
+    directly instead of copying the file into Python objects. Binary
+    files give no hits. A file truncated while mapped raises SIGBUS,
+    so this only runs in worker processes (see ContentSearch).
+    """
+    hits = []
+    with open(path, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if size == 0:
+            return hits
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm.find(b"\0", 0, BINARY_SNIFF) != -1:
+                return hits
+            lineno = 1
+            counted = 0
+            next_line = 0
+            for pos in pattern.finditer(mm):
+                if pos < next_line:
+                    continue  # one hit per line
+                start = mm.rfind(b"\n", 0, pos) + 1
+                end = mm.find(b"\n", pos)
+                if end == -1:
+                    end = size
+                lineno += mm[counted:start].count(b"\n")
+                counted = start
+                text = mm[start:min(end, start + MAX_LINE_CHARS * 4)].decode("utf-8", "replace")
+                hits.append((lineno, _CONTROL.sub(" ", text)[:MAX_LINE_CHARS]))
+                next_line = end + 1
+                if len(hits) >= limit:
+                    break
+    return hits
+
+
+def _search_batch(paths, pattern, limit):
+    """Worker: search a batch of files, skipping ones that fail to open"""
+    found = []
+    for path in paths:
+        try:
+            hits = search_file(path, pattern, limit)
+        except (OSError, ValueError):
+            continue
+        if hits:
+            found.append((path, hits))
+    return found
+
+
+class Hit(FileEntry):
+    """One matching line, listed as "path:line: text" in the results view"""
+
+    __slots__ = ("path", "line")
+
+    def __init__(self, path: str, line: int, text: str, st: os.stat_result):
+        super().__init__(f"{path}:{line}: {text}", False, st.st_size, st.st_mtime, st.st_mode)
+        self.path = path
+        self.line = line
+
+
+class ContentSearch:
+    """Search file contents below `root` with a pool of worker processes.
+
+    One thread walks the tree (no symlinks, one filesystem) and batches
+    candidate files by size; batches are searched in separate processes
+    so regex scanning and page faults run in parallel without the GIL.
+    Even with one worker the search stays out of this process: a file
+    truncated during the search kills only its worker, and that batch
+    is counted as skipped. Binary files and files larger than
+    `max_size` are skipped. Hits stream into `results` with the same
+    interface as finder.Finder.
+    """
+
+    # Results are a read-only snapshot (see duplicates.DuplicateFinder)
+    review = False
+
+    def __init__(self, root: str, text: str, max_size: int = MAX_FILE_SIZE,
+                 workers: Optional[int] = None, limit: int = MAX_HITS):
+        self.root = root
+        self.text = text
+        self.pattern = compile_pattern(text)
+        self.max_size = max_size
+        self.workers = workers or os.cpu_count() or 1
+        self.limit = limit
+        self.results: List[Hit] = []
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.running = False
+        self.truncated = False
+        self.generation = 0
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._prefix = len(os.path.join(root, ""))
+
+    @property
+    def label(self) -> str:
+        return f"grep: {self.text}"
+
+    @property
+    def progress(self) -> str:
+        return f"{self.files} files, {self.bytes // (1024 * 1024)} MB"
+
+    @staticmethod
+    def locate(entry: Hit) -> str:
+        return entry.path
+
+    @staticmethod
+    def sort_key(entry: Hit):
+        return (entry.path, entry.line)
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._run, name="fm-grep", daemon=True).start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def take(self, start: int) -> List[Hit]:
+        with self._lock:
+            return self.results[start:]
+
+    def _files(self):
+        """(path, size) of every candidate file below root"""
+        try:
+            dev = os.stat(self.root).st_dev
+        except OSError:
+            return
+        stack = [self.root]
+        while stack and not self._cancel.is_set():
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.stat(follow_symlinks=False).st_dev == dev:
+                                    stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                size = entry.stat(follow_symlinks=False).st_size
+                                if 0 < size <= self.max_size:
+                                    yield entry.path, size
+                                elif size:
+                                    self.skipped += 1
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    def _batches(self):
+        batch, size = [], 0
+        for path, n in self._files():
+            batch.append(path)
+            size += n
+            if size >= BATCH_BYTES or len(batch) >= BATCH_FILES:
+                yield batch, size
+                batch, size = [], 0
+        if batch:
+            yield batch, size
+
+    def _publish(self, found, nbytes, nfiles):
+        hits = []
+        for path, lines in found:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            rel = path[self._prefix:]
+            hits.extend(Hit(rel, line, text, st) for line, text in lines)
+        with self._lock:
+            room = self.limit - len(self.results)
+            self.results.extend(hits[:room])
+            if len(self.results) >= self.limit:
+                self.truncated = True
+                self._cancel.set()
+        self.files += nfiles
+        self.bytes += nbytes
+        self.generation = next(self._counter)
+
+    def _run(self):
+        try:
+            self._run_pool()
+        finally:
+            self.running = False
+            self.generation = next(self._counter)
+
+    def _run_pool(self):
+        batches = self._batches()
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context())
+        try:
+            pending = {}
+            while not self._cancel.is_set():
+                # A couple of batches per worker keeps them busy while the
+                # walk continues, and bounds memory on huge trees
+                for batch, nbytes in batches:
+                    fut = pool.submit(_search_batch, batch, self.pattern, MAX_HITS_PER_FILE)
+                    pending[fut] = (nbytes, len(batch))
+                    if len(pending) >= self.workers * 2:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                broken = False
+                for fut in done:
+                    nbytes, nfiles = pending.pop(fut)
+                    try:
+                        found = fut.result()
+                    except BrokenProcessPool:
+                        # A worker died (SIGBUS on a truncated file); its
+                        # batch and any others in flight are lost
+                        broken = True
+                        self.skipped += nfiles
+                        continue
+                    self._publish(found, nbytes, nfiles)
+                if broken:
+                    for nbytes, nfiles in pending.values():
+                        self.skipped += nfiles
+                    pending.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=self.workers,
+                                               mp_context=pool_context())
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
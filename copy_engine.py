@@ -0,0 +1,198 @@
+import os
+import errno
+import shutil
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+# Kernel-side copies are issued in large slices so cancel/progress stay responsive
+KERNEL_CHUNK = 64 * 1024 * 1024
+BUFFER_SIZE = 1024 * 1024
+DEFAULT_WORKERS = min(16, (os.cpu_count() or 2) * 2)
+
+# errnos meaning "this copy method is not available here, try the next one"
+_FALLBACK_ERRNOS = {
+    errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+    errno.ENOTTY, errno.EBADF,
+}
+if hasattr(errno, "ENOTSUP"):
+    _FALLBACK_ERRNOS.add(errno.ENOTSUP)
+
+# Devices where FICLONE is not supported; avoids one wasted ioctl per file.
+# EXDEV is not recorded: it says the copy crosses filesystems, not that
+# the source's filesystem cannot clone.
+_no_reflink = set()
+
+
+class NullProgress:
+    """Progress sink used when copying outside of a job (e.g. benchmarks)"""
+
+    def check(self):
+        pass
+
+    def advance(self, nbytes=0, files=0):
+        pass
+
+
+NULL_PROGRESS = NullProgress()
+
+
+def _try_clone(fsrc, fdst, dev) -> bool:
+    if fcntl is None or dev in _no_reflink:
+        return False
+    try:
+        fcntl.ioctl(fdst, FICLONE, fsrc)
+        return True
+    except OSError as e:
+        if e.errno in _FALLBACK_ERRNOS:
+            if e.errno != errno.EXDEV:
+                _no_reflink.add(dev)
+            return False
+        raise
+
+
+def _copy_kernel(fsrc, fdst, size, progress) -> bool:
+    """copy_file_range, then sendfile; False if neither works for these fds"""
+    for name in ("copy_file_range", "sendfile"):
+        func = getattr(os, name, None)
+        if func is None:
+            continue
+        copied = 0
+        try:
+            while True:
+                progress.check()
+                if name == "sendfile":
+                    n = func(fdst, fsrc, None, KERNEL_CHUNK)
+                else:
+                    n = func(fsrc, fdst, KERNEL_CHUNK)
+                if n == 0:
+                    return True
+                copied += n
+                progress.advance(n)
+                if size and copied >= size:
+                    # Saves the extra EOF round trip, which dominates on small files
+                    return True
+        except OSError as e:
+            if copied or e.errno not in _FALLBACK_ERRNOS:
+                raise
+    return False
+
+
+def _copy_buffered(fsrc, fdst, progress):
+    buf = bytearray(BUFFER_SIZE)
+    view = memoryview(buf)
+    while True:
+        progress.check()
+        n = os.readv(fsrc, [buf])
+        if not n:
+            return
+        os.write(fdst, view[:n])
+        progress.advance(n)
+
+
+def copy_file(src: str, dst: str, progress=NULL_PROGRESS, check_same: bool = True):
+    """Copy one file with the cheapest mechanism the filesystem supports:
+    reflink clone, then kernel-side copy, then a plain buffered loop."""
+    if os.path.islink(src):
+        os.symlink(os.readlink(src), dst)
+        progress.advance(files=1)
+        return
+    if check_same and os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+    fsrc = os.open(src, os.O_RDONLY)
+    try:
+        st = os.fstat(fsrc)
+        fdst = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, st.st_mode & 0o777)
+        try:
+            if _try_clone(fsrc, fdst, st.st_dev):
+                progress.advance(st.st_size)
+            elif not _copy_kernel(fsrc, fdst, st.st_size, progress):
+                _copy_buffered(fsrc, fdst, progress)
+        finally:
+            os.close(fdst)
+    finally:
+        os.close(fsrc)
+    shutil.copystat(src, dst)
+    progress.advance(files=1)
+
+
+def copy_tree(src: str, dst: str, progress=NULL_PROGRESS, workers: int = DEFAULT_WORKERS):
+    """Copy a directory tree, fanning files out over a thread pool.
+
+    Directories are created by the walking thread so workers never race on
+    mkdir; directory timestamps are restored last, once their contents are
+    no longer changing.
+    """
+    src_abs, dst_abs = os.path.abspath(src), os.path.abspath(dst)
+    if os.path.commonpath([src_abs, dst_abs]) == src_abs:
+        raise shutil.Error(f"Cannot copy {src!r} into itself")
+    os.makedirs(dst)
+    dirs_done = [(src, dst)]
+    max_pending = workers * 4
+    pending = set()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fm-copy")
+    try:
+        for root, dirs, files in os.walk(src):
+            progress.check()
+            rel = os.path.relpath(root, src)
+            target = os.path.normpath(os.path.join(dst, rel))
+            for d in list(dirs):
+                s = os.path.join(root, d)
+                if os.path.islink(s):
+                    # Keep directory symlinks as links instead of descending
+                    os.symlink(os.readlink(s), os.path.join(target, d))
+                    dirs.remove(d)
+                else:
+                    os.mkdir(os.path.join(target, d))
+                    dirs_done.append((s, os.path.join(target, d)))
+            for f in files:
+                pending.add(pool.submit(copy_file, os.path.join(root, f),
+                                        os.path.join(target, f), progress, False))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        fut.result()
+        for fut in pending:
+            fut.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    for s, d in reversed(dirs_done):
+        shutil.copystat(s, d)
+
+
+def copy_any(src: str, dst: str, progress=NULL_PROGRESS, workers: int = DEFAULT_WORKERS):
+    if os.path.isdir(src) and not os.path.islink(src):
+        copy_tree(src, dst, progress, workers)
+    else:
+        copy_file(src, dst, progress)
+
+
+def copy_batch(items, progress=NULL_PROGRESS, workers: int = DEFAULT_WORKERS):
+    """Copy (src, dst) pairs as one operation.
+
+    Plain files share one thread pool, so many small files go as fast as
+    the contents of a single tree would; directories go through copy_tree.
+    """
+    max_pending = workers * 4
+    pending = set()
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fm-copy")
+    try:
+        for src, dst in items:
+            progress.check()
+            if os.path.isdir(src) and not os.path.islink(src):
+                copy_tree(src, dst, progress, workers)
+                continue
+            pending.add(pool.submit(copy_file, src, dst, progress))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    fut.result()
+        for fut in pending:
+            fut.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
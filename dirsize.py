@@ -0,0 +1,180 @@
+import os
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+WORKERS = 4
+# Partial totals are published after this many directories of a walk
+PUBLISH_EVERY = 256
+# Cached directory listings (one tuple per directory ever walked)
+MAX_CACHED_DIRS = 500000
+
+# (st_dev, st_ino, st_mtime_ns) -> (bytes of the files directly
+# inside, subdirectory names). A directory's mtime changes whenever an
+# entry is added, removed or renamed in it, so a hit means its listing
+# need not be read again.
+_dirs: "OrderedDict[Tuple[int, int, int], Tuple[int, tuple]]" = OrderedDict()
+# Same key for the top of a walk -> recursive total, shown at once on revisits
+_totals: "OrderedDict[Tuple[int, int, int], int]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _key(st: os.stat_result) -> Tuple[int, int, int]:
+    return (st.st_dev, st.st_ino, st.st_mtime_ns)
+
+
+def _remember(cache: OrderedDict, key, value):
+    with _lock:
+        cache[key] = value
+        while len(cache) > MAX_CACHED_DIRS:
+            cache.popitem(last=False)
+
+
+def _read_dir(path: str, st: os.stat_result) -> Tuple[int, tuple]:
+    key = _key(st)
+    with _lock:
+        hit = _dirs.get(key)
+        if hit is not None:
+            _dirs.move_to_end(key)
+            return hit
+    own = 0
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    else:
+                        own += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    pass
+    except OSError:
+        return 0, ()  # unreadable: counts as empty, and is retried next time
+    result = (own, tuple(subdirs))
+    _remember(_dirs, key, result)
+    return result
+
+
+def cached_total(path: str) -> Optional[int]:
+    """Recursive size from an earlier walk, if `path` itself is unchanged"""
+    try:
+        key = _key(os.stat(path))
+    except OSError:
+        return None
+    with _lock:
+        return _totals.get(key)
+
+
+def measure(path: str, cancel: threading.Event, progress=None) -> Optional[int]:
+    """Apparent size of everything under `path`, or None if cancelled.
+
+    Symlinks below `path` are not followed and the walk stays on the
+    filesystem of `path`, like ``du -sx``; `path` itself may be a link,
+    as the panel lists links to directories as directories. Only
+    directories whose mtime changed since they were last seen are listed
+    again; the rest cost one lstat each.
+    `progress` is called with the running total while walking.
+    """
+    top = os.stat(path)
+    total = 0
+    stack = [(path, top)]
+    walked = 0
+    while stack:
+        if cancel.is_set():
+            return None
+        current, st = stack.pop()
+        own, subdirs = _read_dir(current, st)
+        total += own
+        for name in subdirs:
+            sub = os.path.join(current, name)
+            try:
+                sub_st = os.lstat(sub)
+            except OSError:
+                continue
+            if sub_st.st_dev == top.st_dev:
+                stack.append((sub, sub_st))
+        walked += 1
+        if progress and walked % PUBLISH_EVERY == 0:
+            progress(total)
+    _remember(_totals, _key(top), total)
+    return total
+
+
+class DirSizer:
+    """Background recursive sizes for the subdirectories of one directory.
+
+    `sizes` maps a subdirectory name to (bytes, complete). Partial totals
+    and totals remembered from earlier walks are published with
+    complete=False and replaced once the walk finishes. Like
+    PackedListing, progress is signalled by bumping `generation`, which
+    the panel polls from the UI thread.
+    """
+
+    def __init__(self, workers: int = WORKERS):
+        self.workers = workers
+        self._pool = None  # started with the first walk
+        self._counter = itertools.count(1)
+        self.base = ""
+        self.sizes: Dict[str, Tuple[int, bool]] = {}
+        self._pending = set()
+        self._cancel = threading.Event()
+        self.generation = 0
+
+    def reset(self, base: str):
+        """Drop results and stop walks when the panel changes directory"""
+        self._cancel.set()
+        self._cancel = threading.Event()
+        self.base = base
+        self.sizes = {}
+        self._pending = set()
+        self.generation = next(self._counter)
+
+    def busy(self) -> bool:
+        return bool(self._pending)
+
+    def request(self, name: str, force: bool = False):
+        """Measure subdirectory `name`; a no-op if it is done or under way"""
+        if name in self._pending or (not force and self.sizes.get(name, (0, False))[1]):
+            return
+        path = os.path.join(self.base, name)
+        cached = cached_total(path)
+        if cached is not None:
+            self.sizes[name] = (cached, False)
+            self.generation = next(self._counter)
+        self._pending.add(name)
+        if self._pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix="fm-dirsize")
+        self._pool.submit(self._run, name, path, cached is None,
+                          self._cancel, self.sizes, self._pending)
+
+    def forget(self, name: str):
+        self.sizes.pop(name, None)
+        self.generation = next(self._counter)
+
+    def _run(self, name, path, show_partial, cancel, sizes, pending):
+        # sizes/pending belong to the request's directory; after a reset
+        # they are orphaned and late results never reach the new directory
+        def progress(total):
+            sizes[name] = (total, False)
+            self.generation = next(self._counter)
+
+        try:
+            # A remembered total is a better estimate than a partial one
+            total = measure(path, cancel, progress if show_partial else None)
+        except OSError:
+            total = None
+        pending.discard(name)
+        if total is not None:
+            sizes[name] = (total, True)
+        elif not cancel.is_set():
+            sizes.pop(name, None)
+        self.generation = next(self._counter)
+
+    def shutdown(self):
+        self._cancel.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
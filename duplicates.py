@@ -0,0 +1,357 @@
+import os
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from entries import FileEntry
+
+WORKERS = 4
+# Bytes hashed from each end of a file before hashing all of it
+EDGE = 4096
+CHUNK = 1024 * 1024
+MAX_CACHED_HASHES = 500000
+MAX_RESULTS = 100000
+
+# (st_dev, st_ino, st_mtime_ns, st_size) -> digest. Rewriting a file
+# changes its mtime or size, so a hit is known to be the same content.
+_partial: "OrderedDict[Tuple[int, int, int, int], bytes]" = OrderedDict()
+_full: "OrderedDict[Tuple[int, int, int, int], bytes]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cached(cache: OrderedDict, key, compute) -> Optional[bytes]:
+    with _lock:
+        hit = cache.get(key)
+        if hit is not None:
+            cache.move_to_end(key)
+            return hit
+    digest = compute()
+    if digest is not None:
+        with _lock:
+            cache[key] = digest
+            while len(cache) > MAX_CACHED_HASHES:
+                cache.popitem(last=False)
+    return digest
+
+
+def content_digest(path: str, key, cancelled=None, progress=None) -> Optional[bytes]:
+    """Hash of a file's contents, cached by `key` (dev, inode, mtime_ns, size).
+
+    None if the file could not be read or `cancelled()` became true;
+    `progress(nbytes)` is called after each chunk read.
+    """
+    def compute():
+        digest = hashlib.blake2b(digest_size=32)
+        try:
+            with open(path, "rb", buffering=0) as fh:
+                while True:
+                    if cancelled and cancelled():
+                        return None
+                    buf = fh.read(CHUNK)
+                    if not buf:
+                        break
+                    digest.update(buf)  # releases the GIL for large buffers
+                    if progress:
+                        progress(len(buf))
+        except OSError:
+            return None
+        return digest.digest()
+    return _cached(_full, key, compute)
+
+
+class Candidate:
+    """A regular file found by the walk"""
+
+    __slots__ = ("path", "key", "mtime", "mode")
+
+    def __init__(self, path: str, st: os.stat_result):
+        self.path = path
+        self.key = (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+        self.mtime = st.st_mtime
+        self.mode = st.st_mode
+
+    @property
+    def size(self) -> int:
+        return self.key[3]
+
+
+class Duplicate(FileEntry):
+    """One copy in a group of identical files, listed as "[group] path\""""
+
+    __slots__ = ("path", "group", "wasted", "key")
+
+    def __init__(self, path: str, group: int, wasted: int, file: Candidate):
+        super().__init__(f"[{group}] {path}", False, file.size, file.mtime, file.mode)
+        self.path = path
+        self.group = group
+        self.wasted = wasted  # bytes freed by keeping one copy of the group
+        self.key = file.key
+
+
+class DuplicateFinder:
+    """Groups of identical files below `root`, found in stages.
+
+    The walk (no symlinks, one filesystem, hard links counted once)
+    buckets regular files by size. Files sharing a size are hashed over
+    their first and last EDGE bytes, and only files that still collide
+    are hashed in full, in parallel; files of up to 2 * EDGE bytes are
+    settled by the first hash. Hashes are cached by (dev, inode, mtime,
+    size) for the session. Groups stream into `results` as Duplicate
+    entries with the same interface as finder.Finder, largest waste
+    first once the search is over.
+    """
+
+    # The results view offers deleting and hard linking the marked copies
+    review = True
+
+    def __init__(self, root: str, workers: int = WORKERS, limit: int = MAX_RESULTS):
+        self.root = root
+        self.workers = workers
+        self.limit = limit
+        self.results: List[Duplicate] = []
+        self.stage = "scanning"
+        self.files = 0
+        self.hashed = 0
+        self.groups = 0
+        self.running = False
+        self.truncated = False
+        self.generation = 0
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._prefix = len(os.path.join(root, ""))
+
+    @property
+    def label(self) -> str:
+        return "duplicates"
+
+    @property
+    def progress(self) -> str:
+        return (f"{self.stage}, {self.files} files, {self.hashed // (1024 * 1024)} MB hashed, "
+                f"{self.groups} groups")
+
+    @staticmethod
+    def locate(entry: Duplicate) -> str:
+        return entry.path
+
+    @staticmethod
+    def sort_key(entry: Duplicate):
+        return (-entry.wasted, entry.group, entry.path)
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._run, name="fm-dupes", daemon=True).start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def take(self, start: int) -> List[Duplicate]:
+        with self._lock:
+            return self.results[start:]
+
+    # -- stages ------------------------------------------------------------
+
+    def _walk(self) -> Dict[int, List[Candidate]]:
+        """Regular files by size; empty files are all alike and left out"""
+        by_size: Dict[int, List[Candidate]] = {}
+        try:
+            dev = os.stat(self.root).st_dev
+        except OSError:
+            return by_size
+        seen: Set[Tuple[int, int]] = set()
+        stack = [self.root]
+        while stack and not self._cancel.is_set():
+            try:
+                with os.scandir(stack.pop()) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if entry.stat(follow_symlinks=False).st_dev == dev:
+                                    stack.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                st = entry.stat(follow_symlinks=False)
+                                if st.st_size and (st.st_dev, st.st_ino) not in seen:
+                                    seen.add((st.st_dev, st.st_ino))
+                                    by_size.setdefault(st.st_size, []).append(
+                                        Candidate(entry.path, st))
+                                    self.files += 1
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return by_size
+
+    def _edges(self, file: Candidate) -> Optional[bytes]:
+        """Hash of the first and last EDGE bytes: all of a file up to 2 * EDGE"""
+        def compute():
+            if self._cancel.is_set():
+                return None
+            try:
+                fd = os.open(file.path, os.O_RDONLY)
+            except OSError:
+                return None
+            try:
+                digest = hashlib.blake2b(os.pread(fd, EDGE, 0), digest_size=16)
+                if file.size > EDGE:
+                    digest.update(os.pread(fd, EDGE, max(EDGE, file.size - EDGE)))
+            except OSError:
+                return None
+            finally:
+                os.close(fd)
+            self.hashed += min(file.size, 2 * EDGE)
+            return digest.digest()
+        return _cached(_partial, file.key, compute)
+
+    def _contents(self, file: Candidate) -> Optional[bytes]:
+        return content_digest(file.path, file.key, self._cancel.is_set, self._count)
+
+    def _count(self, nbytes: int):
+        self.hashed += nbytes
+
+    def _split(self, pool, groups: List[List[Candidate]], digest, on_group=None):
+        """Regroup files by digest(file), dropping files left on their own.
+
+        Digests run on the pool in one stream; groups are regrouped in
+        order as their digests arrive, and passed to `on_group` when that
+        is given instead of being returned.
+        """
+        files = [f for group in groups for f in group]
+        digests = zip(files, pool.map(digest, files))
+        out = []
+        for group in groups:
+            same: Dict[bytes, List[Candidate]] = {}
+            for file, value in itertools.islice(digests, len(group)):
+                if value is not None:
+                    same.setdefault(value, []).append(file)
+            for found in same.values():
+                if len(found) > 1:
+                    if on_group:
+                        on_group(found)
+                    else:
+                        out.append(found)
+            if self._cancel.is_set():
+                break
+        return out
+
+    def _publish(self, files: List[Candidate]):
+        self.groups += 1
+        wasted = files[0].size * (len(files) - 1)
+        found = [Duplicate(f.path[self._prefix:], self.groups, wasted, f)
+                 for f in sorted(files, key=lambda f: f.path)]
+        with self._lock:
+            room = self.limit - len(self.results)
+            self.results.extend(found[:room])
+            if len(self.results) >= self.limit:
+                self.truncated = True
+                self._cancel.set()
+        self.generation = next(self._counter)
+
+    def _run(self):
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fm-dupes")
+        try:
+            by_size = self._walk()
+            same_size = [files for files in by_size.values() if len(files) > 1]
+            del by_size
+            self.stage = "comparing ends"
+            self.generation = next(self._counter)
+            small = [g for g in same_size if g[0].size <= 2 * EDGE]
+            large = [g for g in same_size if g[0].size > 2 * EDGE]
+            self._split(pool, small, self._edges, self._publish)
+            large = self._split(pool, large, self._edges)
+            self.stage = "hashing"
+            self.generation = next(self._counter)
+            self._split(pool, large, self._contents, self._publish)
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+            self.running = False
+            self.generation = next(self._counter)
+
+
+# -- acting on the results ---------------------------------------------------
+
+def plan(root: str, entries: List[Duplicate], marked: Set[str]):
+    """(copy, copy to keep) pairs of absolute paths for the marked entries.
+
+    The first unmarked copy of each group is kept. Groups with every copy
+    marked are left alone; their count is returned as well.
+    """
+    groups: Dict[int, List[Duplicate]] = {}
+    for entry in entries:
+        groups.setdefault(entry.group, []).append(entry)
+    pairs = []
+    whole = 0
+    for members in groups.values():
+        drop = [e for e in members if e.name in marked]
+        keep = [e for e in members if e.name not in marked]
+        if not drop:
+            continue
+        if not keep:
+            whole += 1
+            continue
+        for entry in drop:
+            pairs.append((entry, keep[0]))
+    return [(os.path.join(root, d.path), d.key, os.path.join(root, k.path), k.key)
+            for d, k in pairs], whole
+
+
+def keep_first(entries: List[Duplicate]) -> Set[str]:
+    """Names of every copy but the first of each group"""
+    seen = set()
+    marked = set()
+    for entry in entries:
+        if entry.group in seen:
+            marked.add(entry.name)
+        seen.add(entry.group)
+    return marked
+
+
+def _unchanged(path: str, key) -> bool:
+    try:
+        st = os.stat(path, follow_symlinks=False)
+    except OSError:
+        return False
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size) == key
+
+
+def resolve(job, pairs, link: bool, done: List[str]):
+    """Delete each duplicate, or replace it with a hard link to the kept copy.
+
+    Job worker. A copy is skipped if it or the kept copy changed since the
+    search. A link takes the kept copy's permissions and times. Paths
+    dealt with are appended to `done`.
+    """
+    job.files_total = len(pairs)
+    for path, key, keeper, keeper_key in pairs:
+        job.check()
+        job.current = os.path.basename(path)
+        if _unchanged(path, key) and _unchanged(keeper, keeper_key):
+            if link:
+                tmp = f"{path}.fm-link"
+                os.link(keeper, tmp)
+                try:
+                    os.replace(tmp, path)
+                except OSError:
+                    os.remove(tmp)
+                    raise
+            else:
+                os.remove(path)
+            done.append(path)
+            job.advance(key[3])
+        job.advance(files=1)
+    job.current = ""
+
+
+def settled(entries: List[Duplicate], gone: Set[str]) -> Set[str]:
+    """Names to drop from the results: `gone` plus groups left with one copy"""
+    left: Dict[int, List[str]] = {}
+    for entry in entries:
+        if entry.name not in gone:
+            left.setdefault(entry.group, []).append(entry.name)
+    drop = set(gone)
+    for names in left.values():
+        if len(names) == 1:
+            drop.update(names)
+    return drop
@@ -0,0 +1,47 @@
+import os
+import stat
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar.gz', '.tgz', '.tar.xz')
+
+
+class FileEntry:
+    """Metadata for a single directory entry, captured once per listing"""
+    __slots__ = ("name", "is_dir", "size", "mtime", "mode")
+
+    def __init__(self, name: str, is_dir: bool, size: int, mtime: float, mode: int):
+        self.name = name
+        self.is_dir = is_dir
+        self.size = size  # -1 when the entry could not be stat'ed
+        self.mtime = mtime
+        self.mode = mode
+
+    @classmethod
+    def from_dir_entry(cls, entry: os.DirEntry) -> "FileEntry":
+        try:
+            st = entry.stat()
+        except OSError:
+            # Broken symlink or entry that vanished mid-scan
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                return cls(entry.name, False, -1, 0.0, 0)
+        is_dir = stat.S_ISDIR(st.st_mode)
+        return cls(entry.name, is_dir, st.st_size, st.st_mtime, st.st_mode)
+
+    @classmethod
+    def from_path(cls, path: str) -> "FileEntry":
+        """Stat a single path, used when patching a listing in place"""
+        name = os.path.basename(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return cls(name, False, -1, 0.0, 0)
+        return cls(name, stat.S_ISDIR(st.st_mode), st.st_size, st.st_mtime, st.st_mode)
+
+
+def is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def sort_key(entry: FileEntry):
+    return (not entry.is_dir, entry.name.lower())
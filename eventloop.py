@@ -0,0 +1,34 @@
+import selectors
+from typing import Set
+
+# At most one frame is drawn per interval; keys arriving in between are
+# handled without drawing, so repeats of a held key coalesce
+FRAME_INTERVAL = 1 / 60
+
+
+class EventLoop:
+    """Sleeps until the terminal, a job or the filesystem watcher has news.
+
+    Sources are file descriptors or objects with fileno(); a source whose
+    fileno() is None (the polling watcher), or which cannot be polled, is
+    skipped and serviced by the caller's timeout instead. wait() returns
+    the names of the sources that became readable.
+    """
+
+    def __init__(self):
+        self._selector = selectors.DefaultSelector()
+
+    def add(self, name: str, source):
+        fd = source if isinstance(source, int) else source.fileno()
+        if fd is None:
+            return
+        try:
+            self._selector.register(fd, selectors.EVENT_READ, name)
+        except PermissionError:
+            pass  # a regular file (e.g. stdin from /dev/null) cannot be polled by epoll
+
+    def wait(self, timeout: float) -> Set[str]:
+        return {key.data for key, _ in self._selector.select(max(0.0, timeout))}
+
+    def close(self):
+        self._selector.close()
@@ -1,26 +1,56 @@
 import os
+import sys
+import time
 import curses
-import subprocess
-import shutil
-from curses import textpad
-from pathlib import Path
+from typing import List, Optional
 from panel import FilePanel
 from colors import ColorScheme
-from archive_extractor import ArchiveExtractor
+from entries import is_archive
+from jobs import Job, JobManager, human_readable
+from watcher import create_watcher, DEBOUNCE
+from renderer import Renderer
+from profiler import Profiler
+from eventloop import EventLoop, FRAME_INTERVAL
+from finder import Finder, Query
+
+# subprocess, curses.textpad and the archive and content search modules
+# (tarfile, zipfile, multiprocessing) are imported where first used: they
+# are not needed to paint the first frame. See benchmarks/bench_startup.py.
+
+# Navigation keys whose repeats are coalesced into one move
+REPEATABLE_KEYS = (curses.KEY_UP, curses.KEY_DOWN, curses.KEY_PPAGE, curses.KEY_NPAGE)
+# The preview follows the cursor once it has rested this long (seconds)
+PREVIEW_DELAY = 0.08
+
 
 class FileManager:
     def __init__(self, stdscr):
         self.stdscr = stdscr
         self.color_scheme = ColorScheme()
-        self.left_panel = FilePanel(str(Path.home()))
-        self.right_panel = FilePanel("/")
+        # Listed in run(), once the first frame is on screen
+        self.left_panel = FilePanel(str(os.path.expanduser("~")), listed=False)
+        self.right_panel = FilePanel("/", listed=False)
         self.active_panel = "left"
         self.search_mode = False
         self.search_query = ""
+        self.search_fuzzy = False
         self.message = ""
         self.message_timer = 0
-        self.clipboard_path = ""
+        self.clipboard_paths: List[str] = []
         self.clipboard_mode = ""  # "copy" or "cut"
+        # Last compare.Diff of the two panels, highlighted while they show its roots
+        self.comparison = None
+        # F3 shows the file under the cursor in place of the other panel
+        self.preview_on = False
+        self.previews = None  # preview.PreviewCache, created on first use
+        self.preview = None  # the preview.Preview on screen
+        self._preview_target = ""
+        self._preview_moved = 0.0
+        self._preview_rows = 1
+        self.jobs = JobManager()
+        self.watcher = create_watcher()
+        self.renderer = Renderer(stdscr)
+        self.profiler = Profiler.from_env()
 
 
         self.init_ui()
@@ -41,10 +71,10 @@ class FileManager:
         return self.right_panel if self.active_panel == "left" else self.left_panel
 
     def draw(self):
-        self.stdscr.erase()
         height, width = self.stdscr.getmaxyx()
 
         if height < 10 or width < 40:
+            self.renderer.reset()
             self.stdscr.addstr(
                 0, 0, "Terminal terlalu kecil. Perbesar dan jalankan ulang."
             )
@@ -57,32 +87,42 @@ class FileManager:
         base_panel_height = max(height - 4, 5)
         panel_height = base_panel_height - (2 if self.search_mode else 0)
 
-        self.draw_panel(
-            self.left_panel,
-            2,
-            1,
-            panel_height,
-            panel_width,
-            self.active_panel == "left",
-        )
-        self.draw_panel(
-            self.right_panel,
-            2,
-            panel_width + 2,
-            panel_height,
-            panel_width,
-            self.active_panel == "right",
-        )
+        for name, panel, x in (("left", self.left_panel, 1),
+                               ("right", self.right_panel, panel_width + 2)):
+            active = self.active_panel == name
+            if self.preview_on and not active:
+                self.draw_preview(name, 2, x, panel_height, panel_width)
+            else:
+                self.draw_panel(panel, name, 2, x, panel_height, panel_width, active)
 
+        # The status line overlays the bottom row of the panels while shown
         if self.message and self.message_timer > 0:
-            self.stdscr.addstr(
-                height - 1,
-                0,
-                self.message.ljust(width - 1),
-                curses.color_pair(8 if "Error" in self.message else 9),
-            )
-            self.message_timer -= 1
-        self.stdscr.refresh()
+            status = (0, self.message[: width - 1].ljust(width - 1),
+                      curses.color_pair(8 if "Error" in self.message else 9))
+        elif self.jobs.active():
+            status = (0, self.jobs.status_line()[: width - 1].ljust(width - 1),
+                      curses.color_pair(10))
+        else:
+            status = None
+        if status:
+            self.renderer.region("status", 1, width, height - 1, 0).draw_row(0, (status,))
+        else:
+            self.renderer.hide("status")
+        if self.profiler.overlay:
+            self.draw_profile(width)
+        else:
+            self.renderer.hide("profile")
+        self.renderer.present()
+
+    def draw_profile(self, width):
+        """Frame timing overlay in the top right corner (F9 with FMANAGER_PROFILE=1)"""
+        lines = self.profiler.summary()
+        lines.append(f"jobs {len(self.jobs.active())} active, frame #{self.profiler.frames}")
+        overlay_w = min(width, 42)
+        region = self.renderer.region("profile", len(lines), overlay_w, 1, width - overlay_w)
+        color = curses.color_pair(10)
+        for i, line in enumerate(lines):
+            region.draw_row(i, ((0, f" {line}"[:overlay_w - 1].ljust(overlay_w - 1), color),))
 
     def draw_header(self, width):
         header = "[ Folder Manager ]"
@@ -92,83 +132,52 @@ class FileManager:
         bg_color = self.color_scheme.get(12)     # background baris header
         text_color = self.color_scheme.get(2) | curses.A_BOLD  # warna teks header
 
-        try:
-            # 🔸 Warnai seluruh baris pertama dengan background khusus
-            self.stdscr.attron(bg_color)
-            self.stdscr.addstr(0, 0, " " * width)
-            self.stdscr.attroff(bg_color)
-
-            # 🔸 Tulis teks di tengah dengan warna berbeda (teks di atas background)
-            self.stdscr.addstr(0, x, header, text_color)
-        except curses.error:
-            pass
+        # 🔸 Warnai seluruh baris pertama dengan background khusus, lalu
+        # tulis teks di tengah dengan warna berbeda (teks di atas background)
+        self.renderer.region("header", 1, width, 0, 0).draw_row(
+            0, ((0, " " * width, bg_color), (x, header, text_color))
+        )
 
 
 
 
 
    
-    def draw_panel(self, panel, y, x, height, width, active):
+    def draw_panel(self, panel, name, y, x, height, width, active):
+        # One window per panel: path header, border box and footer. Rows are
+        # handed to the renderer, which skips those that did not change.
+        region = self.renderer.region(name, height + 2, width + 1, y, x)
+
         # === SEARCH MODE ===
         if active and self.search_mode:
-            search_line = f"[ /: {self.search_query}"
+            prompt = "~" if self.search_fuzzy else "/"
+            search_line = f"[ {prompt}: {self.search_query}"
             search_bg = self.color_scheme.get(12) | curses.A_BOLD
 
             # Background bar search
-            self.stdscr.attron(search_bg)
-            self.stdscr.addstr(y, x, " " * (width + 1))
-            self.stdscr.addstr(y, x + 2, search_line[: width - 3])
-            self.stdscr.attroff(search_bg)
-
-            panel_y = y + 1
+            region.draw_row(0, (
+                (0, " " * (width + 1), search_bg),
+                (2, search_line[: width - 3], search_bg),
+            ))
         else:
             # === PATH HEADER ===
-            path_line = panel.path
+            path_line = panel.title
             if len(path_line) > width - 4:
                 path_line = "..." + path_line[-(width - 7):]
 
             header_color = self.color_scheme.get(12 if active else 4)
-            self.stdscr.attron(header_color)
-            self.stdscr.addstr(y, x, " " * (width + 1))
-            self.stdscr.addstr(y, x + 2, path_line.ljust(width - 3))
-            self.stdscr.attroff(header_color)
-            panel_y = y + 1
+            region.draw_row(0, (
+                (0, " " * (width + 1), header_color),
+                (2, path_line.ljust(width - 3), header_color),
+            ))
 
         # === BORDER (penuh ┌───┐ └───┘) ===
         border_color = curses.color_pair(2) if active else curses.color_pair(3)
-        self.stdscr.attron(border_color)
-        try:
-            for i in range(panel_y, panel_y + height + 1):
-                if i == panel_y:
-                    self.stdscr.addstr(i, x, "┌" + "─" * (width - 1) + "┐")
-                elif i == panel_y + height:
-                    self.stdscr.addstr(i, x, "└" + "─" * (width - 1) + "┘")
-                else:
-                    self.stdscr.addstr(i, x, "│")
-                    self.stdscr.addstr(i, x + width, "│")
-        except curses.error:
-            pass
-        self.stdscr.attroff(border_color)
-
-        
+        region.draw_row(1, ((0, "┌" + "─" * (width - 1) + "┐", border_color),))
 
         # === TOTAL FILE DAN SIZE ===
-        total_files = len(panel.files)
-        total_size = 0
-        for f in panel.files:
-            full = os.path.join(panel.path, f)
-            if os.path.isfile(full):
-                try:
-                    total_size += os.path.getsize(full)
-                except Exception:
-                    pass
-
-        def human_readable(size):
-            for unit in ["B", "KB", "MB", "GB", "TB"]:
-                if size < 1024:
-                    return f"{size:.1f} {unit}"
-                size /= 1024
-            return f"{size:.1f} TB"
+        total_files = panel.total_files
+        total_size = panel.total_size
 
         visible_items = height - 2
         start = panel.scroll_offset
@@ -180,96 +189,255 @@ class FileManager:
             start = panel.scroll_offset
             end = min(start + visible_items, total_files)
         elif panel.cursor_pos >= end:
-            panel.scroll_offset = panel.cursor_pos - visible_items + 1
+            panel.scroll_offset = max(0, panel.cursor_pos - visible_items + 1)
             start = panel.scroll_offset
             end = min(start + visible_items, total_files)
 
-        # === FILE LIST ===
-        for i, item in enumerate(panel.files[start:end]):
-            idx = start + i
-            is_selected = idx == panel.cursor_pos
-            full_path = os.path.join(panel.path, item)
-            is_dir = os.path.isdir(full_path)
-            if is_dir:
-                size_str = "<DIR>"
-            else:
-                try:
-                    size_str = f"{os.path.getsize(full_path)} B"
-                except (PermissionError, FileNotFoundError, OSError):
-                    size_str = "N/A"
-
-            display_name = item if len(item) <= width - 20 else item[:width - 23] + "..."
-            line = f"{display_name:<{width - 15}} {size_str:>10}"
-            color = (
-                self.color_scheme.get(7) if is_selected and is_dir
-                else self.color_scheme.get(5) if is_selected
-                else self.color_scheme.get(6) if is_dir
-                else self.color_scheme.get(1)
-            )
-
-            try:
-                self.stdscr.addstr(panel_y + 1 + i, x + 2, line[: width - 3], color)
-            except curses.error:
-                pass
-
         # === SCROLL BAR DI KANAN (dalam border) ===
+        bar_start = bar_end = 0
         if len(panel.files) > visible_items:
-            scroll_height = visible_items
-            bar_height = max(1, int(scroll_height * visible_items / len(panel.files)))
-            start_pos = int(scroll_height * panel.scroll_offset / len(panel.files))
-
+            bar_height = max(1, int(visible_items * visible_items / len(panel.files)))
+            bar_start = int(visible_items * panel.scroll_offset / len(panel.files))
+            bar_end = bar_start + bar_height
             scroll_color = self.color_scheme.get(12 if active else 1)
-            bar_x = x + width - 1  # dalam border kanan
+        bar_x = width - 1  # dalam border kanan
 
-            try:
-                for i in range(scroll_height):
-                    ch = " "
-                    self.stdscr.addstr(panel_y + 1 + i, bar_x, ch, curses.color_pair(3))
-                for i in range(bar_height):
-                    self.stdscr.addstr(panel_y + 1 + start_pos + i, bar_x, "█", scroll_color)
-            except curses.error:
-                pass
+        # === FILE LIST ===
+        entries = panel.files[start:end]
+        differences = self.comparison.status(panel.path) if self.comparison else None
+        for i in range(height - 1):
+            row = [(0, "│", border_color)]
+            if i < len(entries):
+                entry = entries[i]
+                is_selected = start + i == panel.cursor_pos
+                item = entry.name
+                is_dir = entry.is_dir
+                measured = panel.dir_sizes.get(item) if is_dir else None
+                if measured:
+                    # "~" until the background walk has finished
+                    size_str = f"{'' if measured[1] else '~'}{measured[0]} B"
+                elif is_dir:
+                    size_str = "<DIR>"
+                elif entry.size < 0:
+                    size_str = "N/A"
+                else:
+                    size_str = f"{entry.size} B"
+
+                is_marked = item in panel.marked
+                difference = differences.get(item) if differences else None
+                if is_marked:
+                    item = "*" + item
+                elif difference:
+                    item = ("+" if difference == "new" else "~") + item
+                display_name = item if len(item) <= width - 20 else item[:width - 23] + "..."
+                line = f"{display_name:<{width - 15}} {size_str:>10}"
+                color = (
+                    self.color_scheme.get(7) if is_selected and is_dir
+                    else self.color_scheme.get(5) if is_selected
+                    else self.color_scheme.get(10) | curses.A_BOLD if is_marked
+                    else self.color_scheme.get(9 if difference == "new" else 8) if difference
+                    else self.color_scheme.get(6) if is_dir
+                    else self.color_scheme.get(1)
+                )
+                row.append((2, line[: width - 3], color))
+            if bar_end and i < visible_items:
+                if bar_start <= i < bar_end:
+                    row.append((bar_x, "█", scroll_color))
+                else:
+                    row.append((bar_x, " ", curses.color_pair(3)))
+            row.append((width, "│", border_color))
+            region.draw_row(2 + i, tuple(row))
 
         # === FOOTER (Total File & Size) ===
-        summary_text = f"[ {total_files} files | Total: {human_readable(total_size)} ]"
+        status = f" ({panel.status})" if panel.status else ""
+        marked = f" | {len(panel.marked)} marked" if panel.marked else ""
+        summary_text = f"[ {total_files} files{status} | Total: {human_readable(total_size)}{marked} ]"
         summary_color = self.color_scheme.get(9 if active else 8) | curses.A_BOLD
-        try:
-            self.stdscr.attron(summary_color)
-            self.stdscr.addstr(panel_y + height, x + 2, summary_text[: width - 4])
-            self.stdscr.attroff(summary_color)
-        except curses.error:
-            pass
-
-
-
-
-
-
-
-
-
-
-
-    def handle_input(self):
-
+        region.draw_row(height + 1, (
+            (0, "└" + "─" * (width - 1) + "┘", border_color),
+            (2, summary_text[: width - 4], summary_color),
+        ))
+
+    def draw_preview(self, name, y, x, height, width):
+        """The preview in the inactive panel's place, framed like a panel"""
+        region = self.renderer.region(name, height + 2, width + 1, y, x)
+        self.update_preview()
+        preview = self.preview
+        self._preview_rows = height - 1
+
+        title = f"Preview: {preview.path}" if preview else "Preview"
+        if len(title) > width - 4:
+            title = "..." + title[-(width - 7):]
+        header_color = self.color_scheme.get(4)
+        region.draw_row(0, (
+            (0, " " * (width + 1), header_color),
+            (2, title.ljust(width - 3), header_color),
+        ))
+        border_color = curses.color_pair(3)
+        region.draw_row(1, ((0, "┌" + "─" * (width - 1) + "┐", border_color),))
+
+        rows = preview.rows(height - 1, width - 3) if preview else []
+        text_color = self.color_scheme.get(1)
+        for i in range(height - 1):
+            text = rows[i] if i < len(rows) else ""
+            region.draw_row(2 + i, (
+                (0, "│", border_color),
+                (2, text.ljust(width - 2), text_color),
+                (width, "│", border_color),
+            ))
+
+        if preview and not preview.error:
+            mode = "hex" if preview.hex else "text"
+            summary_text = (f"[ {preview.percent}% of {human_readable(preview.size)} | {mode}"
+                            f" | h:hex [ ]:page {{ }}:line j:jump ]")
+        else:
+            summary_text = "[ F3:close ]"
+        region.draw_row(height + 1, (
+            (0, "└" + "─" * (width - 1) + "┘", border_color),
+            (2, summary_text[: width - 4], self.color_scheme.get(8) | curses.A_BOLD),
+        ))
+
+    def preview_path(self) -> str:
+        """Path of the entry under the cursor, or "" when there is nothing to show"""
+        panel = self.current_panel
+        entry = panel.get_selected_entry()
+        if not entry or panel.archive:
+            return ""
+        if panel.finder:
+            return os.path.join(panel.path, panel.finder.locate(entry))
+        return os.path.join(panel.path, entry.name)
+
+    def update_preview(self):
+        """Show the entry under the cursor once it has rested for PREVIEW_DELAY"""
+        target = self.preview_path()
+        now = time.monotonic()
+        if target != self._preview_target:
+            self._preview_target = target
+            self._preview_moved = now
+        shown = self.preview.path if self.preview else ""
+        if target == shown or now - self._preview_moved < PREVIEW_DELAY:
+            return
+        if self.previews is None:
+            from preview import PreviewCache
+            self.previews = PreviewCache()
+        self.preview = self.previews.get(target) if target else None
+
+    def preview_pending(self) -> bool:
+        shown = self.preview.path if self.preview else ""
+        return self.preview_on and self.preview_path() != shown
+
+    def toggle_preview(self):
+        self.preview_on = not self.preview_on
+        # Opening shows the current entry at once; moving on is debounced
+        self._preview_target = self.preview_path()
+        self._preview_moved = 0.0
+        if not self.preview_on:
+            self.preview = None
+
+    def scroll_preview(self, rows: int):
+        if self.preview_on and self.preview:
+            self.preview.scroll(rows)
+
+    def toggle_hex(self):
+        if self.preview_on and self.preview:
+            self.preview.toggle_hex()
+
+    def jump_preview(self):
+        """Scroll the preview to a byte offset, a percentage or the end"""
+        preview = self.preview
+        if not self.preview_on or not preview or preview.error:
+            return
+        text = self.ask(" Jump ", "Offset (1234, 0x4d2, -4096), percent (50%) or $ for the end:")
+        if not text:
+            return
+        if text.strip() == "$":
+            preview.jump_end(self._preview_rows)
+            return
+        from preview import parse_offset
+        offset = parse_offset(text, preview.size)
+        if offset is None:
+            self.show_message(f"Error: not an offset: {text}", 3)
+            return
+        preview.jump(offset)
+
+    def idle_timeout(self) -> float:
+        """Seconds the event loop may sleep when nothing arrives"""
+        # Wake up periodically while jobs run so progress stays live, and
+        # often enough to pick up filesystem changes from other processes
+        busy = (self.left_panel, self.right_panel)
+        if self.jobs.pending() or any(p.loading or p.sizing or p.finding for p in busy):
+            return 0.2
+        if self.watcher.has_pending():
+            return DEBOUNCE
+        if self.preview_pending():
+            return PREVIEW_DELAY
+        return 1.0
+
+    def next_key(self) -> int:
+        """A key if one is waiting, else -1; never blocks"""
+        self.stdscr.timeout(0)
         key = self.stdscr.getch()
+        self.stdscr.timeout(-1)  # popups wait for their keys
+        if key != -1:
+            self.renderer.key_pressed()
+            if self.message_timer > 0:
+                self.message_timer -= 1
+        return key
+
+    def handle_keys(self) -> Optional[bool]:
+        """Handle every key typed so far; None if there were none.
+
+        Consecutive presses of the same navigation key, e.g. a held arrow
+        key that got ahead of the screen, are handled as one move. Keys
+        are read one ahead only while such a run lasts, so a key that
+        opens a prompt still leaves the keys after it to the prompt.
+        """
+        key = self.next_key()
+        if key == -1:
+            return None
+        while key != -1:
+            count, following = 1, None
+            if key in REPEATABLE_KEYS and not self.search_mode:
+                following = self.next_key()
+                while following == key:
+                    count += 1
+                    following = self.next_key()
+            if not self.handle_key(key, count):
+                return False
+            key = self.next_key() if following is None else following
+        return True
+
+    def handle_key(self, key, count=1):
+        """Run the action bound to `key`, `count` times for navigation keys"""
         # Convert to lowercase untuk handle case-insensitive
         if isinstance(key, int) and 97 <= key <= 122:  # a-z
 
             key = key - 32 if curses.keyname(key) == b"R" else key  # Handle Shift
         if self.search_mode:
-            self.handle_search_input(key)
+            with self.profiler.phase("action search input"):
+                self.handle_search_input(key)
             return True
 
         actions = {
-            curses.KEY_UP: lambda: self.current_panel.navigate(-1),
-            curses.KEY_DOWN: lambda: self.current_panel.navigate(1),
+            curses.KEY_UP: lambda: self.current_panel.navigate(-count),
+            curses.KEY_DOWN: lambda: self.current_panel.navigate(count),
+            curses.KEY_PPAGE: lambda: self.current_panel.page(-count),
+            curses.KEY_NPAGE: lambda: self.current_panel.page(count),
+            curses.KEY_HOME: lambda: self.current_panel.jump(0),
+            curses.KEY_END: lambda: self.current_panel.jump(len(self.current_panel.files) - 1),
             curses.KEY_LEFT: self.current_panel.go_up,
-            curses.KEY_RIGHT: self.current_panel.enter_directory,
+            curses.KEY_RIGHT: self.enter_directory,
             curses.KEY_F6: self.copy_file,
             curses.KEY_F7: self.cut_file,
             curses.KEY_F8: self.paste_file,
             curses.KEY_F11: self.view_mounts,
+            curses.KEY_F3: self.toggle_preview,
+            ord("h"): self.toggle_hex,
+            ord("["): lambda: self.scroll_preview(-count * max(1, self._preview_rows - 1)),
+            ord("]"): lambda: self.scroll_preview(count * max(1, self._preview_rows - 1)),
+            ord("{"): lambda: self.scroll_preview(-count),
+            ord("}"): lambda: self.scroll_preview(count),
+            ord("j"): self.jump_preview,
            
             10: self.execute_or_enter,
             9: self.toggle_panel,
@@ -280,32 +448,66 @@ class FileManager:
             ord('g'): self.extract_tar_gz,   # g for gz
             ord('x'): self.extract_tar_xz,   # x for xz
             curses.KEY_F5: self.delete_file,
+            ord("c"): self.cancel_job,
+            ord("p"): self.pause_job,
+            ord(" "): self.current_panel.toggle_mark,
+            ord("+"): self.mark_matching,
+            ord("-"): lambda: self.mark_matching(mark=False),
+            ord("*"): self.current_panel.invert_marks,
+            ord("s"): self.measure_selected,
+            ord("S"): self.toggle_auto_size,
+            ord("o"): self.cycle_sort,
+            ord("O"): self.reverse_sort,
+            ord("f"): self.find_files,
+            ord("F"): self.grep_files,
+            ord("a"): self.create_archive,
+            ord("D"): self.find_duplicates,
+            ord("="): self.compare_panels,
+            ord("#"): lambda: self.compare_panels(by_hash=True),
+            ord("M"): self.sync_panels,
+            ord("k"): self.mark_extra_copies,
+            ord("L"): lambda: self.resolve_duplicates(link=True),
+            curses.KEY_F9: self.toggle_profile_overlay,
             curses.KEY_F10: self.exit_program,
         }
 
         action = actions.get(key)
         if action:
-            result = action()
+            with self.profiler.phase(f"action {self.action_name(key, action)}"):
+                result = action()
             return result if isinstance(result, bool) else True
 
         return True
 
     def execute_or_enter(self):
 
-        selected = self.current_panel.get_selected()
-        if not selected:
+        entry = self.current_panel.get_selected_entry()
+        if not entry:
             return
 
-        full_path = os.path.join(self.current_panel.path, selected)
+        if self.current_panel.finder:
+            return self.enter_directory()
+
+        full_path = os.path.join(self.current_panel.path, entry.name)
 
         # Make file executable if needed
-        if not os.path.isdir(full_path) and not os.access(full_path, os.X_OK):
+        if (
+            not entry.is_dir
+            and not self.current_panel.archive
+            and not is_archive(entry.name)
+            and not os.access(full_path, os.X_OK)
+        ):
             os.chmod(full_path, os.stat(full_path).st_mode | 0o111)
 
-        if os.path.isdir(full_path):
-            self.current_panel.enter_directory()
+        if entry.is_dir or (
+            not self.current_panel.archive and is_archive(entry.name)
+        ):
+            self.enter_directory()
+        elif self.current_panel.archive:
+            self.show_message("Use F6 to extract from the archive", 3)
         else:
             try:
+                import subprocess
                 ext = os.path.splitext(full_path)[1].lower()
 
                 if ext == ".py":
@@ -346,6 +548,26 @@ class FileManager:
             except Exception as e:
                 self.show_message(f"Error executing file: {str(e)}", 5)
 
+    def panels_at(self, path):
+        """Panels currently showing `path` (both panels may show the same dir)"""
+        return [p for p in (self.left_panel, self.right_panel) if p.path == path]
+
+    def enter_directory(self):
+        try:
+            self.current_panel.enter_directory()
+        except Exception as e:
+            self.show_message(f"Error opening archive: {str(e)}", 5)
+
+    def read_only(self):
+        """Archive views are read-only; tell the user and refuse the action"""
+        if self.current_panel.archive:
+            self.show_message("Archive view is read-only (F6 extracts)", 3)
+            return True
+        if self.current_panel.finder:
+            self.show_message("Find results are read-only (Enter jumps to the file)", 3)
+            return True
+        return False
+
     def toggle_panel(self):
         self.active_panel = "right" if self.active_panel == "left" else "left"
 
@@ -356,27 +578,47 @@ class FileManager:
     def exit_program(self):
         return False
 
+    def toggle_profile_overlay(self):
+        if not self.profiler.enabled:
+            self.show_message("Profiling is off: start with FMANAGER_PROFILE=1", 3)
+            return
+        self.profiler.overlay = not self.profiler.overlay
+
+    @staticmethod
+    def action_name(key, action) -> str:
+        """Label of a key binding for profiles: the key and the method it calls"""
+        try:
+            label = curses.keyname(key).decode()
+        except ValueError:
+            label = str(key)
+        name = getattr(action, "__name__", "")
+        return label if name in ("", "<lambda>") else f"{label} {name}"
+
     def handle_search_input(self, key):
+        panel = self.current_panel
         if key == 27:
             self.search_mode = False
-            self.current_panel.filter = ""
-            self.current_panel.refresh_files()
+            panel.set_filter("")
         elif key in [curses.KEY_BACKSPACE, 127]:
             self.search_query = self.search_query[:-1]
-            self.current_panel.filter = self.search_query
-            self.current_panel.refresh_files()
+            panel.set_filter(self.search_query, self.search_fuzzy)
         elif key in [curses.KEY_ENTER, 10]:
             self.search_mode = False
+        elif key == 9:
+            # Tab toggles fuzzy (fzf-style) ranking
+            self.search_fuzzy = not self.search_fuzzy
+            panel.set_filter(self.search_query, self.search_fuzzy)
         elif 32 <= key <= 126:
             self.search_query += chr(key)
-            self.current_panel.filter = self.search_query
-            self.current_panel.refresh_files()
+            panel.set_filter(self.search_query, self.search_fuzzy)
 
     def show_message(self, message: str, duration: int = 3):
         self.message = message
         self.message_timer = duration
 
     def rename_file(self):
+        if self.read_only():
+            return
         selected = self.current_panel.get_selected()
         if not selected or selected == "[Permission Denied]":
             self.show_message("Invalid selection", 2)
@@ -408,6 +650,7 @@ class FileManager:
         curses.noecho()  # KEY FIX: Disable echo to prevent double chars
 
         try:
+            from curses import textpad
             box = textpad.Textbox(input_win)
             new_name = box.edit(self.validate_rename_input).strip()
 
@@ -416,13 +659,13 @@ class FileManager:
                 try:
                     os.rename(old_path, new_path)
                     self.show_message(f"Renamed to '{new_name[:20]}'", 3)
-                    self.current_panel.refresh_files()
+                    for panel in self.panels_at(self.current_panel.path):
+                        panel.rename_entry(selected, new_name)
                 except OSError as e:
                     self.show_message(f"Error: {e.strerror}", 5)
         finally:
             curses.curs_set(0)
-            self.stdscr.touchwin()
-            self.stdscr.refresh()
+            self.renderer.invalidate()
 
     def validate_rename_input(self, key):
         """Validator that prevents double characters"""
@@ -441,13 +684,32 @@ class FileManager:
                 return key
         return 0
 
+    def chosen_names(self, panel) -> List[str]:
+        """The marked entries, or else the selected one"""
+        names = panel.marked_names()
+        if not names:
+            selected = panel.get_selected()
+            if selected and selected != "[Permission Denied]":
+                names = [selected]
+        return names
+
+    def file_job(self, kind, items, src_dir, dest_dir=""):
+        """One job for all (src, dest) `items`; a single item is a plain job"""
+        if len(items) == 1:
+            return Job(kind, items[0][0], items[0][1], self.on_job_done)
+        return Job(kind, src_dir, dest_dir, self.on_job_done, items=items)
+
     def delete_file(self):
-        selected = self.current_panel.get_selected()
-        if not selected:
+        if self.reviewing():
+            return self.resolve_duplicates(link=False)
+        if self.read_only():
+            return
+        panel = self.current_panel
+        names = self.chosen_names(panel)
+        if not names:
             self.show_message("No file selected", 2)
             return
 
-        path = os.path.join(self.current_panel.path, selected)
         height, width = self.stdscr.getmaxyx()
 
         # Create confirmation popup
@@ -458,72 +720,434 @@ class FileManager:
         )
         popup.border()
         popup.addstr(0, 2, " Confirm Delete ")
-        popup.addstr(1, 2, f"Delete '{selected[:30]}'?")
+        if len(names) == 1:
+            popup.addstr(1, 2, f"Delete '{names[0][:30]}'?")
+        else:
+            popup.addstr(1, 2, f"Delete {len(names)} marked items?")
         popup.addstr(2, 2, "This action cannot be undone!")
         popup.addstr(3, 2, "Press Y to confirm, any key to cancel")
         popup.refresh()
 
         # Get confirmation
         key = self.stdscr.getch()
+        self.renderer.invalidate()
 
         if key in [ord("y"), ord("Y")]:
-            try:
-                if os.path.isdir(path):
-                    shutil.rmtree(path)
-                else:
-                    os.remove(path)
-                self.show_message(f"Deleted '{selected}'", 3)
-                self.current_panel.refresh_files()
-            except Exception as e:
-                self.show_message(f"Error deleting: {str(e)}", 5)
+            items = [(os.path.join(panel.path, name), "") for name in names]
+            job = self.jobs.submit(self.file_job("delete", items, panel.path))
+            panel.marked.clear()
+            self.show_message(f"Deleting {job.name}...", 2)
 
     def copy_file(self):
-        """Copy selected file to clipboard"""
-        selected = self.current_panel.get_selected()
-        if not selected or selected == "[Permission Denied]":
-            self.show_message("No file selected", 2)
-            return
-        
-        self.clipboard_path = os.path.join(self.current_panel.path, selected)
-        self.clipboard_mode = "copy"
-        self.show_message(f"Copied: {selected}", 3)
+        """Copy the marked or selected files to the clipboard"""
+        if self.current_panel.archive:
+            return self.extract_marked()
+        self._to_clipboard("copy", "Copied")
 
     def cut_file(self):
-        """Cut selected file to clipboard"""
-        selected = self.current_panel.get_selected()
-        if not selected or selected == "[Permission Denied]":
+        """Cut the marked or selected files to the clipboard"""
+        if self.read_only():
+            return
+        self._to_clipboard("cut", "Cut")
+
+    def _to_clipboard(self, mode, verb):
+        panel = self.current_panel
+        names = self.chosen_names(panel)
+        if not names:
             self.show_message("No file selected", 2)
             return
-        
-        self.clipboard_path = os.path.join(self.current_panel.path, selected)
-        self.clipboard_mode = "cut"
-        self.show_message(f"Cut: {selected}", 3)
+        self.clipboard_paths = [os.path.join(panel.path, name) for name in names]
+        self.clipboard_mode = mode
+        panel.marked.clear()
+        what = names[0] if len(names) == 1 else f"{len(names)} items"
+        self.show_message(f"{verb}: {what}", 3)
 
     def paste_file(self):
-        """Paste file from clipboard"""
-        if not self.clipboard_path:
+        """Paste the clipboard as one job"""
+        if self.read_only():
+            return
+        if not self.clipboard_paths:
             self.show_message("Clipboard empty", 2)
             return
-        
+
         dest_dir = self.current_panel.path
-        filename = os.path.basename(self.clipboard_path)
-        dest_path = os.path.join(dest_dir, filename)
-        
+        items = [(src, os.path.join(dest_dir, os.path.basename(src)))
+                 for src in self.clipboard_paths]
+        src_dir = os.path.dirname(items[0][0])
+
+        if self.clipboard_mode == "copy":
+            clashes = [d for s, d in items if os.path.exists(d) and os.path.isdir(s)]
+            if clashes:
+                self.show_message(f"Paste error: '{os.path.basename(clashes[0])}' already exists", 5)
+                return
+            job = self.jobs.submit(self.file_job("copy", items, src_dir, dest_dir))
+            self.show_message(f"Copying {job.name}...", 2)
+        elif self.clipboard_mode == "cut":
+            job = self.jobs.submit(self.file_job("move", items, src_dir, dest_dir))
+            self.show_message(f"Moving {job.name}...", 2)
+            self.clipboard_paths = []  # Clear clipboard after move
+
+    def on_job_done(self, job):
+        """Apply a finished job to the panels (runs on the UI thread)"""
+        # One update per directory, however many entries the job touched
+        changed = {}
+        for src, dest in job.paths():
+            if dest:
+                changed.setdefault(os.path.dirname(dest), set()).add(os.path.basename(dest))
+            if job.kind in ("move", "delete"):
+                changed.setdefault(os.path.dirname(src), set()).add(os.path.basename(src))
+        for directory, names in changed.items():
+            for panel in self.panels_at(directory):
+                panel.apply_changes(names)
+
+        verbs = {"copy": "Copied to", "move": "Moved to", "delete": "Deleted", "link": "Linked"}
+        if job.state == "done":
+            if job.kind == "extract" and job.items:
+                self.show_message(f"Extracted {job.name}", 3)
+            elif job.kind == "extract":
+                self.show_message(f"Extracted to {os.path.basename(job.dest)}", 3)
+            elif job.kind == "archive":
+                self.show_message(f"Created {os.path.basename(job.dest)}", 3)
+            else:
+                self.show_message(f"{verbs[job.kind]}: {job.name}", 3)
+        elif job.state == "cancelled":
+            self.show_message(f"Cancelled {job.kind} of {job.name}", 3)
+        else:
+            self.show_message(f"Error during {job.kind}: {job.error}", 5)
+        if job.kind == "extract" and job.state != "done" and not job.items:
+            self.cleanup_partial(job)
+
+    def extract_marked(self):
+        """Extract the marked (or selected) archive entries into the other panel"""
+        panel = self.current_panel
+        names = sorted(panel.marked) or [panel.get_selected()]
+        if not names[0]:
+            self.show_message("No file selected", 2)
+            return
+        dest_dir = self.inactive_panel.path
+        if self.inactive_panel.archive:
+            self.show_message("Error: target panel is an archive", 3)
+            return
+        archive, inner = panel.archive, panel.archive_dir
+        import archive_fs
+
+        def on_done(job):
+            for p in self.panels_at(dest_dir):
+                for name in names:
+                    if os.path.lexists(os.path.join(dest_dir, name)):
+                        p.add_entry(name)
+            if job.state == "done":
+                self.show_message(f"Extracted {len(names)} item(s) to {dest_dir}", 3)
+            elif job.state == "cancelled":
+                self.show_message("Extraction cancelled", 3)
+            else:
+                self.show_message(f"Error extracting: {job.error}", 5)
+
+        self.jobs.submit(Job(
+            "extract", archive, dest_dir, on_done,
+            action=lambda job: archive_fs.extract_members(job, archive, inner, names, dest_dir),
+        ))
+        panel.marked.clear()
+        self.show_message(f"Extracting {len(names)} item(s)...", 2)
+
+    def submit_extract(self, job):
+        self.renderer.invalidate()  # the confirmation popup covered the panels
+        if not job:
+            self.show_message("Cancelled", 3)
+            return
+        job.on_done = self.on_job_done
+        self.jobs.submit(job)
+        self.show_message(f"Extracting {job.name}...", 2)
+
+    def cleanup_partial(self, job):
+        """Offer to remove what a cancelled or failed extraction left behind"""
+        if not os.path.isdir(job.dest):
+            return
+        height, width = self.stdscr.getmaxyx()
+        popup_h = 5
+        popup_w = 50
+        popup = curses.newwin(
+            popup_h, popup_w, height // 2 - popup_h // 2, width // 2 - popup_w // 2
+        )
+        popup.border()
+        popup.addstr(0, 2, " Partial Extraction ")
+        popup.addstr(1, 2, f"Remove '{os.path.basename(job.dest)[:30]}'?")
+        popup.addstr(3, 2, "Press Y to confirm, any key to keep")
+        popup.refresh()
+        if self.stdscr.getch() in [ord("y"), ord("Y")]:
+            self.jobs.submit(Job("delete", job.dest, on_done=self.on_job_done))
+        self.renderer.invalidate()
+
+    def measure_selected(self):
+        """Compute the recursive size of the marked or selected directories"""
+        panel = self.current_panel
+        if panel.archive:
+            self.show_message("Directory sizes are not available in archives", 3)
+            return
+        if panel.marked:
+            dirs = [e.name for e in panel.files if e.is_dir and e.name in panel.marked]
+        else:
+            entry = panel.get_selected_entry()
+            dirs = [entry.name] if entry and entry.is_dir else []
+        if not dirs:
+            self.show_message("Select a directory first", 2)
+            return
+        panel.measure_dirs(dirs, force=True)
+
+    def toggle_auto_size(self):
+        """Measure every subdirectory of both panels as they are listed"""
+        auto = not self.left_panel.auto_size
+        for panel in (self.left_panel, self.right_panel):
+            panel.auto_size = auto
+            if auto:
+                panel.measure_dirs()
+        self.show_message(f"Automatic directory sizes {'on' if auto else 'off'}", 2)
+
+    def cycle_sort(self):
+        self._sorted(self.current_panel.cycle_sort())
+
+    def reverse_sort(self):
+        self._sorted(self.current_panel.reverse_sort())
+
+    def _sorted(self, done: bool):
+        panel = self.current_panel
+        if not done:
+            self.show_message("Search results keep their order", 3)
+            return
+        direction = ", reversed" if panel.sort_reverse else ""
+        self.show_message(f"Sorted by {panel.sort_mode}{direction}", 2)
+
+    def ask(self, title, label, initial=""):
+        """One-line text prompt; returns the text, or None if ESC was pressed"""
+        height, width = self.stdscr.getmaxyx()
+        popup_h = 5
+        popup_w = min(70, width - 4)
+        popup_y = max(1, height // 2 - popup_h // 2)
+        popup_x = max(1, width // 2 - popup_w // 2)
+
+        popup = curses.newwin(popup_h, popup_w, popup_y, popup_x)
+        popup.border()
+        popup.addstr(0, 2, title)
+        popup.addstr(1, 2, label[: popup_w - 4])
+        popup.addstr(3, 2, "Enter:Confirm  ESC:Cancel")
+        popup.refresh()
+
+        input_win = curses.newwin(1, popup_w - 4, popup_y + 2, popup_x + 2)
+        input_win.addstr(0, 0, initial[: popup_w - 5])
+        cancelled = []
+
+        def validate(key):
+            if key == 27:
+                cancelled.append(True)
+                return 7
+            if key in (10, 13):
+                return 7
+            if key in (curses.KEY_BACKSPACE, 127, 8):
+                return curses.KEY_BACKSPACE
+            return key
+
+        curses.curs_set(1)
         try:
-            if self.clipboard_mode == "copy":
-                if os.path.isdir(self.clipboard_path):
-                    shutil.copytree(self.clipboard_path, dest_path)
-                else:
-                    shutil.copy2(self.clipboard_path, dest_path)
-                self.show_message(f"Copied to: {filename}", 3)
-            elif self.clipboard_mode == "cut":
-                shutil.move(self.clipboard_path, dest_path)
-                self.show_message(f"Moved to: {filename}", 3)
-                self.clipboard_path = ""  # Clear clipboard after move
-            
-            self.current_panel.refresh_files()
-        except Exception as e:
-            self.show_message(f"Paste error: {str(e)}", 5)
+            from curses import textpad
+            text = textpad.Textbox(input_win).edit(validate).strip()
+        finally:
+            curses.curs_set(0)
+            self.renderer.invalidate()
+        return None if cancelled else text
+
+    def find_files(self):
+        """Recursive find below the current directory into a results view"""
+        panel = self.current_panel
+        if panel.archive:
+            self.show_message("Find is not available in archives", 3)
+            return
+        text = self.ask(" Find ", "Glob, re:regex, size>10M, mtime<2d, or words:")
+        if not text:
+            return
+        try:
+            query = Query(text)
+        except ValueError as e:
+            self.show_message(f"Error: {e}", 5)
+            return
+        panel.start_find(Finder(panel.path, query))
+
+    def grep_files(self):
+        """Search the contents of the files below the current directory"""
+        panel = self.current_panel
+        if panel.archive:
+            self.show_message("Content search is not available in archives", 3)
+            return
+        text = self.ask(" Search in files ", "Text (all lower case ignores case) or re:regex:")
+        if not text:
+            return
+        from content_search import ContentSearch
+        try:
+            search = ContentSearch(panel.path, text)
+        except ValueError as e:
+            self.show_message(f"Error: {e}", 5)
+            return
+        panel.start_find(search)
+
+    def find_duplicates(self):
+        """Groups of identical files below the current directory, for review"""
+        panel = self.current_panel
+        if panel.archive:
+            self.show_message("Duplicate search is not available in archives", 3)
+            return
+        from duplicates import DuplicateFinder
+        panel.start_find(DuplicateFinder(panel.path))
+        self.show_message("Searching duplicates; k marks extra copies, F5 deletes, L links", 5)
+
+    def reviewing(self) -> bool:
+        """True in a finished duplicates view"""
+        panel = self.current_panel
+        return bool(panel.finder and panel.finder.review and not panel.finding)
+
+    def mark_extra_copies(self):
+        """In a duplicates view, mark all copies but the first of each group"""
+        if not self.reviewing():
+            return
+        import duplicates
+        panel = self.current_panel
+        panel.marked = duplicates.keep_first(panel.listing)
+        self.show_message(f"Marked {len(panel.marked)} extra copies", 2)
+
+    def resolve_duplicates(self, link: bool):
+        """Delete the marked copies, or hard link them to the copy kept"""
+        if not self.reviewing():
+            if link:
+                self.show_message("Hard linking works in a finished duplicates view (D)", 3)
+            return
+        import duplicates
+        panel = self.current_panel
+        pairs, whole = duplicates.plan(panel.path, panel.listing, panel.marked)
+        if whole:
+            self.show_message(f"{whole} group(s) have every copy marked; unmark one to keep", 5)
+            return
+        if not pairs:
+            self.show_message("Mark the copies to remove first (k marks all extra copies)", 3)
+            return
+        verb = "Hard link" if link else "Delete"
+        freed = human_readable(sum(key[3] for _, key, _, _ in pairs))
+        if not self.confirm(f" {verb} Duplicates ", f"{verb} {len(pairs)} copies, freeing {freed}?"):
+            return
+        done = []
+        by_path = {os.path.join(panel.path, e.path): e.name for e in panel.listing}
+
+        def on_done(job):
+            self.on_job_done(job)
+            gone = {by_path[path] for path in done}
+            panel.drop_results(duplicates.settled(panel.listing, gone))
+
+        self.jobs.submit(Job(
+            "link" if link else "delete", panel.path, "", on_done,
+            action=lambda job: duplicates.resolve(job, pairs, link, done),
+            items=[(path, "") for path, _, _, _ in pairs],
+        ))
+        self.show_message(f"{'Linking' if link else 'Deleting'} {len(pairs)} copies...", 2)
+
+    def confirm(self, title, text) -> bool:
+        """Y/N popup"""
+        height, width = self.stdscr.getmaxyx()
+        popup_h = 5
+        popup_w = 60
+        popup = curses.newwin(
+            popup_h, popup_w, height // 2 - popup_h // 2, width // 2 - popup_w // 2
+        )
+        popup.border()
+        popup.addstr(0, 2, title)
+        popup.addstr(1, 2, text[: popup_w - 4])
+        popup.addstr(3, 2, "Press Y to confirm, any key to cancel")
+        popup.refresh()
+        key = self.stdscr.getch()
+        self.renderer.invalidate()
+        return key in [ord("y"), ord("Y")]
+
+    def compare_panels(self, by_hash=False):
+        """Compare the trees of both panels in the background and highlight the differences"""
+        left, right = self.left_panel, self.right_panel
+        if any(p.archive or p.finder for p in (left, right)):
+            self.show_message("Compare works on two directories", 3)
+            return
+        if os.path.realpath(left.path) == os.path.realpath(right.path):
+            self.show_message("Both panels show the same directory", 3)
+            return
+        shown = self.comparison
+        if shown and not by_hash and (shown.left, shown.right) == (left.path, right.path):
+            self.comparison = None  # pressed again: hide the highlights
+            return
+        import compare
+        found = []
+
+        def on_done(job):
+            if job.state == "done":
+                self.comparison = found[0]
+                self.show_message(found[0].summary(self.current_panel.path), 5)
+            elif job.state == "cancelled":
+                self.show_message("Compare cancelled", 3)
+            else:
+                self.show_message(f"Error comparing: {job.error}", 5)
+
+        self.jobs.submit(Job(
+            "compare", left.path, right.path, on_done,
+            action=lambda job: found.append(compare.compare(job, left.path, right.path, by_hash)),
+        ))
+        self.show_message("Comparing by content..." if by_hash else "Comparing...", 2)
+
+    def sync_panels(self):
+        """Copy what the active panel's tree has and the other one lacks or has different"""
+        diff = self.comparison
+        source, target = self.current_panel, self.inactive_panel
+        if not diff or {diff.left, diff.right} != {source.path, target.path}:
+            self.show_message("Compare the panels first (= or #)", 3)
+            return
+        new = diff.left_only if source.path == diff.left else diff.right_only
+        if not new and not diff.changed:
+            self.show_message("Nothing to sync", 2)
+            return
+        if not self.confirm(" Sync ", f"Copy {len(new)} new, update {len(diff.changed)} changed "
+                                      f"to {os.path.basename(target.path) or target.path}?"):
+            return
+        import compare
+        stats = {}
+
+        def on_done(job):
+            # One update of the target's listing; what is left to highlight
+            # is what the target has and the source lacks
+            names = {rel.split(os.sep, 1)[0] for rel in new + diff.changed}
+            for p in self.panels_at(target.path):
+                p.apply_changes(names)
+            self.comparison = None
+            if job.state == "done":
+                diff.synced(source.path)
+                self.comparison = diff
+                self.show_message(f"Synced {stats['files']} files, wrote "
+                                  f"{human_readable(stats['written'])} of "
+                                  f"{human_readable(stats['bytes'])}", 5)
+            elif job.state == "cancelled":
+                self.show_message("Sync cancelled", 3)
+            else:
+                self.show_message(f"Error during sync: {job.error}", 5)
+
+        self.jobs.submit(Job(
+            "sync", source.path, target.path, on_done,
+            action=lambda job: compare.sync(job, diff, source.path, stats),
+        ))
+        self.show_message("Syncing...", 2)
+
+    def cancel_job(self):
+        if self.current_panel.cancel_find():
+            self.show_message("Search stopped", 2)
+            return
+        job = self.jobs.current()
+        if job:
+            job.cancel()
+            self.show_message(f"Cancelling {job.kind} of {job.name}...", 2)
+
+    def pause_job(self):
+        job = self.jobs.current()
+        if job and job.state in ("running", "paused"):
+            job.toggle_pause()
     
     def view_mounts(self):
         paths = []
@@ -553,57 +1177,169 @@ class FileManager:
         popup.addstr(popup_h - 2, 2, "Press any key to close")
         popup.refresh()
         self.stdscr.getch()
-        self.stdscr.touchwin()
-        self.stdscr.refresh()
+        self.renderer.invalidate()
+
+    def extract_archives(self):
+        """Extract every marked archive, each into its own directory, as one job"""
+        panel = self.current_panel
+        names = [n for n in panel.marked_names() if is_archive(n)]
+        if not names:
+            self.show_message("No archives marked", 2)
+            return
+        from archive_extractor import ArchiveExtractor
+        job = ArchiveExtractor.extract_many(self.stdscr, panel.path, names)
+        if job:
+            panel.marked.clear()
+        self.submit_extract(job)
+
+    def mark_matching(self, mark=True):
+        """Mark (or unmark) the entries matching a glob"""
+        text = self.ask(" Mark " if mark else " Unmark ", "Glob, e.g. *.log:")
+        if not text:
+            return
+        count = self.current_panel.mark_matching(text, mark)
+        self.show_message(f"{'Marked' if mark else 'Unmarked'} {count} item(s)", 2)
+
+    def create_archive(self):
+        """Pack the marked (or selected) entries into a new .zip, .tar.gz or .tar.xz"""
+        if self.read_only():
+            return
+        panel = self.current_panel
+        names = self.chosen_names(panel)
+        if not names:
+            self.show_message("No file selected", 2)
+            return
+        base = names[0] if len(names) == 1 else os.path.basename(panel.path.rstrip(os.sep))
+        text = self.ask(" Create Archive ", "Name (.zip, .tar.gz or .tar.xz):",
+                        f"{base or 'archive'}.tar.gz")
+        if not text:
+            return
+        import archive_creator
+        if not archive_creator.archive_format(text):
+            self.show_message(f"Error: unsupported archive type: {text}", 3)
+            return
+        target = os.path.join(panel.path, os.path.expanduser(text))
+        if os.path.exists(target) and not self.confirm(" Create Archive ", f"Overwrite {text}?"):
+            return
+        items = [(os.path.join(panel.path, name), name) for name in names]
+        panel.marked.clear()
+        self.jobs.submit(Job("archive", panel.path, target, self.on_job_done,
+                             action=lambda job: archive_creator.create_archive(job, items, target)))
+        self.show_message(f"Creating {os.path.basename(target)}...", 2)
 
     def extract_zip(self):
+        if self.read_only():
+            return
+        if self.current_panel.marked:
+            return self.extract_archives()
         selected = self.current_panel.get_selected()
-        if not selected or not selected.endswith('.zip'):
+        if not selected or not selected.lower().endswith('.zip'):
             self.show_message("Select a .zip file first", 2)
             return
-        
-        success, message = ArchiveExtractor.extract_zip(
-            self.stdscr, 
-            self.current_panel.path, 
+
+        from archive_extractor import ArchiveExtractor
+        job = ArchiveExtractor.extract_zip(
+            self.stdscr,
+            self.current_panel.path,
             selected
         )
-        self.show_message(message, 3)
-        if success:
-            self.current_panel.refresh_files()
+        self.submit_extract(job)
 
     def extract_tar_gz(self):
+        if self.read_only():
+            return
+        if self.current_panel.marked:
+            return self.extract_archives()
         selected = self.current_panel.get_selected()
-        if not selected or not (selected.endswith('.tar.gz') or selected.endswith('.tgz')):
+        if not selected or not selected.lower().endswith(('.tar.gz', '.tgz')):
             self.show_message("Select a .tar.gz or .tgz file first", 2)
             return
-        
-        success, message = ArchiveExtractor.extract_tar_gz(
+
+        from archive_extractor import ArchiveExtractor
+        job = ArchiveExtractor.extract_tar_gz(
             self.stdscr,
             self.current_panel.path,
             selected
         )
-        self.show_message(message, 3)
-        if success:
-            self.current_panel.refresh_files()
+        self.submit_extract(job)
 
     def extract_tar_xz(self):
+        if self.read_only():
+            return
+        if self.current_panel.marked:
+            return self.extract_archives()
         selected = self.current_panel.get_selected()
-        if not selected or not selected.endswith('.tar.xz'):
+        if not selected or not selected.lower().endswith('.tar.xz'):
             self.show_message("Select a .tar.xz file first", 2)
             return
-        
-        success, message = ArchiveExtractor.extract_tar_xz(
+
+        from archive_extractor import ArchiveExtractor
+        job = ArchiveExtractor.extract_tar_xz(
             self.stdscr,
             self.current_panel.path,
             selected
         )
-        self.show_message(message, 3)
-        if success:
-            self.current_panel.refresh_files()
+        self.submit_extract(job)
 
     def run(self):
         """Main application loop"""
+        profiler = self.profiler
+        with profiler.frame():
+            with profiler.phase("draw"):
+                self.draw()
+            with profiler.phase("list panels"):
+                for panel in (self.left_panel, self.right_panel):
+                    if not panel.listed:
+                        panel.refresh_files()
+        # One loop for keys, finished jobs and filesystem notifications.
+        # Background listings, sizes and searches have no descriptor and
+        # are picked up by the shorter idle timeout while they run.
+        loop = EventLoop()
+        loop.add("keys", sys.stdin)
+        loop.add("jobs", self.jobs)
+        loop.add("fs", self.watcher)
         running = True
+        last_frame = 0.0
         while running:
-            self.draw()
-            running = self.handle_input()
\ No newline at end of file
+            with profiler.frame():
+                with profiler.phase("jobs.poll"):
+                    self.jobs.poll()
+                with profiler.phase("panels.tick"):
+                    self.left_panel.tick()
+                    self.right_panel.tick()
+                with profiler.phase("fs events"):
+                    self.apply_fs_events()
+                timeout = self.idle_timeout()
+                since = time.monotonic() - last_frame
+                if since >= FRAME_INTERVAL:
+                    with profiler.phase("draw"):
+                        self.draw()
+                    last_frame = time.monotonic()
+                else:
+                    timeout = min(timeout, FRAME_INTERVAL - since)
+                with profiler.phase("handle_input"):
+                    handled = self.handle_keys()
+                if handled is None:
+                    with profiler.phase("wait", wait=True):
+                        loop.wait(timeout)
+                else:
+                    running = handled
+        loop.close()
+        self.jobs.shutdown()
+        for panel in (self.left_panel, self.right_panel):
+            panel.cancel_find()
+            panel.sizer.shutdown()
+        self.watcher.close()
+        if self.previews:
+            self.previews.close()
+        self.renderer.close()
+        self.profiler.close()
+
+    def apply_fs_events(self):
+        """Keep watches on both panels' directories and apply what changed"""
+        self.watcher.set_paths(
+            p.path for p in (self.left_panel, self.right_panel) if not p.archive
+        )
+        for path, names in self.watcher.poll().items():
+            for panel in self.panels_at(path):
+                panel.apply_changes(names)
\ No newline at end of file
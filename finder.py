@@ -0,0 +1,202 @@
+import os
+import re
+import time
+import queue
+import fnmatch
+import itertools
+import threading
+from typing import Callable, List
+
+from entries import FileEntry, sort_key
+
+WORKERS = 8
+# Matches kept per search; the walk stops once this many were found
+MAX_RESULTS = 100000
+
+SIZE_UNITS = {"": 1, "b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+TIME_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+_STAT_TERM = re.compile(r"^(size|mtime)([<>])(\d+(?:\.\d+)?)([a-z]?)$", re.IGNORECASE)
+
+
+class Query:
+    """A find query; an entry matches when every term matches.
+
+    *.py  data??.csv   glob on the name, ignoring case
+    re:^test_          regular expression searched in the name
+    size>10M  size<4k  file size in bytes, k, M, G or T (files only)
+    mtime<2d  mtime>1w modified less / more than this long ago (s, m, h, d, w)
+    anything else      substring of the name, ignoring case
+    """
+
+    def __init__(self, text: str):
+        self.text = text.strip()
+        self.name_tests: List[Callable[[str], bool]] = []
+        self.stat_tests: List[Callable[[os.stat_result], bool]] = []
+        self.files_only = False
+        for term in self.text.split():
+            self._add(term)
+        if not self.name_tests and not self.stat_tests:
+            raise ValueError("empty query")
+
+    def _add(self, term: str):
+        stat_term = _STAT_TERM.match(term)
+        if stat_term:
+            field, op, number, unit = stat_term.groups()
+            field = field.lower()
+            units = SIZE_UNITS if field == "size" else TIME_UNITS
+            if unit.lower() not in units or (field == "mtime" and not unit):
+                raise ValueError(f"bad unit in '{term}'")
+            value = float(number) * units[unit.lower()]
+            if field == "size":
+                self.files_only = True
+                if op == ">":
+                    self.stat_tests.append(lambda st: st.st_size > value)
+                else:
+                    self.stat_tests.append(lambda st: st.st_size < value)
+            else:
+                # Compared against the clock when the search starts
+                cutoff = time.time() - value
+                if op == "<":
+                    self.stat_tests.append(lambda st: st.st_mtime > cutoff)
+                else:
+                    self.stat_tests.append(lambda st: st.st_mtime < cutoff)
+        elif term.startswith("re:"):
+            try:
+                self.name_tests.append(re.compile(term[3:]).search)
+            except re.error as e:
+                raise ValueError(f"bad regex: {e}") from None
+        elif any(c in term for c in "*?["):
+            self.name_tests.append(re.compile(fnmatch.translate(term), re.IGNORECASE).match)
+        else:
+            needle = term.lower()
+            self.name_tests.append(lambda name: needle in name.lower())
+
+    def match(self, entry: os.DirEntry, is_dir: bool) -> bool:
+        for test in self.name_tests:
+            if not test(entry.name):
+                return False
+        if is_dir and self.files_only:
+            return False
+        if self.stat_tests:
+            st = entry.stat(follow_symlinks=False)
+            return all(test(st) for test in self.stat_tests)
+        return True
+
+
+class Finder:
+    """Recursive search below `root` on a pool of directory walkers.
+
+    Directories to visit go through a LIFO queue, so the walk is roughly
+    depth-first and the backlog stays proportional to depth times fan-out
+    rather than to the size of the tree. Matches are kept as FileEntry
+    objects named by their path relative to `root`, capped at `limit`.
+    Like the other background loaders, progress is published by bumping
+    `generation`; the panel polls it and copies new results with take().
+    ContentSearch provides the same interface, so the panel shows either
+    kind of result.
+
+    Symlinks are not followed and other filesystems are not entered,
+    like ``find -xdev``.
+    """
+
+    # Results are a read-only snapshot (see duplicates.DuplicateFinder)
+    review = False
+
+    def __init__(self, root: str, query: Query, workers: int = WORKERS,
+                 limit: int = MAX_RESULTS):
+        self.root = root
+        self.query = query
+        self.workers = workers
+        self.limit = limit
+        self.results: List[FileEntry] = []
+        self.scanned = 0
+        self.running = False
+        self.truncated = False
+        self.generation = 0
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._queue: "queue.LifoQueue" = queue.LifoQueue()
+        self._prefix = len(os.path.join(root, ""))
+
+    @property
+    def label(self) -> str:
+        return f"find: {self.query.text}"
+
+    @property
+    def progress(self) -> str:
+        return f"{self.scanned} dirs"
+
+    @staticmethod
+    def locate(entry: FileEntry) -> str:
+        """Path of a result relative to the root"""
+        return entry.name
+
+    sort_key = staticmethod(sort_key)
+
+    def start(self):
+        self.running = True
+        try:
+            self._dev = os.stat(self.root).st_dev
+        except OSError:
+            self.running = False
+            return
+        self._queue.put(self.root)
+        for _ in range(self.workers):
+            threading.Thread(target=self._work, name="fm-find", daemon=True).start()
+        threading.Thread(target=self._wait, name="fm-find-wait", daemon=True).start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def cancelled(self) -> bool:
+        return self._cancel.is_set() and not self.truncated
+
+    def take(self, start: int) -> List[FileEntry]:
+        """Results found after the first `start` ones"""
+        with self._lock:
+            return self.results[start:]
+
+    def _wait(self):
+        self._queue.join()
+        for _ in range(self.workers):
+            self._queue.put(None)
+        self.running = False
+        self.generation = next(self._counter)
+
+    def _work(self):
+        while True:
+            path = self._queue.get()
+            if path is None:
+                return
+            try:
+                if not self._cancel.is_set():
+                    self._scan(path)
+            except OSError:
+                pass  # unreadable or vanished directory
+            finally:
+                self._queue.task_done()
+
+    def _scan(self, path: str):
+        found = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if is_dir and entry.stat(follow_symlinks=False).st_dev == self._dev:
+                        self._queue.put(entry.path)
+                    if self.query.match(entry, is_dir):
+                        st = entry.stat(follow_symlinks=False)
+                        found.append(FileEntry(entry.path[self._prefix:], is_dir,
+                                               st.st_size, st.st_mtime, st.st_mode))
+                except OSError:
+                    continue
+        self.scanned += 1
+        if found:
+            with self._lock:
+                room = self.limit - len(self.results)
+                self.results.extend(found[:room])
+                if len(self.results) >= self.limit:
+                    self.truncated = True
+                    self._cancel.set()
+            self.generation = next(self._counter)
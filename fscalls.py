@@ -0,0 +1,112 @@
+import os
+import sys
+from collections import Counter
+from typing import Dict, Optional
+
+# Audit events (see sys.addaudithook) that stand for one filesystem call
+EVENTS = {
+    "open": "open",
+    "os.scandir": "scandir",
+    "os.listdir": "listdir",
+    "os.rename": "rename",
+    "os.remove": "remove",
+    "os.rmdir": "rmdir",
+    "os.mkdir": "mkdir",
+    "os.chmod": "chmod",
+    "os.utime": "utime",
+    "os.link": "link",
+    "os.symlink": "symlink",
+    "os.truncate": "truncate",
+    "shutil.copyfile": "copyfile",
+    "mmap.__new__": "mmap",
+}
+# os functions without an audit event, wrapped while anything counts
+WRAPPED = ("stat", "lstat", "fstat")
+
+_active = []  # Counters currently being filled
+_hooked = False
+_originals: Dict[str, object] = {}
+
+
+def _audit(event, args):
+    if _active:
+        kind = EVENTS.get(event)
+        if kind is not None:
+            for counts in _active:
+                counts[kind] += 1
+
+
+def _wrap(name: str, original):
+    def counted(*args, **kwargs):
+        for counts in _active:
+            counts[name] += 1
+        return original(*args, **kwargs)
+    return counted
+
+
+def _kernel_io() -> Optional[Dict[str, int]]:
+    """read()/write() class syscalls of the whole process, from /proc/self/io"""
+    try:
+        fd = os.open("/proc/self/io", os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        data = os.read(fd, 512)
+    finally:
+        os.close(fd)
+    fields = dict(line.split(b": ") for line in data.splitlines() if b": " in line)
+    return {"read_syscalls": int(fields.get(b"syscr", 0)),
+            "write_syscalls": int(fields.get(b"syscw", 0))}
+
+
+class FsCounter:
+    """Filesystem calls made by this process while started.
+
+    open(), os.scandir(), renames, removals and the like are seen through
+    Python's audit events, and os.stat/lstat/fstat are wrapped while any
+    counter runs. Calls made from C without going through those, such as
+    the stat behind os.DirEntry.stat(), are invisible, so the counts are
+    lower bounds. Where /proc/self/io exists, the kernel's count of
+    read() and write() class syscalls is added as well. Counts cover all
+    threads; start() and stop() may alternate to accumulate.
+    """
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self._io: Optional[Dict[str, int]] = None
+
+    def start(self):
+        global _hooked
+        if not _hooked:
+            sys.addaudithook(_audit)  # hooks cannot be removed; idle when _active is empty
+            _hooked = True
+        if not _active:
+            for name in WRAPPED:
+                _originals[name] = getattr(os, name)
+                setattr(os, name, _wrap(name, _originals[name]))
+        # Read before counting starts, so reading it is not counted
+        self._io = _kernel_io()
+        _active.append(self.counts)
+
+    def stop(self):
+        _active.remove(self.counts)
+        if not _active:
+            for name, original in _originals.items():
+                setattr(os, name, original)
+            _originals.clear()
+        io = _kernel_io()
+        if io is not None and self._io is not None:
+            io["read_syscalls"] -= 1  # the read of /proc/self/io just made
+            for key, value in io.items():
+                self.counts[key] += value - self._io[key]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def total(self) -> int:
+        """Calls seen through audit events and wrappers, without kernel counts"""
+        return sum(n for kind, n in self.counts.items() if not kind.endswith("_syscalls"))
@@ -0,0 +1,315 @@
+import os
+import time
+import queue
+import stat
+import threading
+from typing import Callable, List, Optional, Tuple
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def human_readable(size):
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class Job:
+    """A long-running file operation executed off the UI thread"""
+
+    def __init__(self, kind: str, src: str, dest: str = "", on_done: Optional[Callable] = None,
+                 action: Optional[Callable] = None, items: Optional[List[Tuple[str, str]]] = None):
+        self.kind = kind  # "copy", "move", "delete" or a custom kind with an action
+        self.src = src
+        self.dest = dest
+        self.on_done = on_done  # called on the UI thread with the job
+        self.action = action  # worker function(job) for custom kinds
+        # Batch of (src, dest) paths handled as one job; src and dest are
+        # then the directories they come from and go to
+        self.items = items or []
+        self.current = ""  # item being processed, shown in the status line
+        self.state = "queued"
+        self.error = ""
+        self.bytes_done = 0
+        self.bytes_total = 0
+        self.files_done = 0
+        self.files_total = 0
+        self.started = 0.0
+        self.finished = 0.0
+        self._cancel = threading.Event()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        if len(self.items) > 1:
+            return f"{len(self.items)} items"
+        return os.path.basename(self.items[0][0] if self.items else self.src)
+
+    def paths(self) -> List[Tuple[str, str]]:
+        """(src, dest) of everything the job works on"""
+        return self.items or [(self.src, self.dest)]
+
+    def cancel(self):
+        self._cancel.set()
+        self._resume.set()
+
+    def toggle_pause(self):
+        if self._resume.is_set():
+            self._resume.clear()
+            self.state = "paused"
+        else:
+            self._resume.set()
+            self.state = "running"
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        """Cooperative pause/cancel point, called by workers between chunks"""
+        self._resume.wait()
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def advance(self, nbytes=0, files=0):
+        """Progress callback; copy workers call this from several threads"""
+        with self._lock:
+            self.bytes_done += nbytes
+            self.files_done += files
+
+    def throughput(self):
+        end = self.finished or time.monotonic()
+        elapsed = end - self.started if self.started else 0
+        return self.bytes_done / elapsed if elapsed > 0 else 0
+
+    def eta(self):
+        rate = self.throughput()
+        if not self.bytes_total or rate <= 0:
+            return None
+        return max(0, self.bytes_total - self.bytes_done) / rate
+
+    def status(self):
+        if self.bytes_total:
+            pct = f"{self.bytes_done * 100 // self.bytes_total}%"
+        else:
+            pct = "--"
+        files = f"{self.files_done}/{self.files_total}" if self.files_total else f"{self.files_done}"
+        text = (
+            f"[{self.kind}] {self.name} {pct} {files} files "
+            f"{human_readable(self.bytes_done)} @ {human_readable(self.throughput())}/s"
+        )
+        eta = self.eta()
+        if eta is not None and self.state == "running":
+            text += f" ETA {int(eta) // 60}m{int(eta) % 60:02d}s"
+        if self.state == "paused":
+            text += " (paused)"
+        if self.current:
+            text += f" {self.current}"
+        return text
+
+
+def pool_context():
+    """Start method for worker process pools"""
+    import multiprocessing  # only needed once a pool starts
+    # fork() from a process with live threads is unsafe; prefer forkserver
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _scan(job: Job, path: str):
+    """Count files and bytes up front so progress can be reported"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        for root, dirs, files in os.walk(path):
+            job.check()
+            for f in files:
+                job.bytes_total += _data_size(os.path.join(root, f))
+            job.files_total += len(files)
+    else:
+        job.files_total += 1
+        job.bytes_total += _data_size(path)
+
+
+def _data_size(path: str) -> int:
+    """Bytes a copy will actually move (symlinks are recreated, not read)"""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return 0
+    return 0 if stat.S_ISLNK(st.st_mode) else st.st_size
+
+
+def remove_tree(job: Job, path: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        for root, dirs, files in os.walk(path, topdown=False):
+            for f in files:
+                job.check()
+                os.remove(os.path.join(root, f))
+                job.advance(files=1)
+            for d in dirs:
+                full = os.path.join(root, d)
+                if os.path.islink(full):
+                    os.remove(full)
+                else:
+                    os.rmdir(full)
+        os.rmdir(path)
+    else:
+        os.remove(path)
+        job.advance(files=1)
+
+
+def _run_batch(job: Job, copy_engine):
+    """Copy, move or delete all of job.items in one pass"""
+    items = job.items
+    if job.kind == "move":
+        # Renames first: within a filesystem the batch is one rename each
+        job.files_total = len(items)
+        rest = []
+        for src, dest in items:
+            job.check()
+            try:
+                os.rename(src, dest)
+                job.advance(files=1)
+            except OSError:
+                rest.append((src, dest))
+        if not rest:
+            return
+        items = rest
+        job.files_total = job.files_done
+    for src, _ in items:
+        _scan(job, src)
+    if job.kind == "delete":
+        job.bytes_total = 0
+        for src, _ in items:
+            remove_tree(job, src)
+        return
+    copy_engine.copy_batch(items, job)
+    if job.kind == "move":
+        for src, _ in items:
+            job.check()
+            remove_tree(job, src)
+
+
+def run_job(job: Job):
+    import copy_engine  # shutil and friends load with the first job, not at startup
+    job.state = "running" if job._resume.is_set() else "paused"
+    job.started = time.monotonic()
+    try:
+        if job.action:
+            job.action(job)
+        elif job.items:
+            _run_batch(job, copy_engine)
+        elif job.kind == "delete":
+            _scan(job, job.src)
+            job.bytes_total = 0  # deletes report files, not bytes
+            remove_tree(job, job.src)
+        elif job.kind == "move":
+            try:
+                os.rename(job.src, job.dest)
+                job.files_done = job.files_total = 1
+            except OSError:
+                # Cross-device move: copy then delete the source
+                _scan(job, job.src)
+                copy_engine.copy_any(job.src, job.dest, job)
+                job.check()
+                remove_tree(job, job.src)
+        else:
+            _scan(job, job.src)
+            copy_engine.copy_any(job.src, job.dest, job)
+        job.state = "done"
+    except JobCancelled:
+        job.state = "cancelled"
+    except Exception as e:
+        job.state = "failed"
+        job.error = str(e)
+    job.finished = time.monotonic()
+
+
+class JobManager:
+    """Queues jobs on a small worker pool and hands results back to the UI"""
+
+    def __init__(self, workers: int = 2):
+        self.workers = workers
+        self.pool = None  # started with the first job
+        self.jobs: List[Job] = []
+        self._finished: "queue.Queue[Job]" = queue.Queue()
+        # A byte per finished job wakes the UI's event loop (see fileno)
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+
+    def fileno(self) -> int:
+        """Readable when a finished job is waiting for poll()"""
+        return self._wake_r
+
+    def submit(self, job: Job) -> Job:
+        self.jobs.append(job)
+        if self.pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fm-job")
+        self.pool.submit(self._run, job)
+        return job
+
+    def _run(self, job: Job):
+        if job.cancelled:
+            job.state = "cancelled"
+        else:
+            run_job(job)
+        self._finished.put(job)
+        try:
+            os.write(self._wake_w, b"\0")
+        except (BlockingIOError, OSError):
+            pass  # pipe full (the UI wakes anyway) or closed at shutdown
+
+    def pending(self) -> bool:
+        """True while any job is queued, running or waiting to be polled"""
+        return bool(self.jobs)
+
+    def active(self) -> List[Job]:
+        return [j for j in self.jobs if j.state in ("queued", "running", "paused")]
+
+    def poll(self) -> List[Job]:
+        """Collect finished jobs; must be called from the UI thread"""
+        try:
+            os.read(self._wake_r, 4096)
+        except BlockingIOError:
+            pass
+        done = []
+        while True:
+            try:
+                job = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            self.jobs.remove(job)
+            if job.on_done:
+                job.on_done(job)
+            done.append(job)
+        return done
+
+    def current(self) -> Optional[Job]:
+        active = self.active()
+        running = [j for j in active if j.state != "queued"]
+        return (running or active or [None])[0]
+
+    def status_line(self) -> str:
+        job = self.current()
+        if not job:
+            return ""
+        text = job.status()
+        pending = len(self.active()) - 1
+        if pending > 0:
+            text += f" (+{pending} queued)"
+        return text
+
+    def shutdown(self):
+        for job in self.active():
+            job.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+        os.close(self._wake_r)
+        os.close(self._wake_w)
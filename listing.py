@@ -0,0 +1,289 @@
+import os
+import sys
+import heapq
+import bisect
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Iterator, List, Optional
+
+from entries import FileEntry
+
+# Entries are published to the UI in batches of this size while scanning
+PUBLISH_EVERY = 4096
+# The background sort works in runs of this size, then merges them, so the
+# GIL is released regularly and the UI keeps responding during the sort
+SORT_RUN = 65536
+
+
+class PackedListing:
+    """Array-backed listing for directories with millions of entries.
+
+    Names live in one NUL separated byte string and metadata in parallel
+    typed arrays, so an entry costs a few dozen bytes instead of a Python
+    object. FileEntry objects are only created for the rows actually
+    looked at. The sorted view is an index permutation (`_order`) that is
+    filled in by a background thread; until then entries appear in scan
+    order.
+
+    The loader thread only appends; rows are published by bumping
+    `generation`, which the panel polls from the UI thread.
+    """
+
+    def __init__(self):
+        # Leading NUL lets find() match whole names with b"\0name\0"
+        self._names = bytearray(b"\0")
+        self._offsets = array("Q")
+        self._is_dir = bytearray()
+        self._size = array("q")
+        self._mtime = array("d")
+        self._mode = array("L")
+        self._order: Optional[array] = None
+        self._count = 0  # rows visible to readers while loading
+        self.total_size = 0
+        self.loading = False
+        self.generation = 0
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -- storage ---------------------------------------------------------
+
+    def _append(self, entry: FileEntry) -> int:
+        self._offsets.append(len(self._names))
+        self._names += os.fsencode(entry.name) + b"\0"
+        self._is_dir.append(1 if entry.is_dir else 0)
+        self._size.append(entry.size)
+        self._mtime.append(entry.mtime)
+        self._mode.append(entry.mode & 0xFFFFFFFF)
+        if not entry.is_dir and entry.size > 0:
+            self.total_size += entry.size
+        return len(self._offsets) - 1
+
+    def extend(self, entries: List[FileEntry]):
+        for entry in entries:
+            self._append(entry)
+        self._count = len(self._offsets)
+
+    def _name(self, slot: int) -> str:
+        start = self._offsets[slot]
+        end = self._names.index(0, start)
+        return os.fsdecode(bytes(self._names[start:end]))
+
+    def _entry(self, slot: int) -> FileEntry:
+        return FileEntry(self._name(slot), bool(self._is_dir[slot]), self._size[slot],
+                         self._mtime[slot], self._mode[slot])
+
+    # -- sequence protocol -------------------------------------------------
+
+    def __len__(self):
+        return len(self._order) if self._order is not None else self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._entry(self._order[i] if self._order is not None else i)
+
+    def __iter__(self) -> Iterator[FileEntry]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def names(self) -> List[str]:
+        return [self._name(self._order[i] if self._order is not None else i)
+                for i in range(len(self))]
+
+    def find(self, name: str) -> int:
+        """Position of `name` in the view, or -1; searches the packed names in C"""
+        needle = b"\0" + os.fsencode(name) + b"\0"
+        pos = self._names.find(needle)
+        while pos != -1:
+            slot = bisect.bisect_left(self._offsets, pos + 1)
+            if self._order is None:
+                if slot < self._count:
+                    return slot
+            else:
+                try:
+                    return self._order.index(slot)
+                except ValueError:
+                    pass  # slot of a removed entry; keep looking
+            pos = self._names.find(needle, pos + 1)
+        return -1
+
+    # -- sort orders -------------------------------------------------------
+
+    @property
+    def order(self) -> Optional[array]:
+        """Slots in view order; None while loading in scan order"""
+        return self._order
+
+    @order.setter
+    def order(self, order: array):
+        self._order = order
+
+    def columns(self):
+        """Names, directory flags, sizes and mtimes, indexed by slot.
+
+        The name buffer is decoded in one go, as os.fsdecode() would do
+        per name; removed entries keep their slot, so slots line up.
+        """
+        if not self._offsets:
+            return [], self._is_dir, self._size, self._mtime
+        names = self._names[1:-1].decode(sys.getfilesystemencoding(),
+                                         "surrogateescape").split("\0")
+        return names, self._is_dir, self._size, self._mtime
+
+    # Patching is only allowed once loading finished and _order exists
+
+    def insert(self, pos: int, entry: FileEntry):
+        self._order.insert(pos, self._append(entry))
+        self.generation += 1
+
+    def pop(self, pos: int) -> FileEntry:
+        slot = self._order.pop(pos)
+        entry = self._entry(slot)
+        if not entry.is_dir and entry.size > 0:
+            self.total_size -= entry.size
+        self.generation += 1
+        return entry
+
+    # -- background loading ------------------------------------------------
+
+    def start_loading(self, iterator):
+        """Continue an open os.scandir iterator on a background thread"""
+        self.loading = True
+        self._thread = threading.Thread(target=self._load, args=(iterator,),
+                                        name="fm-listing", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _load(self, iterator):
+        try:
+            with iterator:
+                for n, entry in enumerate(iterator, 1):
+                    if self._cancel.is_set():
+                        return
+                    self._append(FileEntry.from_dir_entry(entry))
+                    if n % PUBLISH_EVERY == 0:
+                        self._count = len(self._offsets)
+                        self.generation += 1
+            self._count = len(self._offsets)
+            self.generation += 1
+            self._sort()
+        except OSError:
+            self._count = len(self._offsets)
+        finally:
+            if self._order is None and not self._cancel.is_set():
+                # Unsorted (read error): still give the view an order to patch
+                self._order = array("L", range(self._count))
+            self.loading = False
+            self.generation += 1
+
+    def _sort(self):
+        count = self._count
+        is_dir = self._is_dir
+        # One string per entry: "0"/"1" prefix puts directories first, like sort_key
+        keys = [("0" if is_dir[i] else "1") + self._name(i).lower() for i in range(count)]
+        runs = []
+        for start in range(0, count, SORT_RUN):
+            if self._cancel.is_set():
+                return
+            run = list(range(start, min(count, start + SORT_RUN)))
+            run.sort(key=keys.__getitem__)
+            runs.append(run)
+        order = array("L", heapq.merge(*runs, key=keys.__getitem__))
+        if not self._cancel.is_set():
+            self._order = order
+
+
+# Listings kept for revisiting directories, bounded by count and by an
+# estimate of their memory use
+MAX_CACHED_LISTINGS = 64
+MAX_CACHED_BYTES = 64 * 1024 * 1024
+# Cursor positions are cheap and kept for many more directories
+MAX_REMEMBERED_DIRS = 4096
+# Rough size of a FileEntry and its list slot, besides the name
+ENTRY_OVERHEAD = 150
+# A listing is only trusted if the directory's mtime was at least this old
+# when it was read: changes within one timestamp tick would go unnoticed
+RACY_NS = 2 * 10 ** 9
+
+
+def listing_cost(listing) -> int:
+    """Approximate bytes held by a listing"""
+    if isinstance(listing, PackedListing):
+        return len(listing._names) + 29 * len(listing._offsets)
+    return sum(ENTRY_OVERHEAD + len(e.name) for e in listing)
+
+
+class Visit:
+    """What a panel left behind in a directory"""
+
+    __slots__ = ("listing", "mtime_ns", "cost", "selected", "cursor", "scroll", "order")
+
+    def __init__(self, listing, mtime_ns: Optional[int], selected: str,
+                 cursor: int, scroll: int, order: tuple):
+        self.listing = listing
+        self.mtime_ns = mtime_ns
+        self.cost = listing_cost(listing) if listing is not None else 0
+        self.selected = selected
+        self.cursor = cursor
+        self.scroll = scroll
+        self.order = order  # (sort mode, reverse) the listing is sorted by
+
+
+class ListingCache:
+    """Per-path listings and cursor positions, least recently used first.
+
+    A listing is valid while the directory's mtime_ns matches the one
+    taken before it was read; adding, removing or renaming an entry
+    changes it. Changes to files that keep their names (size, mtime) do
+    not, so a reused listing can show stale metadata for those until the
+    next rescan, the same trade-off as dirsize's cache.
+    """
+
+    def __init__(self, max_listings: int = MAX_CACHED_LISTINGS,
+                 max_bytes: int = MAX_CACHED_BYTES):
+        self.max_listings = max_listings
+        self.max_bytes = max_bytes
+        self._visits: "OrderedDict[str, Visit]" = OrderedDict()
+        self.listings = 0
+        self.bytes = 0
+
+    def store(self, path: str, visit: Visit):
+        self._drop(path)
+        if visit.listing is not None and visit.cost > self.max_bytes:
+            visit.listing, visit.cost = None, 0
+        self._visits[path] = visit
+        if visit.listing is not None:
+            self.listings += 1
+            self.bytes += visit.cost
+        # Evict listings before positions: the oldest listings go first
+        for old in self._visits.values():
+            if self.listings <= self.max_listings and self.bytes <= self.max_bytes:
+                break
+            if old.listing is not None:
+                self.listings -= 1
+                self.bytes -= old.cost
+                old.listing, old.cost = None, 0
+        while len(self._visits) > MAX_REMEMBERED_DIRS:
+            self._drop(next(iter(self._visits)))
+
+    def take(self, path: str) -> Optional[Visit]:
+        """Remove and return the visit of `path`; the panel owns the listing again"""
+        return self._drop(path)
+
+    def _drop(self, path: str) -> Optional[Visit]:
+        visit = self._visits.pop(path, None)
+        if visit is not None and visit.listing is not None:
+            self.listings -= 1
+            self.bytes -= visit.cost
+        return visit
+
+    def clear(self):
+        self._visits.clear()
+        self.listings = self.bytes = 0
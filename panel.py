@@ -1,59 +1,648 @@
 import os
+import time
 import curses
-from typing import List
+import fnmatch
+from array import array
+from typing import List, Optional, Set
+from entries import FileEntry, is_archive
+from listing import PackedListing, ListingCache, Visit, RACY_NS
+from sorting import MODES, Orderings, ordering, insert_position
+from search_index import NameIndex
+from dirsize import DirSizer
+from finder import Finder
+
+
+# Directories first, then names, case-insensitively
+DEFAULT_ORDER = ("name", False)
+
 
 class FilePanel:
-    def __init__(self, path: str):
+    # Watcher bursts larger than this are applied as one full rescan
+    RESCAN_THRESHOLD = 256
+    # Directories with more entries than this are listed in the background
+    # into a PackedListing instead of a list of FileEntry objects
+    VIRTUAL_THRESHOLD = 20000
+
+    def __init__(self, path: str, listed: bool = True):
         self.path = path
-        self.files: List[str] = []
+        # Full sorted listing; self.files is the (possibly filtered) view of it
+        self.listing: List[FileEntry] = []
+        self.files: List[FileEntry] = []
         self.cursor_pos = 0
         self.scroll_offset = 0
         self.filter = ""
-        self.refresh_files()
+        self.fuzzy = False
+        self._index: Optional[NameIndex] = None
+        # Archive being browsed as a virtual directory, and the path inside it
+        self.archive: Optional[str] = None
+        self.archive_dir = ""
+        self.marked: Set[str] = set()
+        # Background listing state for huge directories
+        self._seen_generation = -1
+        self._deferred: Set[str] = set()
+        self._loading_selected = ""
+        # Listings and cursor positions of directories visited before;
+        # _listed_mtime is the mtime_ns the current listing is valid for
+        self.visits = ListingCache()
+        self._listed_mtime: Optional[int] = None
+        # Recursive directory sizes, measured in the background
+        self.sizer = DirSizer()
+        self.sizer.reset(path)
+        self._sizes_seen = self.sizer.generation
+        self.auto_size = False
+        # Sort mode (see sorting.MODES) and direction; orderings computed
+        # for other modes are kept until the listing changes
+        self.sort_mode, self.sort_reverse = DEFAULT_ORDER
+        self._orderings = Orderings()
+        self._changes = 0
+        # Recursive find (or content search) below self.path; while set
+        # the listing holds its results
+        self.finder: Optional[Finder] = None
+        self._find_seen = -1
+        # Footer aggregates, kept in sync with self.files
+        self.total_files = 0
+        self.total_size = 0
+        # With listed=False the owner calls refresh_files() later, e.g.
+        # after the first frame was painted
+        self.listed = False
+        if listed:
+            self.refresh_files()
 
     def refresh_files(self):
+        self.listed = True
+        self._listed_mtime = None
+        self._listing_changed()
+        if self.archive:
+            import archive_fs  # tarfile and zipfile only load once an archive is opened
+            try:
+                entries = self._ordered(archive_fs.get_index(self.archive).listdir(self.archive_dir))
+            except Exception:
+                entries = [FileEntry("[Unreadable archive]", False, -1, 0.0, 0)]
+            self.listing = entries
+            self._apply_filter()
+            return
+        self._stop_loading()
         try:
-            files = os.listdir(self.path)
-            self.files = sorted(
-                files,
-                key=lambda x: (not os.path.isdir(os.path.join(self.path, x)), x.lower())
-            )
-            if self.filter:
-                self.files = [f for f in self.files if self.filter.lower() in f.lower()]
+            mtime = os.stat(self.path).st_mtime_ns
+            if time.time_ns() - mtime >= RACY_NS:
+                self._listed_mtime = mtime
+        except OSError:
+            pass
+        try:
+            # Single pass: one stat per entry, nothing else touches the disk
+            it = os.scandir(self.path)
         except PermissionError:
-            self.files = ["[Permission Denied]"]
+            self.listing = [FileEntry("[Permission Denied]", False, -1, 0.0, 0)]
+            self._apply_filter()
+            return
+        entries = []
+        for e in it:
+            entries.append(FileEntry.from_dir_entry(e))
+            if len(entries) >= self.VIRTUAL_THRESHOLD:
+                # Huge directory: show what we have and stream the rest
+                packed = PackedListing()
+                packed.extend(entries)
+                packed.start_loading(it)
+                self.listing = packed
+                self._seen_generation = packed.generation
+                break
+        else:
+            it.close()
+            self.listing = self._ordered(entries)
+        self._apply_filter()
+        if self.auto_size:
+            self.measure_dirs()
+
+    @property
+    def loading(self) -> bool:
+        return isinstance(self.listing, PackedListing) and self.listing.loading
+
+    @property
+    def sizing(self) -> bool:
+        return self.sizer.busy()
+
+    @property
+    def finding(self) -> bool:
+        return self.finder is not None and self.finder.running
+
+    @property
+    def title(self) -> str:
+        if self.finder:
+            return f"{self.path} [{self.finder.label}]"
+        if self.sort_order != DEFAULT_ORDER:
+            return f"{self.path} [by {self.sort_mode}{', reversed' if self.sort_reverse else ''}]"
+        return self.path
+
+    @property
+    def status(self) -> str:
+        """What the panel is busy with, for the footer"""
+        if self.loading or not self.listed:
+            return "loading..."
+        if self.finding:
+            return f"searching, {self.finder.progress}..."
+        if self.finder and self.finder.truncated:
+            return f"first {len(self.listing)} matches"
+        if self.sizing:
+            return "sizing..."
+        return ""
+
+    @property
+    def dir_sizes(self):
+        """Subdirectory name -> (recursive bytes, complete)"""
+        return self.sizer.sizes
+
+    def entry_size(self, entry: FileEntry) -> int:
+        """Bytes an entry accounts for: its measured size for directories"""
+        if entry.is_dir:
+            return self.sizer.sizes.get(entry.name, (0, False))[0]
+        return entry.size if entry.size > 0 else 0
+
+    @property
+    def sort_order(self) -> tuple:
+        return self.sort_mode, self.sort_reverse
+
+    def _listing_changed(self):
+        """Drop what was derived from the listing: the search index and orderings"""
+        self._index = None
+        self._changes += 1
+
+    def _ordered(self, listing):
+        """The entries of `listing` in the current sort order.
+
+        A list of FileEntry objects gives a new list; a PackedListing gives
+        the slot order to install with its `order` setter.
+        """
+        mode, reverse = self.sort_order
+        if isinstance(listing, PackedListing):
+            names, is_dir, sizes, mtimes = listing.columns()
+            slots = listing.order
+            if mode == "size":
+                # What entry_size() says: measured sizes for directories
+                measured = self.sizer.sizes
+                sizes = [0 if d else max(s, 0) for d, s in zip(is_dir, sizes)]
+                for slot, d in enumerate(is_dir):
+                    if d:
+                        sizes[slot] = measured.get(names[slot], (0, False))[0]
+            return array("L", ordering(mode, reverse, slots, names, is_dir, sizes, mtimes))
+        order = ordering(mode, reverse, range(len(listing)), [e.name for e in listing],
+                         [e.is_dir for e in listing], [self.entry_size(e) for e in listing],
+                         [e.mtime for e in listing])
+        return [listing[i] for i in order]
+
+    def _stop_loading(self):
+        if isinstance(self.listing, PackedListing):
+            self.listing.cancel()
+        self._deferred.clear()
+
+    def tick(self) -> bool:
+        """Pick up background progress; True while the listing is loading"""
+        if self.finder and self.finder.generation != self._find_seen:
+            self._take_results()
+        if self.sizer.generation != self._sizes_seen:
+            self._sizes_seen = self.sizer.generation
+            if self.sort_mode == "size" and not isinstance(self.listing, PackedListing):
+                self._resort()
+            else:
+                self._recount()
+        listing = self.listing
+        if not isinstance(listing, PackedListing):
+            return False
+        if listing.generation != self._seen_generation:
+            self._seen_generation = listing.generation
+            self._listing_changed()
+            if not (self.filter and listing.loading):
+                self._apply_filter()
+            if not listing.loading:
+                if self.sort_order != DEFAULT_ORDER and listing.order is not None:
+                    # The background sort is by name; memoized like any other order
+                    self._reorder(DEFAULT_ORDER)
+                # The sorted order replaced scan order: keep the cursor on its entry
+                if self._loading_selected:
+                    self.select(self._loading_selected)
+                deferred, self._deferred = self._deferred, set()
+                if deferred:
+                    self.apply_changes(deferred)
+                self._seen_generation = listing.generation
+        if listing.loading:
+            # Remembered in scan order, before the sorted order is swapped in
+            self._loading_selected = self.get_selected()
+        return listing.loading
+
+    @property
+    def index(self) -> NameIndex:
+        """Search index over the current listing, built on first use"""
+        if self._index is None:
+            if isinstance(self.listing, PackedListing):
+                names = self.listing.names()
+            else:
+                names = [e.name for e in self.listing]
+            self._index = NameIndex(names)
+        return self._index
+
+    def set_filter(self, query: str, fuzzy: bool = False):
+        """Filter the cached listing in memory; never touches the disk"""
+        self.filter = query
+        self.fuzzy = fuzzy
+        self._apply_filter()
+        self.cursor_pos = 0
+        self.scroll_offset = 0
+
+    def _apply_filter(self):
+        if self.filter:
+            listing = self.listing
+            self.files = [listing[i] for i in self.index.match(self.filter, self.fuzzy)]
+        else:
+            self.files = self.listing
+        self._recount()
+
+    def _recount(self):
+        self.total_files = len(self.files)
+        if isinstance(self.files, PackedListing):
+            # Sizer threads add keys while they run: sum a snapshot (list() of
+            # a dict view copies it without releasing the GIL)
+            measured = list(self.sizer.sizes.values())
+            self.total_size = self.files.total_size + sum(s for s, _ in measured)
+        else:
+            self.total_size = sum(map(self.entry_size, self.files))
+
+    def start_find(self, finder: Finder):
+        """Replace the listing with the results of a search rooted here"""
+        self._leave()
+        self._stop_loading()
+        self._close_find()
+        self.finder = finder
+        self._find_seen = -1
+        self.listing = []
+        self._listing_changed()
+        self.filter = ""
+        self.cursor_pos = self.scroll_offset = 0
+        self.marked.clear()
+        self._apply_filter()
+        self.finder.start()
+
+    def cancel_find(self) -> bool:
+        if self.finding:
+            self.finder.cancel()
+            return True
+        return False
+
+    def _close_find(self):
+        if self.finder:
+            self.finder.cancel()
+            self.finder = None
+
+    def _take_results(self):
+        finder = self.finder
+        self._find_seen = finder.generation
+        # Read before take(): once the walk is over every result is visible
+        finished = not finder.running
+        new = finder.take(len(self.listing))
+        if not new and not finished:
+            return
+        self.listing.extend(new)
+        if finished:
+            # Results stream in walk order; present them sorted when complete
+            self._resort(finder.sort_key)
+            return
+        self._listing_changed()
+        self._apply_filter()
+
+    def drop_results(self, names: Set[str]):
+        """Take results out of the results view once they were dealt with"""
+        selected = self.get_selected()
+        self.listing = [e for e in self.listing if e.name not in names]
+        self.marked -= names
+        self._listing_changed()
+        self._apply_filter()
+        self.select(selected)
+        self.cursor_pos = min(self.cursor_pos, max(0, len(self.files) - 1))
+
+    def _resort(self, key=None):
+        """Re-sort the listing after the sizes changed, or by `key`"""
+        selected = self.get_selected()
+        if key:
+            self.listing.sort(key=key)
+        else:
+            self.listing = self._ordered(self.listing)
+        self._listing_changed()
+        self._apply_filter()
+        if selected:
+            self.select(selected)
+
+    def set_sort(self, mode: str, reverse: bool = False) -> bool:
+        """Switch the sort order; False for search results, which keep theirs.
+
+        Huge directories still loading switch once their name order is in.
+        """
+        if self.finder:
+            return False
+        previous = self.sort_order
+        self.sort_mode, self.sort_reverse = mode, reverse
+        if not self.loading and self.sort_order != previous:
+            self._reorder(previous)
+        return True
+
+    def cycle_sort(self) -> bool:
+        """Next sort mode, keeping the direction"""
+        return self.set_sort(MODES[(MODES.index(self.sort_mode) + 1) % len(MODES)],
+                             self.sort_reverse)
+
+    def reverse_sort(self) -> bool:
+        return self.set_sort(self.sort_mode, not self.sort_reverse)
+
+    def _reorder(self, previous: tuple):
+        """Put the listing, sorted by `previous`, in the current order.
+
+        Both orders are memoized for the listing's generation, so going
+        back and forth between modes sorts each one once.
+        """
+        listing = self.listing
+        packed = isinstance(listing, PackedListing)
+        self._orderings.put(self._changes, previous, listing.order if packed else listing)
+        order = self._orderings.get(self._changes, self.sort_order)
+        if order is None:
+            order = self._ordered(listing)
+            self._orderings.put(self._changes, self.sort_order, order)
+        selected = self.get_selected()
+        if packed:
+            listing.order = order
+        else:
+            self.listing = order
+        self._index = None  # positions moved; the entries did not
+        self._apply_filter()
+        if selected:
+            self.select(selected)
+
+    def measure_dirs(self, names=None, force: bool = False):
+        """Start background size walks for `names`, or for every subdirectory"""
+        if self.archive:
+            return
+        if names is None:
+            if isinstance(self.listing, PackedListing):
+                return  # huge directories are only measured on request
+            names = [e.name for e in self.listing if e.is_dir]
+        for name in names:
+            self.sizer.request(name, force)
+
+    @staticmethod
+    def _find_in(entries: List[FileEntry], name: str) -> int:
+        if isinstance(entries, PackedListing):
+            return entries.find(name)
+        for i, entry in enumerate(entries):
+            if entry.name == name:
+                return i
+        return -1
+
+    def add_entry(self, name: str):
+        """Stat one new (or replaced) entry and insert it without rescanning"""
+        if self.finder:
+            return
+        if self.loading:
+            self._deferred.add(name)
+            return
+        self.remove_entry(name)
+        entry = FileEntry.from_path(os.path.join(self.path, name))
+        if entry.is_dir and self.auto_size and not self.archive:
+            self.sizer.request(name)
+        pos = insert_position(self.listing, entry, self.sort_mode, self.sort_reverse,
+                              self.entry_size)
+        self.listing.insert(pos, entry)
+        self._listing_changed()
+        if self.filter:
+            selected = self.get_selected()
+            self._apply_filter()
+            self.select(selected)
+            return
+        self.total_files += 1
+        self.total_size += self.entry_size(entry)
+        if pos <= self.cursor_pos and len(self.files) > 1:
+            self.cursor_pos += 1
+
+    def remove_entry(self, name: str):
+        if self.loading:
+            self._deferred.add(name)
+            return
+        idx = self._find_in(self.listing, name)
+        if idx < 0:
+            return
+        entry = self.listing.pop(idx)
+        self._listing_changed()
+        size = self.entry_size(entry)
+        if entry.is_dir:
+            self.sizer.forget(name)
+            self._sizes_seen = self.sizer.generation
+        if self.filter:
+            idx = self._find_in(self.files, name)
+            if idx < 0:
+                return
+            self.files.pop(idx)
+        self.total_files -= 1
+        self.total_size -= size
+        if idx < self.cursor_pos or self.cursor_pos >= len(self.files):
+            self.cursor_pos = max(0, self.cursor_pos - 1)
+
+    def apply_changes(self, names):
+        """Patch the listing for names reported changed by the watcher or a job.
+
+        `names` is None when the directory itself changed (or the event
+        queue overflowed), in which case a full rescan is the only option.
+        Large bursts are also cheaper as one rescan than many patches.
+        """
+        if self.finder:
+            return  # find results are a snapshot, not a directory
+        if self.loading and names is not None:
+            # The loader may or may not have seen these yet; settle them after it
+            self._deferred.update(names)
+            return
+        selected = self.get_selected()
+        if names is None or len(names) > self.RESCAN_THRESHOLD:
+            if not os.path.isdir(self.path):
+                # Directory vanished under us: climb to the nearest survivor
+                while not os.path.isdir(self.path) and os.path.dirname(self.path) != self.path:
+                    self.path = os.path.dirname(self.path)
+                self.cursor_pos = self.scroll_offset = 0
+                self.sizer.reset(self.path)
+            self.refresh_files()
+        else:
+            for name in names:
+                if os.path.lexists(os.path.join(self.path, name)):
+                    self.add_entry(name)
+                else:
+                    self.remove_entry(name)
+                    self.marked.discard(name)
+        if selected:
+            self.select(selected)
+        self.cursor_pos = min(self.cursor_pos, max(0, len(self.files) - 1))
+
+    def rename_entry(self, old_name: str, new_name: str):
+        self.remove_entry(old_name)
+        self.add_entry(new_name)
+        self.select(new_name)
+
+    def select(self, name: str):
+        idx = self._find_in(self.files, name)
+        if idx >= 0:
+            self.cursor_pos = idx
 
     def navigate(self, direction: int):
+        """Move by `direction` rows, wrapping around either end"""
         if not self.files:
             return
-        self.cursor_pos += direction
-        if self.cursor_pos < 0:
-            self.cursor_pos = len(self.files) - 1
-        elif self.cursor_pos >= len(self.files):
-            self.cursor_pos = 0
+        self.cursor_pos = (self.cursor_pos + direction) % len(self.files)
+        self._scroll_to_cursor()
 
+    def jump(self, pos: int):
+        """Move the cursor to any position; O(1) even on virtual listings"""
+        if not self.files:
+            return
+        self.cursor_pos = max(0, min(pos, len(self.files) - 1))
+        self._scroll_to_cursor()
+
+    def page(self, direction: int):
+        self.jump(self.cursor_pos + direction * max(1, curses.LINES - 6))
+
+    def _scroll_to_cursor(self):
         if self.cursor_pos < self.scroll_offset:
             self.scroll_offset = self.cursor_pos
         elif self.cursor_pos >= self.scroll_offset + curses.LINES - 6:
             self.scroll_offset = self.cursor_pos - (curses.LINES - 6) + 1
 
-    def get_selected(self) -> str:
+    def get_selected_entry(self):
         if not self.files or self.cursor_pos >= len(self.files):
-            return ""
+            return None
         return self.files[self.cursor_pos]
 
-    def enter_directory(self):
-        selected = self.get_selected()
-        if selected and os.path.isdir(os.path.join(self.path, selected)):
-            self.path = os.path.join(self.path, selected)
-            self.cursor_pos = 0
-            self.scroll_offset = 0
+    def get_selected(self) -> str:
+        entry = self.get_selected_entry()
+        return entry.name if entry else ""
+
+    def toggle_mark(self):
+        name = self.get_selected()
+        if not name:
+            return
+        self.marked ^= {name}
+        self.navigate(1)
+
+    def _shown_names(self) -> List[str]:
+        if isinstance(self.files, PackedListing):
+            return self.files.names()
+        return [e.name for e in self.files]
+
+    def mark_matching(self, pattern: str, mark: bool = True) -> int:
+        """Mark (or unmark) the shown entries matching a glob; how many matched"""
+        names = fnmatch.filter(self._shown_names(), pattern)
+        if mark:
+            self.marked.update(names)
+        else:
+            self.marked.difference_update(names)
+        return len(names)
+
+    def invert_marks(self):
+        """Mark the shown entries that are not marked, and unmark the others"""
+        self.marked ^= set(self._shown_names())
+
+    def marked_names(self) -> List[str]:
+        """Marked entries still in the listing, in listing order"""
+        if not self.marked:
+            return []
+        if isinstance(self.listing, PackedListing):
+            names = self.listing.names()
+        else:
+            names = [e.name for e in self.listing]
+        return [n for n in names if n in self.marked]
+
+    def _leave(self):
+        """Remember the listing and cursor of the directory being left"""
+        if self.finder:
+            return  # results are not the directory's listing
+        listing = self.listing
+        if self.loading or self._listed_mtime is None:
+            listing = None
+        self.visits.store(self.path, Visit(listing, self._listed_mtime, self.get_selected(),
+                                           self.cursor_pos, self.scroll_offset,
+                                           self.sort_order))
+
+    def _reuse(self, visit: Visit) -> bool:
+        """Show a remembered listing if the directory is unchanged since"""
+        if visit.listing is None:
+            return False
+        try:
+            if os.stat(self.path).st_mtime_ns != visit.mtime_ns:
+                return False
+        except OSError:
+            return False
+        self._stop_loading()
+        self.listing = visit.listing
+        self._listed_mtime = visit.mtime_ns
+        self._listing_changed()
+        if isinstance(self.listing, PackedListing):
+            self._seen_generation = self.listing.generation
+        if visit.order != self.sort_order:
+            self._reorder(visit.order)
+        else:
+            self._apply_filter()
+        if self.auto_size:
+            self.measure_dirs()
+        return True
+
+    def _change_dir(self, path: str, select: str = ""):
+        self._leave()
+        self.path = path
+        self.cursor_pos = 0
+        self.scroll_offset = 0
+        self.marked.clear()
+        self._close_find()
+        self.sizer.reset(path)
+        self._sizes_seen = self.sizer.generation
+        visit = self.visits.take(path)
+        if visit is None or not self._reuse(visit):
             self.refresh_files()
+        if visit is not None:
+            # Back where we were: same entry if it is still there
+            self.cursor_pos = min(visit.cursor, max(0, len(self.files) - 1))
+            self.scroll_offset = visit.scroll
+            if visit.selected:
+                self.select(visit.selected)
+        if select:
+            self.select(select)
+
+    def enter_directory(self):
+        entry = self.get_selected_entry()
+        if not entry:
+            return
+        if self.finder:
+            # Jump to a result: open directories, show files in their directory
+            target = os.path.join(self.path, self.finder.locate(entry))
+            if entry.is_dir:
+                self._change_dir(target)
+            else:
+                self._change_dir(os.path.dirname(target), os.path.basename(target))
+            return
+        if entry.is_dir:
+            if self.archive:
+                self.archive_dir = f"{self.archive_dir}/{entry.name}" if self.archive_dir else entry.name
+            self._change_dir(os.path.join(self.path, entry.name))
+        elif not self.archive and is_archive(entry.name):
+            import archive_fs
+            archive = os.path.join(self.path, entry.name)
+            archive_fs.get_index(archive)  # fail before leaving the real directory
+            self.archive = archive
+            self.archive_dir = ""
+            self._change_dir(archive)
 
     def go_up(self):
+        if self.finder:
+            # Leave the results, back to the directory the search started in
+            self._change_dir(self.path)
+            return
+        if self.archive:
+            if self.archive_dir:
+                self.archive_dir, _, name = self.archive_dir.rpartition('/')
+                self._change_dir(os.path.dirname(self.path), name)
+            else:
+                archive, self.archive = self.archive, None
+                self._change_dir(os.path.dirname(archive), os.path.basename(archive))
+            return
         parent = os.path.dirname(self.path)
         if parent != self.path:
-            self.path = parent
-            self.cursor_pos = 0
-            self.scroll_offset = 0
-            self.refresh_files()
+            self._change_dir(parent, os.path.basename(self.path))
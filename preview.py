@@ -0,0 +1,238 @@
+import os
+import re
+import stat
+from collections import OrderedDict
+from typing import List, Optional
+
+# A NUL byte in the first SNIFF bytes shows the file as hex
+SNIFF = 8192
+# Lines are looked for this far at most; longer ones are cut into pieces
+MAX_LINE = 64 * 1024
+# Line ends are looked for in reads of this size
+STEP = 4096
+MAX_CACHED = 8
+TAB = 4
+
+_CONTROL = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]")
+
+
+class Preview:
+    """A scrollable window onto one file, as text or hex.
+
+    The file is read with pread() a window at a time: rows() reads only
+    the bytes of the rows on screen and scrolling looks for line ends
+    next to the window, so a multi-GB log opens as fast as a short one.
+    Unlike a mapping, a file truncated while shown (a log rotated with
+    copytruncate) only makes reads come up short. `offset` is the first
+    byte shown, always at a line start (text) or a row start (hex).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.key = None
+        self.size = 0
+        self.offset = 0
+        self.hex = False
+        self.error = ""
+        self.row_bytes = 16  # hex bytes per row, set by rows() for the width
+        self._fd: Optional[int] = None
+        try:
+            # Non-blocking, so a FIFO under the cursor does not hang the UI
+            fd = os.open(path, os.O_RDONLY | getattr(os, "O_NONBLOCK", 0))
+        except OSError as e:
+            self.error = e.strerror or str(e)
+            return
+        try:
+            st = os.fstat(fd)
+            self.key = (st.st_mtime_ns, st.st_size)
+            self.size = st.st_size
+            if not stat.S_ISREG(st.st_mode):
+                self.error = "directory" if stat.S_ISDIR(st.st_mode) else "not a regular file"
+            elif self.size:
+                self._fd, fd = fd, None
+        except OSError as e:
+            self.error = str(e)
+        finally:
+            if fd is not None:
+                os.close(fd)
+        self.hex = b"\0" in self._read(0, SNIFF)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _read(self, start: int, length: int) -> bytes:
+        if self._fd is None or length <= 0:
+            return b""
+        try:
+            data = os.pread(self._fd, length, start)
+            if len(data) < length and start + len(data) < self.size:
+                # Truncated since it was opened: go by the new size
+                self.size = os.fstat(self._fd).st_size
+            return data
+        except OSError:
+            return b""
+
+    # -- positions ---------------------------------------------------------
+
+    def _next_line(self, pos: int) -> int:
+        """Start of the row after the text row at `pos`"""
+        limit = min(self.size, pos + MAX_LINE)
+        start = pos
+        while start < limit:
+            chunk = self._read(start, min(STEP, limit - start))
+            if not chunk:
+                break
+            end = chunk.find(b"\n")
+            if end >= 0:
+                return start + end + 1
+            start += len(chunk)
+        return max(pos + 1, min(limit, self.size))
+
+    def _line_start(self, pos: int) -> int:
+        """Start of the text row holding `pos`"""
+        if pos <= 0:
+            return 0
+        floor = max(0, pos - MAX_LINE)
+        end = pos
+        while end > floor:
+            start = max(floor, end - STEP)
+            chunk = self._read(start, end - start)
+            found = chunk.rfind(b"\n")
+            if found >= 0:
+                return start + found + 1
+            end = start
+        return floor
+
+    def _align(self, pos: int) -> int:
+        pos = max(0, min(pos, max(0, self.size - 1)))
+        if self._fd is None:
+            return 0
+        return pos - pos % self.row_bytes if self.hex else self._line_start(pos)
+
+    def scroll(self, rows: int):
+        """Move the window by `rows` rows, down if positive"""
+        if self._fd is None:
+            return
+        if self.hex:
+            self.offset = self._align(self.offset + rows * self.row_bytes)
+            return
+        pos = self.offset
+        for _ in range(abs(rows)):
+            if rows > 0:
+                nxt = self._next_line(pos)
+                if nxt >= self.size:
+                    break
+                pos = nxt
+            else:
+                if pos == 0:
+                    break
+                pos = self._line_start(pos - 1)
+        self.offset = pos
+
+    def jump(self, offset: int):
+        """Show the row holding byte `offset`"""
+        self.offset = self._align(offset)
+
+    def jump_end(self, height: int):
+        """Show the last `height` rows"""
+        self.offset = self._align(self.size)
+        self.scroll(1 - height)
+
+    def toggle_hex(self):
+        self.hex = not self.hex
+        self.offset = self._align(self.offset)
+
+    @property
+    def percent(self) -> int:
+        return self.offset * 100 // self.size if self.size else 100
+
+    # -- rows --------------------------------------------------------------
+
+    def rows(self, height: int, width: int) -> List[str]:
+        """The text of the rows on screen, at most `width` characters each"""
+        if self.error:
+            return [f"<{self.error}>"]
+        if self._fd is None:
+            return ["<empty>"]
+        try:
+            # Follow a log that grows, or is truncated, while shown
+            self.size = os.fstat(self._fd).st_size
+        except OSError:
+            pass
+        if self.offset >= self.size:
+            self.jump_end(height)
+        if self.hex:
+            return self._hex_rows(height, width)
+        lines = []
+        pos = self.offset
+        while len(lines) < height and pos < self.size:
+            nxt = self._next_line(pos)
+            # At most 4 bytes a character, plus room for the line end
+            raw = self._read(pos, min(nxt - pos, width * 4 + 2))
+            text = raw.decode("utf-8", "replace").rstrip("\r\n").expandtabs(TAB)
+            lines.append(_CONTROL.sub(".", text)[:width])
+            pos = nxt
+        return lines
+
+    def _hex_rows(self, height: int, width: int) -> List[str]:
+        # "offset  hex bytes  chars" takes 11 + 4 * n columns for n bytes a row
+        per_row = 16 if width >= 75 else 8
+        if per_row != self.row_bytes:
+            self.row_bytes = per_row
+            self.offset -= self.offset % per_row
+        data = self._read(self.offset, height * per_row)
+        lines = []
+        for start in range(0, len(data), per_row):
+            chunk = data[start:start + per_row]
+            hexed = " ".join(f"{b:02x}" for b in chunk)
+            chars = "".join(chr(b) if 32 <= b < 127 else "." for b in chunk)
+            lines.append(f"{self.offset + start:08x}  {hexed:<{per_row * 3 - 1}}  {chars}"[:width])
+        return lines
+
+
+class PreviewCache:
+    """The most recently shown previews, kept open with their scroll position.
+
+    An entry is reused while the file's mtime and size are unchanged.
+    """
+
+    def __init__(self, size: int = MAX_CACHED):
+        self.size = size
+        self._items: "OrderedDict[str, Preview]" = OrderedDict()
+
+    def get(self, path: str) -> Preview:
+        try:
+            st = os.stat(path)
+            key = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            key = None
+        hit = self._items.pop(path, None)
+        if hit is not None and hit.key == key and key is not None:
+            self._items[path] = hit
+            return hit
+        if hit is not None:
+            hit.close()
+        preview = self._items[path] = Preview(path)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)[1].close()
+        return preview
+
+    def close(self):
+        for preview in self._items.values():
+            preview.close()
+        self._items.clear()
+
+
+def parse_offset(text: str, size: int) -> Optional[int]:
+    """A byte offset from "1234", "0x4d2", "50%" or a negative count from the end"""
+    text = text.strip().lower()
+    try:
+        if text.endswith("%"):
+            return int(size * float(text[:-1]) / 100)
+        value = int(text, 0)
+    except (ValueError, OverflowError):
+        # OverflowError: "inf%" or "1e400%"
+        return None
+    return size + value if value < 0 else value
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Optional
+
+from fscalls import FsCounter
+
+# Trace events kept for the dump; the oldest are dropped beyond this
+MAX_EVENTS = 200000
+# Frames averaged in the overlay
+RECENT_FRAMES = 60
+_NULL = nullcontext()
+
+
+class Frame:
+    __slots__ = ("busy", "phases", "fs_calls")
+
+    def __init__(self):
+        self.busy = 0.0  # seconds, not counting the wait for a key
+        self.phases = {}
+        self.fs_calls = 0
+
+
+class Profiler:
+    """Opt-in timings of the main loop, for finding out where a slow frame went.
+
+    Set FMANAGER_PROFILE=1 to time each phase of a frame (background
+    polling, draw, input handling and the action bound to the key) and
+    count filesystem calls per frame with fscalls.FsCounter; F9 toggles
+    an overlay with the numbers. With FMANAGER_TRACE=<file> (which implies
+    profiling) the phases are also written as Chrome trace JSON on exit,
+    for chrome://tracing or https://ui.perfetto.dev.
+
+    Filesystem calls are counted for the whole process, so a frame also
+    gets the calls background threads made while it ran.
+    """
+
+    def __init__(self, enabled: bool = False, trace_path: Optional[str] = None):
+        self.enabled = enabled or bool(trace_path)
+        self.trace_path = trace_path
+        self.overlay = False
+        self.events: deque = deque(maxlen=MAX_EVENTS)
+        self.recent: deque = deque(maxlen=RECENT_FRAMES)
+        self.frames = 0
+        self._frame: Optional[Frame] = None
+        self._waited = 0.0
+        self._fs_seen = 0
+        self._counter = FsCounter()
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        if self.enabled:
+            self._counter.start()
+
+    @classmethod
+    def from_env(cls) -> "Profiler":
+        return cls(os.environ.get("FMANAGER_PROFILE", "") not in ("", "0"),
+                   os.environ.get("FMANAGER_TRACE") or None)
+
+    def _event(self, name: str, start: float, end: float, args=None):
+        event = {
+            "name": name, "ph": "X", "pid": self._pid, "tid": threading.get_ident(),
+            "ts": (start - self._origin) * 1e6, "dur": (end - start) * 1e6,
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def phase(self, name: str, wait: bool = False):
+        """Context manager timing `name`; `wait` marks time spent idle"""
+        if not self.enabled:
+            return _NULL
+        return self._phase(name, wait)
+
+    @contextmanager
+    def _phase(self, name, wait):
+        waited = self._waited
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._event(name, start, end)
+            if wait:
+                self._waited += end - start
+            elif self._frame is not None:
+                # Overlay times leave out waits nested inside the phase
+                spent = end - start - (self._waited - waited)
+                self._frame.phases[name] = self._frame.phases.get(name, 0.0) + spent
+
+    def frame(self):
+        """Context manager around one pass of the main loop"""
+        if not self.enabled:
+            return _NULL
+        return self._run_frame()
+
+    @contextmanager
+    def _run_frame(self):
+        frame = self._frame = Frame()
+        self._waited = 0.0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            calls = self._counter.total()
+            frame.fs_calls = calls - self._fs_seen
+            self._fs_seen = calls
+            frame.busy = end - start - self._waited
+            self.frames += 1
+            self.recent.append(frame)
+            self._frame = None
+            self._event("frame", start, end, {"busy_ms": frame.busy * 1000,
+                                              "fs_calls": frame.fs_calls})
+            self.events.append({"name": "fs_calls", "ph": "C", "pid": self._pid,
+                                "ts": (end - self._origin) * 1e6,
+                                "args": {"calls": frame.fs_calls}})
+
+    def summary(self) -> list:
+        """Overlay lines for the recent frames"""
+        frames = list(self.recent)
+        if not frames:
+            return ["no frames yet"]
+        busy = sorted(f.busy for f in frames)
+        last = frames[-1]
+        heaviest = sorted(((t, n) for n, t in last.phases.items()), reverse=True)[:3]
+        lines = [
+            f"frame p50 {busy[len(busy) // 2] * 1000:.2f} ms, max {busy[-1] * 1000:.2f} ms",
+            f"fs calls {sum(f.fs_calls for f in frames) / len(frames):6.1f}/frame, last {last.fs_calls}",
+        ]
+        lines += [f"  {name[:22]:<22} {t * 1000:7.2f} ms" for t, name in heaviest]
+        return lines
+
+    def dump(self, path: Optional[str] = None):
+        """Write the trace as Chrome trace JSON"""
+        path = path or self.trace_path
+        if not path:
+            return
+        with open(path, "w") as fh:
+            json.dump({"traceEvents": list(self.events), "displayTimeUnit": "ms"}, fh)
+
+    def close(self):
+        if not self.enabled:
+            return
+        self._counter.stop()
+        self.enabled = False
+        self.dump()
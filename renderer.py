@@ -0,0 +1,148 @@
+import os
+import curses
+from typing import Dict, Optional, Tuple
+
+# A row is drawn from segments of (column, text, attribute)
+Segments = Tuple[Tuple[int, str, int], ...]
+
+
+class Region:
+    """A curses window plus the rows last drawn into it"""
+
+    def __init__(self, height: int, width: int, y: int, x: int):
+        self.win = curses.newwin(height, width, y, x)
+        self.geometry = (height, width, y, x)
+        self.rows: list = [None] * height
+        self.visible = True
+        self.dirty = True
+
+    def draw_row(self, y: int, segments: Segments):
+        """Redraw row `y` unless it already shows exactly `segments`"""
+        if self.rows[y] == segments:
+            return
+        self.rows[y] = segments
+        win = self.win
+        win.move(y, 0)
+        win.clrtoeol()
+        for x, text, attr in segments:
+            try:
+                win.addstr(y, x, text, attr)
+            except curses.error:
+                pass  # writing the bottom-right cell moves the cursor off-window
+        self.dirty = True
+
+    def overlaps(self, other: "Region") -> bool:
+        h, w, y, x = self.geometry
+        oh, ow, oy, ox = other.geometry
+        return y < oy + oh and oy < y + h and x < ox + ow and ox < x + w
+
+
+class Renderer:
+    """Damage-tracking screen updates.
+
+    The screen is split into regions (header, one per panel, status line),
+    each its own window. Rows are only redrawn when their content changed,
+    only changed windows are copied out with noutrefresh(), and the
+    terminal is updated once per frame with doupdate(). Regions are
+    stacked in creation order, so later ones (the status line) overlay
+    earlier ones.
+
+    Bytes sent to the terminal are counted per frame from the kernel's
+    per-thread write counter, giving bytes written per keystroke.
+    """
+
+    def __init__(self, stdscr, full: bool = False):
+        self.stdscr = stdscr
+        # Repaint every row on every frame, like a plain erase()/refresh()
+        self.full = full
+        self.regions: Dict[str, Region] = {}
+        self._touch_all = True
+        self.frames = 0
+        self.keys = 0
+        self.bytes_total = 0
+        self.last_frame_bytes = 0
+        try:
+            self._io_fd: Optional[int] = os.open("/proc/thread-self/io", os.O_RDONLY)
+        except OSError:
+            self._io_fd = None
+
+    def region(self, name: str, height: int, width: int, y: int, x: int) -> Region:
+        """The region called `name`, recreated when its geometry changed"""
+        region = self.regions.get(name)
+        if region is None or region.geometry != (height, width, y, x):
+            if region is not None:
+                self._touch_all = True  # uncovered cells must be repainted
+            # Replacing the value keeps the region's place in the stacking order
+            region = self.regions[name] = Region(height, width, y, x)
+        elif not region.visible:
+            region.visible = True
+            region.dirty = True
+        if self.full:
+            region.rows = [None] * height
+        return region
+
+    def hide(self, name: str):
+        region = self.regions.get(name)
+        if region is not None and region.visible:
+            region.visible = False
+            region.rows = [None] * len(region.rows)
+            self._touch_all = True
+
+    def invalidate(self):
+        """Repaint everything next frame, e.g. after a popup covered the screen"""
+        self._touch_all = True
+
+    def reset(self):
+        """Forget all regions after something else drew over stdscr"""
+        self.regions.clear()
+        self.stdscr.erase()
+        self._touch_all = True
+
+    def key_pressed(self):
+        self.keys += 1
+
+    def present(self):
+        """Copy changed regions to the virtual screen and update the terminal"""
+        if self._touch_all:
+            self.stdscr.touchwin()
+            self.stdscr.noutrefresh()
+        refreshed = []
+        for region in self.regions.values():
+            if not region.visible:
+                continue
+            if self._touch_all or (not region.dirty and any(map(region.overlaps, refreshed))):
+                region.win.touchwin()
+                region.dirty = True
+            if region.dirty:
+                region.win.noutrefresh()
+                region.dirty = False
+                refreshed.append(region)
+        self._touch_all = False
+        before = self._written()
+        curses.doupdate()
+        if before is not None:
+            self.last_frame_bytes = self._written() - before
+            self.bytes_total += self.last_frame_bytes
+        self.frames += 1
+
+    def _written(self) -> Optional[int]:
+        if self._io_fd is None:
+            return None
+        for line in os.pread(self._io_fd, 512, 0).splitlines():
+            if line.startswith(b"wchar:"):
+                return int(line[6:])
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "keys": self.keys,
+            "bytes": self.bytes_total,
+            "last_frame_bytes": self.last_frame_bytes,
+            "bytes_per_key": self.bytes_total / self.keys if self.keys else 0.0,
+        }
+
+    def close(self):
+        if self._io_fd is not None:
+            os.close(self._io_fd)
+            self._io_fd = None
@@ -0,0 +1,125 @@
+import re
+import bisect
+from typing import Dict, List, Optional, Tuple
+
+# NUL can never appear in a file name, so it is a safe separator
+SEP = "\0"
+BOUNDARY_CHARS = " ._-+"
+
+
+class NameIndex:
+    """Lowercase name index for one panel listing.
+
+    All names are packed into a single NUL separated haystack so a
+    substring query is answered by str.find / regex scans running in C,
+    instead of a Python loop over every entry. Results are memoized per
+    query, and a longer query narrows the result of its longest cached
+    prefix, so typing never rescans the whole listing.
+    """
+
+    MAX_CACHED = 64
+
+    def __init__(self, names: List[str]):
+        self.names = names
+        self.lower = [n.lower() for n in names]
+        self.haystack = SEP.join(self.lower) + SEP
+        self.offsets: List[int] = []
+        pos = 0
+        for name in self.lower:
+            self.offsets.append(pos)
+            pos += len(name) + 1
+        self._cache: Dict[Tuple[str, bool], List[int]] = {}
+
+    def __len__(self):
+        return len(self.lower)
+
+    def _index_at(self, pos: int) -> int:
+        return bisect.bisect_right(self.offsets, pos) - 1
+
+    def _cached_prefix(self, query: str, fuzzy: bool) -> Optional[List[int]]:
+        for k in range(len(query) - 1, 0, -1):
+            hit = self._cache.get((query[:k], fuzzy))
+            if hit is not None:
+                return hit
+        return None
+
+    def match(self, query: str, fuzzy: bool = False) -> List[int]:
+        """Indices (into the listing) of names matching `query`"""
+        query = query.lower()
+        if not query:
+            return list(range(len(self.lower)))
+        key = (query, fuzzy)
+        hit = self._cache.get(key)
+        if hit is not None:
+            return hit
+
+        candidates = self._cached_prefix(query, fuzzy)
+        if fuzzy:
+            result = self._fuzzy(query, candidates)
+        elif candidates is not None:
+            lower = self.lower
+            result = [i for i in candidates if query in lower[i]]
+        else:
+            result = self._scan(query)
+
+        if len(self._cache) >= self.MAX_CACHED:
+            self._cache.clear()
+        self._cache[key] = result
+        return result
+
+    def _scan(self, query: str) -> List[int]:
+        if len(query) < 3:
+            # Short queries hit most names; a flat scan beats hopping the haystack
+            return [i for i, name in enumerate(self.lower) if query in name]
+        hay = self.haystack
+        offsets = self.offsets
+        count = len(offsets)
+        result = []
+        pos = hay.find(query)
+        while pos != -1:
+            i = self._index_at(pos)
+            result.append(i)
+            if i + 1 >= count:
+                break
+            # Skip the rest of this name, one hit per entry is enough
+            pos = hay.find(query, offsets[i + 1])
+        return result
+
+    def _fuzzy(self, query: str, candidates: Optional[List[int]]) -> List[int]:
+        # Cheap subsequence prefilter, then score only the survivors
+        pattern = "[^\0]*?".join(re.escape(c) for c in query)
+        if candidates is None:
+            matched = []
+            seen = -1
+            for m in re.finditer(pattern, self.haystack):
+                i = self._index_at(m.start())
+                if i != seen:
+                    matched.append(i)
+                    seen = i
+        else:
+            rx = re.compile(pattern)
+            lower = self.lower
+            matched = [i for i in candidates if rx.search(lower[i])]
+        scored = [(-fuzzy_score(query, self.lower[i]), len(self.lower[i]), i) for i in matched]
+        scored.sort()
+        return [i for _, _, i in scored]
+
+
+def fuzzy_score(query: str, name: str) -> int:
+    """fzf-style score: reward consecutive runs and word-boundary hits"""
+    score = 0
+    pos = 0
+    prev = -2
+    for c in query:
+        found = name.find(c, pos)
+        if found < 0:
+            return 0
+        score += 16
+        if found == prev + 1:
+            score += 12
+        if found == 0 or name[found - 1] in BOUNDARY_CHARS:
+            score += 8
+        score -= min(found - pos, 8)
+        prev = found
+        pos = found + 1
+    return score
@@ -0,0 +1,117 @@
+import os
+import re
+from typing import Dict, Sequence, Tuple
+
+from entries import FileEntry
+
+# Sort modes in the order the sort key cycles through them. Directories
+# always come first; "size" and "mtime" put the largest and newest first,
+# and entries with equal keys are ordered by name. Reversing flips the
+# order within directories and within files.
+MODES = ("name", "natural", "extension", "size", "mtime")
+
+_DIGITS = re.compile(r"(\d+)")
+
+
+def natural_key(name: str) -> tuple:
+    """Key ordering digit runs by value: file2 before file10, v1.9 before v1.10"""
+    parts = _DIGITS.split(name.lower())
+    # re.split alternates text and digits, so equal positions compare alike
+    parts[1::2] = [int(p) for p in parts[1::2]]
+    return tuple(parts)
+
+
+def extension(name: str) -> str:
+    return os.path.splitext(name.lower())[1]
+
+
+def _keys(mode: str, names: Sequence[str], sizes: Sequence[int],
+          mtimes: Sequence[float]) -> list:
+    """The mode's key for every slot, computed once per ordering"""
+    if mode == "natural":
+        return [natural_key(n) for n in names]
+    if mode == "extension":
+        return [extension(n) for n in names]
+    if mode == "size":
+        return [-s for s in sizes]
+    if mode == "mtime":
+        return [-m for m in mtimes]
+    return [n.lower() for n in names]
+
+
+def ordering(mode: str, reverse: bool, slots: Sequence[int], names: Sequence[str],
+             is_dir: Sequence[int], sizes: Sequence[int], mtimes: Sequence[float]) -> list:
+    """`slots` sorted by `mode`; the other arguments are columns indexed by slot.
+
+    Keys are computed once per slot and the sorts compare them in C
+    through __getitem__; Python's sort is stable, so sorting by name, then
+    by the mode's key and last by the directory flag gives directories
+    first, then the mode's order, then the name.
+    """
+    order = list(slots)
+    if mode != "name":
+        lower = [n.lower() for n in names]
+        order.sort(key=lower.__getitem__)
+    keys = _keys(mode, names, sizes, mtimes)
+    order.sort(key=keys.__getitem__, reverse=reverse)
+    # reverse keeps equal keys in their order, so this only lifts directories
+    order.sort(key=is_dir.__getitem__, reverse=True)
+    return order
+
+
+def entry_key(mode: str, entry: FileEntry, size: int):
+    """The key ordering() uses for `entry`, for patching a sorted listing"""
+    return _keys(mode, (entry.name,), (size,), (entry.mtime,))[0]
+
+
+def insert_position(listing, entry: FileEntry, mode: str, reverse: bool, size_of) -> int:
+    """Where `entry` goes in `listing`, sorted by ordering(mode, reverse)"""
+    group = not entry.is_dir
+    key = entry_key(mode, entry, size_of(entry))
+    lower = entry.name.lower()
+    lo, hi = 0, len(listing)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        other = listing[mid]
+        if (not other.is_dir) != group:
+            before = other.is_dir
+        else:
+            other_key = entry_key(mode, other, size_of(other))
+            if other_key != key:
+                before = other_key > key if reverse else other_key < key
+            else:
+                before = other.name.lower() < lower
+        if before:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class Orderings:
+    """Orderings of one listing, memoized by (mode, reverse).
+
+    Everything is dropped when the listing's generation changes, i.e. when
+    entries were added, removed or replaced, so toggling between modes
+    only pays for each ordering once.
+    """
+
+    def __init__(self):
+        self.generation = None
+        self._orders: Dict[Tuple[str, bool], object] = {}
+
+    def get(self, generation, order: Tuple[str, bool]):
+        if generation != self.generation:
+            self._orders.clear()
+            self.generation = generation
+        return self._orders.get(order)
+
+    def put(self, generation, order: Tuple[str, bool], value):
+        if generation != self.generation:
+            self._orders.clear()
+            self.generation = generation
+        self._orders[order] = value
+
+    def clear(self):
+        self._orders.clear()
+        self.generation = None
@@ -0,0 +1,228 @@
+import os
+import time
+import errno
+import struct
+import ctypes
+from typing import Dict, Iterable, Optional, Set
+
+# Changes to one directory are applied once it has been quiet this long...
+DEBOUNCE = 0.1
+# ...or at the latest after this long, so a steady writer can't starve the UI
+MAX_DELAY = 1.0
+POLL_INTERVAL = 2.0
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+# poll() result for a directory that must be rescanned rather than patched
+RESCAN = None
+
+
+class _Pending:
+    __slots__ = ("names", "first", "last")
+
+    def __init__(self, now):
+        self.names: Optional[Set[str]] = set()
+        self.first = now
+        self.last = now
+
+
+class BaseWatcher:
+    """Collects per-directory change sets and releases them debounced"""
+
+    def __init__(self):
+        self.paths: Set[str] = set()
+        self._pending: Dict[str, _Pending] = {}
+
+    def set_paths(self, paths: Iterable[str]):
+        paths = set(paths)
+        for path in self.paths - paths:
+            self.unwatch(path)
+            self._pending.pop(path, None)
+        for path in paths - self.paths:
+            self.watch(path)
+        self.paths = paths
+
+    def watch(self, path: str):
+        raise NotImplementedError
+
+    def unwatch(self, path: str):
+        raise NotImplementedError
+
+    def _note(self, path: str, name: Optional[str]):
+        now = time.monotonic()
+        pending = self._pending.get(path)
+        if pending is None:
+            pending = self._pending[path] = _Pending(now)
+        pending.last = now
+        if name is None:
+            pending.names = RESCAN
+        elif pending.names is not RESCAN:
+            pending.names.add(name)
+
+    def has_pending(self) -> bool:
+        return bool(self._pending)
+
+    def poll(self) -> Dict[str, Optional[Set[str]]]:
+        """Changed names per directory whose debounce window has closed"""
+        self._collect()
+        now = time.monotonic()
+        ready = {}
+        for path, pending in list(self._pending.items()):
+            if now - pending.last >= DEBOUNCE or now - pending.first >= MAX_DELAY:
+                ready[path] = pending.names
+                del self._pending[path]
+        return ready
+
+    def _collect(self):
+        pass
+
+    def close(self):
+        self.set_paths(())
+
+
+class InotifyWatcher(BaseWatcher):
+    """Kernel change notifications through libc's inotify, via ctypes"""
+
+    def __init__(self):
+        super().__init__()
+        try:
+            libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        except OSError:
+            # find_library runs ldconfig in a subprocess: only when the usual name fails
+            from ctypes.util import find_library
+            libc = ctypes.CDLL(find_library("c"), use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._wd_to_path: Dict[int, str] = {}
+        self._path_to_wd: Dict[str, int] = {}
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def watch(self, path: str):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            return  # unreadable or vanished; the panel shows what it has
+        self._wd_to_path[wd] = path
+        self._path_to_wd[path] = wd
+
+    def unwatch(self, path: str):
+        wd = self._path_to_wd.pop(path, None)
+        if wd is not None:
+            self._wd_to_path.pop(wd, None)
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def _collect(self):
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if not data:
+                return
+            self._parse(data)
+
+    def _parse(self, data: bytes):
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            raw_name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                for path in self._path_to_wd:
+                    self._note(path, RESCAN)
+                continue
+            path = self._wd_to_path.get(wd)
+            if path is None or mask & IN_IGNORED:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF) or not raw_name:
+                self._note(path, RESCAN)
+            else:
+                self._note(path, os.fsdecode(raw_name))
+
+    def close(self):
+        super().close()
+        os.close(self.fd)
+
+
+class PollingWatcher(BaseWatcher):
+    """Fallback for platforms without inotify: compare directory mtimes.
+
+    Only creations, deletions and renames are seen this way, since editing
+    a file in place does not touch its directory's mtime.
+    """
+
+    def __init__(self, interval: float = POLL_INTERVAL):
+        super().__init__()
+        self.interval = interval
+        self._state: Dict[str, tuple] = {}
+        self._next_poll = 0.0
+
+    def fileno(self) -> Optional[int]:
+        return None
+
+    def _snapshot(self, path: str):
+        try:
+            return os.stat(path).st_mtime_ns, set(os.listdir(path))
+        except OSError:
+            return None, set()
+
+    def watch(self, path: str):
+        self._state[path] = self._snapshot(path)
+
+    def unwatch(self, path: str):
+        self._state.pop(path, None)
+
+    def _collect(self):
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        self._next_poll = now + self.interval
+        for path, (mtime, names) in list(self._state.items()):
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                current = None
+            if current == mtime:
+                continue
+            self._state[path] = snapshot = self._snapshot(path)
+            if snapshot[0] is None:
+                self._note(path, RESCAN)
+                continue
+            for name in names ^ snapshot[1]:
+                self._note(path, name)
+
+
+def create_watcher() -> BaseWatcher:
+    """inotify where the kernel supports it, directory polling elsewhere"""
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError):
+        return PollingWatcher()